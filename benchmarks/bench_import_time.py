@@ -0,0 +1,125 @@
+"""
+Import-time benchmark of the command line interface and the downloaders.
+
+Every target runs in a fresh interpreter. The best wall time over the
+repetitions is reported together with the heavy dependencies which were
+loaded by the target.
+
+Usage
+-----
+python benchmarks/bench_import_time.py --repeat 10 --max_ms 500
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+HEAVY_MODULES = ['netCDF4', 'bs4', 'lxml', 'requests', 'ecmwfapi', 'bypy']
+
+# name -> python code running in the fresh interpreter
+TARGETS = {
+    'python': 'pass',
+    'import radiosonde_downloader': 'import radiosonde_downloader',
+    'import radiosonde_concurrent': 'import radiosonde_concurrent',
+    'import ECMWF_downloader': 'import ECMWF_downloader',
+    'download_radiosonde.py --help':
+        'import sys; sys.argv = ["download_radiosonde.py", "--help"]\n' +
+        'import runpy\n' +
+        'try:\n' +
+        '    runpy.run_path("download_radiosonde.py", ' +
+        'run_name="__main__")\n' +
+        'except SystemExit:\n' +
+        '    pass',
+}
+
+REPORT_CODE = """
+import sys, json
+sys.stdout = open(__import__('os').devnull, 'w')
+{code}
+sys.stdout = sys.__stdout__
+print(json.dumps([m for m in {heavy!r} if m in sys.modules]))
+"""
+
+
+def run_target(code):
+    """
+    run the code in a fresh interpreter.
+
+    Returns
+    -------
+    elapsed: float
+        wall time of the interpreter. [s]
+    loaded: list
+        heavy modules which were loaded.
+    """
+
+    tStart = time.perf_counter()
+    res = subprocess.run(
+        [sys.executable, '-c',
+         REPORT_CODE.format(code=code, heavy=HEAVY_MODULES)],
+        cwd=srcPath, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    elapsed = time.perf_counter() - tStart
+
+    if res.returncode != 0:
+        return elapsed, None
+
+    return elapsed, json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of repetitions for each target')
+    parser.add_argument('--max_ms', type=float, default=None,
+                        help='fail if a target exceeds the time ' +
+                        '(excluding the bare interpreter startup)')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as json')
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in TARGETS.items():
+        times = []
+        loaded = None
+        for iRepeat in range(args.repeat):
+            elapsed, loaded = run_target(code)
+            times.append(elapsed)
+        results[name] = {'ms': min(times) * 1e3, 'loaded': loaded}
+
+    baseline = results['python']['ms']
+    for name in results:
+        results[name]['import_ms'] = results[name]['ms'] - baseline
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, item in results.items():
+            if item['loaded'] is None:
+                status = 'failed (missing dependency?)'
+            else:
+                status = 'loaded: {0}'.format(
+                    ', '.join(item['loaded']) or '-')
+            print('{name:32s} {ms:8.1f} ms  (+{imp:7.1f} ms)  {status}'.format(
+                name=name, ms=item['ms'], imp=item['import_ms'],
+                status=status))
+
+    if args.max_ms is not None:
+        slowTargets = [name for name, item in results.items()
+                       if item['import_ms'] > args.max_ms]
+        if slowTargets:
+            print('Over {0:.0f} ms: {1}'.format(args.max_ms,
+                                                ', '.join(slowTargets)))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
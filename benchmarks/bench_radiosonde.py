@@ -0,0 +1,322 @@
+"""
+Offline benchmark suite of the radiosonde hot paths.
+
+Every benchmark runs on the fixture pages, synthetic pages or a local stub
+of the UWyo server, so no network is needed. The best time over the
+repetitions is reported as ops/s and MB/s, and the results can be saved as
+json and compared with the results of a previous release.
+
+Usage
+-----
+python benchmarks/bench_radiosonde.py --output results.json
+python benchmarks/bench_radiosonde.py --baseline results.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import logging
+import shutil
+import platform
+import tempfile
+import argparse
+import datetime
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from logger_init import radiosonde_logger_init   # noqa: E402
+from radiosonde_parser import extract_pre_blocks   # noqa: E402
+from radiosonde_parser import parse_sounding_table   # noqa: E402
+from radiosonde_parser import parse_sounding_indices   # noqa: E402
+from station_index import StationIndex, load_station_table   # noqa: E402
+from sounding_fixtures import make_sounding_page   # noqa: E402
+from sounding_fixtures import make_sounding_table   # noqa: E402
+from sounding_fixtures import make_indices_block   # noqa: E402
+from sounding_fixtures import read_fixture, StubUWyoServer   # noqa: E402
+
+STATION_FILE = os.path.join(projectDir, 'includes',
+                            'radiosonde_station_list.txt')
+FIXTURE_PAGE = 'uwyo_57494_20181201.html'
+
+# registered benchmarks: name -> function(args) returning a `measure` result
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    register the benchmark function.
+    """
+
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+def measure(func, *args, ops=1, nbytes=0, repeat=5, number=1):
+    """
+    time the function with the best of `repeat` runs.
+
+    Parameters
+    ----------
+    func: callable
+        function to time. It's called `number` times in every run.
+    ops: integer
+        number of operations of one call.
+    nbytes: integer
+        number of bytes processed by one call.
+
+    Returns
+    -------
+    result: dict
+        seconds of one call, ops/s and MB/s.
+    """
+
+    best = float('inf')
+    for iRepeat in range(repeat):
+        tStart = time.perf_counter()
+        for iCall in range(number):
+            func(*args)
+        best = min(best, (time.perf_counter() - tStart) / number)
+
+    return {
+        'seconds': best,
+        'ops': ops,
+        'bytes': nbytes,
+        'ops_per_s': ops / best,
+        'mb_per_s': nbytes / 1024 ** 2 / best,
+    }
+
+
+def synthetic_page(args):
+
+    launchTimes = [datetime.datetime(2019, 1, 1) +
+                   datetime.timedelta(hours=12 * iLaunch)
+                   for iLaunch in range(args.soundings)]
+
+    return make_sounding_page(57494, launchTimes, args.levels)
+
+
+@benchmark('extract_pre_blocks[fixture]')
+def bench_extract_fixture(args):
+
+    html = read_fixture(FIXTURE_PAGE)
+
+    return measure(extract_pre_blocks, html, ops=1,
+                   nbytes=len(html.encode('utf-8')),
+                   repeat=args.repeat, number=100)
+
+
+@benchmark('extract_pre_blocks[regex]')
+def bench_extract_regex(args):
+
+    html = synthetic_page(args)
+
+    return measure(extract_pre_blocks, html, ops=args.soundings,
+                   nbytes=len(html.encode('utf-8')), repeat=args.repeat)
+
+
+@benchmark('extract_pre_blocks[bs4]')
+def bench_extract_bs4(args):
+
+    try:
+        import bs4   # noqa: F401
+    except ImportError:
+        return None
+
+    html = synthetic_page(args)
+
+    return measure(lambda: extract_pre_blocks(html, parser='bs4'),
+                   ops=args.soundings, nbytes=len(html.encode('utf-8')),
+                   repeat=args.repeat)
+
+
+@benchmark('parse_sounding_table')
+def bench_parse_table(args):
+
+    content = make_sounding_table(args.levels)
+
+    return measure(parse_sounding_table, content, ops=args.levels,
+                   nbytes=len(content), repeat=args.repeat, number=10)
+
+
+@benchmark('parse_sounding_indices')
+def bench_parse_indices(args):
+
+    content = make_indices_block(57494, datetime.datetime(2019, 1, 1))
+
+    return measure(parse_sounding_indices, content, ops=1,
+                   nbytes=len(content), repeat=args.repeat, number=1000)
+
+
+@benchmark('station_lookup')
+def bench_station_lookup(args):
+
+    stations = load_station_table(STATION_FILE)
+    index = StationIndex(stations)
+    rng = np.random.RandomState(0)
+    IDs = rng.choice(np.asarray(stations['ID']), 10000).tolist()
+    index.lookup(IDs[0])   # build the dict outside the timing
+
+    def lookup():
+        for ID in IDs:
+            index.lookup(ID)
+
+    return measure(lookup, ops=len(IDs), repeat=args.repeat)
+
+
+@benchmark('station_within_radius')
+def bench_station_radius(args):
+
+    index = StationIndex(load_station_table(STATION_FILE))
+    rng = np.random.RandomState(0)
+    lats = rng.uniform(-60, 60, 1000)
+    lons = rng.uniform(-180, 180, 1000)
+
+    def search():
+        for lat, lon in zip(lats, lons):
+            index.within_radius(lat, lon, 300)
+
+    return measure(search, ops=len(lats), repeat=args.repeat)
+
+
+@benchmark('save_netCDF')
+def bench_save_netCDF(args):
+
+    try:
+        import netCDF4   # noqa: F401
+    except ImportError:
+        return None
+
+    from radiosonde_downloader import RSDownloader
+
+    rs = RSDownloader()
+    rsData, rsDims, rsGAttrs = rs.parse_html(synthetic_page(args))
+    outputDir = tempfile.mkdtemp()
+
+    def save():
+        rs.save_many(rsData, rsDims, rsGAttrs, outputDir, force=True)
+
+    try:
+        save()
+        nbytes = sum(os.path.getsize(os.path.join(outputDir, file))
+                     for file in os.listdir(outputDir))
+        return measure(save, ops=len(rsData), nbytes=nbytes,
+                       repeat=args.repeat)
+    finally:
+        shutil.rmtree(outputDir, ignore_errors=True)
+
+
+@benchmark('getData[stub server]')
+def bench_get_data(args):
+
+    from radiosonde_downloader import RSDownloader
+    from transport import HTTPTransport
+
+    startTime = datetime.datetime(2019, 1, 1)
+    stopTime = datetime.datetime(2019, 4, 1)
+
+    with StubUWyoServer(n_levels=args.levels) as server:
+        rs = RSDownloader(transport=HTTPTransport(max_retries=0))
+        rs.baseURL = server.url
+
+        # the pages are generated by the first call
+        rsData, _, _ = rs.getData(startTime, stopTime)
+        nbytes = sum(len(page.encode('utf-8'))
+                     for page in server.pages.values())
+
+        return measure(rs.getData, startTime, stopTime, ops=len(rsData),
+                       nbytes=nbytes, repeat=args.repeat)
+
+
+def compare(results, baseline, tolerance):
+    """
+    find the benchmarks whose ops/s dropped by more than `tolerance`.
+    """
+
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if (result is None) or (reference is None):
+            continue
+
+        ratio = result['ops_per_s'] / reference['ops_per_s']
+        if ratio < 1 - tolerance:
+            regressions.append((name, ratio))
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--soundings', type=int, default=62,
+                        help='number of soundings of the synthetic pages')
+    parser.add_argument('--levels', type=int, default=100,
+                        help='number of levels of the synthetic soundings')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of repetitions for each benchmark')
+    parser.add_argument('--filter', default=None,
+                        help='only run the benchmarks containing the text')
+    parser.add_argument('--output', default=None,
+                        help='save the results as json')
+    parser.add_argument('--baseline', default=None,
+                        help='json results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative drop of ops/s')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as json')
+    args = parser.parse_args()
+
+    # the progress messages would distort the timing and the json output
+    radiosonde_logger_init().setLevel(logging.ERROR)
+
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if (args.filter is not None) and (args.filter not in name):
+            continue
+        results[name] = func(args)
+
+    report = {
+        'created': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'parameters': {'soundings': args.soundings, 'levels': args.levels,
+                       'repeat': args.repeat},
+        'results': results,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, result in results.items():
+            if result is None:
+                print('{name:32s} skipped (missing dependency)'.format(
+                    name=name))
+                continue
+            print('{name:32s} {ops:12.1f} ops/s {mbs:10.2f} MB/s'.format(
+                name=name, ops=result['ops_per_s'], mbs=result['mb_per_s']))
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as fh:
+            baseline = json.load(fh)
+
+        regressions = compare(results, baseline, args.tolerance)
+        for name, ratio in regressions:
+            print('Regression of {name}: {ratio:.0%} of the baseline'.format(
+                name=name, ratio=ratio))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
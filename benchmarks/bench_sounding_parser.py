@@ -0,0 +1,80 @@
+"""
+Microbenchmark of the sounding table parser against the per-field loop
+used by `RSDownloader.get_daily_data` before the vectorized parser.
+
+Usage
+-----
+python benchmarks/bench_sounding_parser.py --levels 5000 --repeat 20
+"""
+import os
+import sys
+import timeit
+import argparse
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from radiosonde_parser import SOUNDING_COLUMNS   # noqa: E402
+from radiosonde_parser import parse_sounding_table   # noqa: E402
+from radiosonde_parser import split_sounding_lines   # noqa: E402
+from sounding_fixtures import make_sounding_table   # noqa: E402
+
+
+def parse_sounding_table_loop(content):
+    """
+    reference implementation with one float conversion per field.
+    """
+
+    dataLines = split_sounding_lines(content)
+    dataType = np.dtype([(name, np.float64) for name in SOUNDING_COLUMNS])
+    data = np.empty(len(dataLines), dtype=dataType)
+
+    def str_2_double(inputStr):
+        """convert the string into float"""
+        if inputStr == '       ':
+            return None
+        else:
+            return float(inputStr)
+
+    for index in range(len(dataLines)):
+        for iCol, name in enumerate(SOUNDING_COLUMNS):
+            data[index][name] = str_2_double(
+                dataLines[index][(iCol * 7):(iCol * 7 + 7)]
+            )
+
+    return data
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--levels', type=int, default=5000,
+                        help='number of levels of the synthetic table')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='number of repetitions for each parser')
+    args = parser.parse_args()
+
+    content = make_sounding_table(args.levels)
+
+    # both parsers must agree before timing them
+    reference = parse_sounding_table_loop(content)
+    columns = parse_sounding_table(content)
+    for name in SOUNDING_COLUMNS:
+        np.testing.assert_array_equal(reference[name], columns[name])
+
+    tLoop = min(timeit.repeat(
+        lambda: parse_sounding_table_loop(content),
+        number=1, repeat=args.repeat))
+    tVectorized = min(timeit.repeat(
+        lambda: parse_sounding_table(content),
+        number=1, repeat=args.repeat))
+
+    print('levels: {0:d}'.format(args.levels))
+    print('loop:       {0:10.3f} ms'.format(tLoop * 1e3))
+    print('vectorized: {0:10.3f} ms'.format(tVectorized * 1e3))
+    print('speedup:    {0:10.1f}x'.format(tLoop / tVectorized))
+
+
+if __name__ == '__main__':
+    main()
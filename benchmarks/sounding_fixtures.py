@@ -0,0 +1,204 @@
+"""
+Synthetic UWyo sounding pages and a local stub of the UWyo server for the
+offline benchmarks.
+
+The pages follow the 'TEXT:LIST' layout of
+http://weather.uwyo.edu/cgi-bin/sounding: one `<pre>` block with the
+sounding table and one `<pre>` block with the station information and
+sounding indices for every launch.
+"""
+import os
+import datetime
+import threading
+import numpy as np
+from urllib.parse import urlparse, parse_qs
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'fixtures')
+
+TABLE_HEADER = [
+    '-' * 77,
+    '   PRES   HGHT   TEMP   DWPT   RELH   MIXR   DRCT   SKNT   ' +
+    'THTA   THTE   THTV',
+    '    hPa     m      C      C      %    g/kg    deg   knot     ' +
+    'K      K      K ',
+    '-' * 77
+]
+
+INDICES_BLOCK = """
+                         Station identifier: ZHHH
+                             Station number: {station:d}
+                           Observation time: {time}
+                           Station latitude: 30.60
+                          Station longitude: 114.05
+                          Station elevation: 23.0
+                            Showalter index: 7.75
+                               Lifted index: 1.55
+    LIFT computed using virtual temperature: 0.82
+                                SWEAT index: 134.78
+                                    K index: 1.10
+                         Cross totals index: 12.70
+                      Vertical totals index: 21.70
+                        Totals totals index: 34.40
+      Convective Available Potential Energy: 0.00
+             CAPE using virtual temperature: 17.64
+                      Convective Inhibition: 0.00
+             CINS using virtual temperature: -18.91
+ Equilibrum Level using virtual temperature: 423.22
+             LFCT using virtual temperature: 829.22
+                     Bulk Richardson Number: 0.00
+          Bulk Richardson Number using CAPV: 2.10
+  Temp [K] of the Lifted Condensation Level: 289.53
+Pres [hPa] of the Lifted Condensation Level: 879.95
+   Equivalent potential temp [K] of the LCL: 336.27
+     Mean mixed layer potential temperature: 300.31
+              Mean mixed layer mixing ratio: 13.51
+              1000 hPa to 500 hPa thickness: 5754.00
+Precipitable water [mm] for entire sounding: 27.30
+"""
+
+
+def make_sounding_table(nLevels, seed=0):
+    """
+    generate a synthetic sounding table with some blank fields.
+    """
+
+    rng = np.random.RandomState(seed)
+    lines = list(TABLE_HEADER)
+    for iLevel in range(nLevels):
+        values = rng.uniform(-50, 1000, 11)
+        fields = ['{:7.1f}'.format(value) for value in values]
+        if iLevel % 10 == 0:
+            fields[3:] = [' ' * 7] * 8
+        lines.append(''.join(fields))
+
+    return '\n' + '\n'.join(lines) + '\n'
+
+
+def make_indices_block(station, launch_time):
+    """
+    station information and sounding indices of a launch.
+    """
+
+    return INDICES_BLOCK.format(station=station,
+                                time=launch_time.strftime('%y%m%d/%H%M'))
+
+
+def make_sounding_page(station, launch_times, nLevels, seed=0):
+    """
+    generate a UWyo response with one sounding for every launch time.
+    """
+
+    table = make_sounding_table(nLevels, seed)
+    blocks = []
+    for launchTime in launch_times:
+        blocks.append(
+            '<H2>{station:d} Observations at {time}</H2>\n'.format(
+                station=station,
+                time=launchTime.strftime('%HZ %d %b %Y')) +
+            '<PRE>' + table + '</PRE><H3>Station information and sounding ' +
+            'indices</H3><PRE>' + make_indices_block(station, launchTime) +
+            '</PRE>\n')
+
+    return ('<HTML>\n<TITLE>University of Wyoming - Radiosonde Data' +
+            '</TITLE>\n<BODY BGCOLOR="white">\n' + ''.join(blocks) +
+            '</BODY></HTML>\n')
+
+
+def read_fixture(name):
+    """
+    read a sounding page in the fixture directory.
+    """
+
+    with open(os.path.join(FIXTURE_DIR, name), 'r', encoding='utf-8') as fh:
+        return fh.read()
+
+
+class StubUWyoServer(object):
+    """
+    Local HTTP server answering the sounding requests like UWyo.
+
+    Every request returns the 00Z and 12Z soundings between `FROM` and `TO`
+    (inclusive) with `n_levels` levels. The pages are generated once per
+    request window and reused.
+
+    Example
+    -------
+    >>> with StubUWyoServer(n_levels=100) as server:
+    ...     rs.baseURL = server.url
+    ...     rs.getData(datetime(2019, 1, 1), datetime(2019, 2, 1))
+    """
+
+    def __init__(self, n_levels=100):
+
+        self.n_levels = n_levels
+        self.n_requests = 0
+        self.pages = {}
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = stub.page(self.path).encode('utf-8')
+                stub.n_requests += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{port:d}/cgi-bin/sounding'.format(
+            port=self.server.server_port)
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        daemon=True)
+
+    def page(self, path):
+
+        query = {key: value[0]
+                 for key, value in parse_qs(urlparse(path).query).items()}
+        key = (query['STNM'], query['YEAR'], query['MONTH'], query['FROM'],
+               query['TO'])
+
+        if key not in self.pages:
+            year = int(query['YEAR'])
+            month = int(query['MONTH'])
+            thisTime = datetime.datetime(year, month, int(query['FROM'][:2]),
+                                         int(query['FROM'][2:]))
+            lastTime = datetime.datetime(year, month, int(query['TO'][:2]),
+                                         int(query['TO'][2:]))
+
+            launchTimes = []
+            while thisTime <= lastTime:
+                if thisTime.hour in (0, 12):
+                    launchTimes.append(thisTime)
+                thisTime = thisTime + datetime.timedelta(hours=1)
+
+            self.pages[key] = make_sounding_page(int(query['STNM']),
+                                                 launchTimes, self.n_levels)
+
+        return self.pages[key]
+
+    def start(self):
+
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+
+        return self.start()
+
+    def __exit__(self, *args):
+
+        self.stop()
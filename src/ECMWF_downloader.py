@@ -1,18 +1,348 @@
 #!/usr/bin/env python
-from ecmwfapi import ECMWFDataServer
-from bypy import ByPy
 import datetime as dt
 import os
-from configs import load_download_config
+import json
+import shutil
+import functools
+import collections
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from configs import load_download_config, download_defaults
+from logger_init import ECMWF_logger
+from storage_sinks import Uploader, get_sink
+from grib_index import build_index
 
-CONFIG = load_download_config()
-server = ECMWFDataServer()
+logger = ECMWF_logger()
 
+# MARS payloads of the analysis and forecast fields, without date and target
+ECMWF_PAYLOADS = collections.OrderedDict([
+    ('an', {
+        "class": "mc",
+        "expver": "0001",
+        "levtype": "sfc",
+        "param": "137.128/165.128/167.128/250.210/251.210",
+        "step": "0",
+        "stream": "oper",
+        "time": "00:00:00/06:00:00/12:00:00/18:00:00",
+        "type": "an",
+    }),
+    ('fc', {
+        "class": "mc",
+        "expver": "0001",
+        "levtype": "sfc",
+        "param": "73.210/74.210/137.128/165.128/167.128/207.210/208.210/" +
+                 "209.210/211.210/212.210/250.210/251.210",
+        "step": "0",
+        "stream": "oper",
+        "time": "00:00:00/12:00:00",
+        "type": "fc",
+    }),
+])
+
+# suffix of the file recording a complete retrieval
+DONE_SUFFIX = '.done'
+
+# one MARS request of a month and type
+RetrievalRequest = collections.namedtuple(
+    'RetrievalRequest', ['type', 'start_date', 'stop_date', 'target',
+                         'payload']
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_server():
+    """
+    get the ECMWF data server, which is created at the first request.
+    """
+
+    # create .ecmwfapirc file
+    ecmwfapircPath = os.path.join(os.environ['HOME'], '.ecmwfapirc')
+    if not os.path.exists(ecmwfapircPath):
+        with open(ecmwfapircPath, 'w', encoding='utf-8') as fh:
+            fh.write(load_download_config()['ECMWF']['ecmwfapirc'])
+
+    from ecmwfapi import ECMWFDataServer
+
+    return ECMWFDataServer()
+
+
+def month_windows(start_date, stop_date):
+    """
+    split the dates [start_date, stop_date] into months.
+
+    Returns
+    -------
+    iterator of (start, stop) of every month, both included.
+
+    Example
+    -------
+    >>> list(month_windows(datetime(2019, 10, 15), datetime(2019, 11, 10)))
+    [(datetime(2019, 10, 15), datetime(2019, 10, 31)),
+     (datetime(2019, 11, 1), datetime(2019, 11, 10))]
+    """
+
+    thisStart = start_date
+    while thisStart <= stop_date:
+        if thisStart.month == 12:
+            nextMonth = dt.datetime(thisStart.year + 1, 1, 1)
+        else:
+            nextMonth = dt.datetime(thisStart.year, thisStart.month + 1, 1)
+
+        thisStop = min(nextMonth - dt.timedelta(days=1), stop_date)
+        yield thisStart, thisStop
+        thisStart = nextMonth
+
+
+def is_valid_grib(file):
+    """
+    whether the file is a complete GRIB file, i.e. it starts with 'GRIB'
+    and ends with the '7777' end section.
+    """
+
+    if (not os.path.isfile(file)) or (os.path.getsize(file) < 8):
+        return False
+
+    with open(file, 'rb') as fh:
+        head = fh.read(4)
+        fh.seek(-4, os.SEEK_END)
+        tail = fh.read(4)
+
+    return (head == b'GRIB') and (tail == b'7777')
+
+
+class ECMWFPlanner(object):
+    """
+    Parallel and resumable retrieval of the ECMWF data.
+
+    A date range is split into one MARS request per month and type
+    (analysis and forecast), each with its own target file. The requests run
+    with at most `max_workers` at once. Every retrieval is written to a
+    temporary file and renamed when it's complete, and a `.done` file with
+    its payload and size is written next to it, so that a rerun skips the
+    targets which are complete and verified.
+
+    Example
+    -------
+    >>> planner = ECMWFPlanner(output_dir='/data/ECMWF')
+    >>> requests = planner.plan([datetime(2019, 1, 1),
+    ...                          datetime(2019, 6, 30)])
+    >>> targets, errors = planner.retrieve(requests)
+    >>> planner.merge(requests, '/data/ECMWF/cams_2019H1.grib')
+    """
+
+    def __init__(self, server=None, *args, output_dir=None, max_workers=None,
+                 file_naming=None):
+        """
+        initialize the instance. The default values are taken from the
+        [ECMWF] section of `download_config.toml`.
+
+        Parameters
+        ----------
+        server: `ECMWFDataServer`
+            data server (default: `get_server()`, created at the first
+            request).
+
+        Keywords
+        --------
+        output_dir: str
+            directory of the monthly files.
+        max_workers: integer
+            maximum number of concurrent requests.
+        file_naming: str
+            naming pattern with the fields {dataset}, {type} and {month}.
+        """
+
+        default = download_defaults('ECMWF')
+
+        self.server = server
+        self.output_dir = default(output_dir, 'DATA_DIR')
+        self.max_workers = default(max_workers, 'max_workers')
+        self.file_naming = default(file_naming, 'file_naming')
+
+        if self.max_workers < 1:
+            raise ValueError('Number of workers must be positive.')
+
+    def plan(self, mDateRange, dataset='cams_nrealtime', types=None):
+        """
+        plan the requests of every month and type.
+
+        Parameters
+        ----------
+        mDateRange: list of 2-element datetime object
+            start and stop date of the query (both included).
+        dataset: str
+            ECMWF products (default: 'cams_nrealtime').
+        types: list
+            keys of `ECMWF_PAYLOADS` (default: all).
+
+        Returns
+        -------
+        requests: list
+            `RetrievalRequest` ordered by type and month.
+        """
+
+        if mDateRange[0] > mDateRange[1]:
+            raise ValueError('start date is over stop date.')
 
-def get_ECMWF_file(mDateRange, dataset='cams_nrealtime', filepath='output'):
+        if types is None:
+            types = list(ECMWF_PAYLOADS)
+
+        requests = []
+        for thisType in types:
+            for thisStart, thisStop in month_windows(*mDateRange):
+                target = os.path.join(self.output_dir, self.file_naming.format(
+                    dataset=dataset,
+                    type=thisType,
+                    month=thisStart.strftime('%Y%m')))
+
+                payload = dict(ECMWF_PAYLOADS[thisType])
+                payload['dataset'] = dataset
+                payload['date'] = '{0}/to/{1}'.format(
+                    thisStart.strftime('%Y-%m-%d'),
+                    thisStop.strftime('%Y-%m-%d'))
+                payload['target'] = target
+
+                requests.append(RetrievalRequest(
+                    thisType, thisStart, thisStop, target, payload))
+
+        return requests
+
+    def is_complete(self, request):
+        """
+        whether the target of the request is retrieved and verified.
+
+        The target must be a complete GRIB file whose size and payload match
+        its `.done` file.
+        """
+
+        doneFile = request.target + DONE_SUFFIX
+        if not (os.path.isfile(doneFile) and is_valid_grib(request.target)):
+            return False
+
+        try:
+            with open(doneFile, 'r', encoding='utf-8') as fh:
+                record = json.load(fh)
+        except (OSError, ValueError):
+            return False
+
+        return (record.get('payload') == request.payload) and \
+            (record.get('size') == os.path.getsize(request.target))
+
+    def retrieve_one(self, request):
+        """
+        retrieve a single request into its target.
+        """
+
+        server = self.server
+        if server is None:
+            server = get_server()
+
+        targetDir = os.path.dirname(request.target)
+        if targetDir and (not os.path.exists(targetDir)):
+            os.makedirs(targetDir, exist_ok=True)
+
+        # the target only appears when the retrieval is finished
+        partFile = request.target + '.part'
+        payload = dict(request.payload)
+        payload['target'] = partFile
+        server.retrieve(payload)
+
+        if not is_valid_grib(partFile):
+            raise IOError('Incomplete GRIB file: {file}'.format(
+                file=partFile))
+
+        os.replace(partFile, request.target)
+        with open(request.target + DONE_SUFFIX, 'w', encoding='utf-8') as fh:
+            json.dump({'payload': request.payload,
+                       'size': os.path.getsize(request.target)}, fh)
+
+        return request.target
+
+    def retrieve(self, requests, on_complete=None):
+        """
+        retrieve the requests concurrently, skipping the complete ones.
+
+        Parameters
+        ----------
+        requests: list
+            `RetrievalRequest` planned by `plan`.
+        on_complete: callable
+            `on_complete(request)` called in the calling thread for every
+            complete target as soon as it's available, e.g. to upload it
+            while the other requests are running.
+
+        Returns
+        -------
+        targets: list
+            targets of the complete requests, in the order of the requests.
+        errors: list
+            (request, exception) of every failed request.
+        """
+
+        pending = []
+        for request in requests:
+            if self.is_complete(request):
+                logger.info('Skip the complete {file}'.format(
+                    file=request.target))
+                if on_complete is not None:
+                    on_complete(request)
+            else:
+                pending.append(request)
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.retrieve_one, request): request
+                       for request in pending}
+
+            for future in as_completed(futures):
+                request = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error('Failed to retrieve {file}: {err}'.format(
+                        file=request.target, err=e))
+                    errors.append((request, e))
+                    continue
+
+                if on_complete is not None:
+                    on_complete(request)
+
+        failed = [request for request, _ in errors]
+        targets = [request.target for request in requests
+                   if request not in failed]
+
+        return targets, errors
+
+    def merge(self, requests, filepath):
+        """
+        concatenate the targets of the requests into one GRIB file.
+
+        GRIB messages are self-contained, so the merged file holds all the
+        fields of the requests in their order.
+        """
+
+        partFile = filepath + '.part'
+        with open(partFile, 'wb') as fOut:
+            for request in requests:
+                with open(request.target, 'rb') as fIn:
+                    shutil.copyfileobj(fIn, fOut, 1024 * 1024)
+
+        os.replace(partFile, filepath)
+
+        return filepath
+
+
+def get_ECMWF_file(mDateRange, dataset='cams_nrealtime', filepath='output',
+                   *args, server=None, max_workers=None, uploader=None,
+                   upload=None):
     """
     retrieve the ECMWF file through ECMWF Client.
 
+    The analysis and forecast fields of every month are retrieved
+    concurrently into separate files next to `filepath`, which are merged
+    into `filepath` at the end. Months which were already retrieved are
+    skipped. The byte offsets of the messages of the merged file are saved
+    in a sidecar index for `grib_index.GribReader`.
+
     Parameters
     ----------
     mDateRange: list of 2-element datetime object
@@ -21,52 +351,66 @@ def get_ECMWF_file(mDateRange, dataset='cams_nrealtime', filepath='output'):
         ECMWF products (default: 'cams_nrealtime').
     filepath: str
         absolute path for saving ECMWF file.
+
+    Keywords
+    --------
+    server: `ECMWFDataServer`
+        data server (default: `get_server()`).
+    max_workers: integer
+        maximum number of concurrent requests.
+    uploader: `Uploader`
+        uploader archiving the retrieved files.
+    upload: str
+        files which are archived by the uploader: 'monthly' for every
+        monthly file as soon as it's retrieved, or 'merged' for the merged
+        file only (default: `ECMWF_upload` of the [storage] section).
+
+    Returns
+    -------
+    filepath: str
+        path of the merged file. None if any request failed.
+
     History
     -------
     2020-03-01 First version.
     """
 
-    # create .ecmwfapirc file
-    ecmwfapircPath = os.path.join(os.environ['HOME'], '.ecmwfapirc')
-    if not os.path.exists(ecmwfapircPath):
-        with open(ecmwfapircPath, 'w', 'utf-8') as fh:
-            fh.write(CONFIG['ECMWF']['ecmwfapirc'])
+    if upload is None:
+        upload = load_download_config()['storage']['ECMWF_upload']
+    if upload not in ('monthly', 'merged'):
+        raise ValueError('Unknown upload: {upload}'.format(upload=upload))
 
-    payload = {
-        "class": "mc",
-        "dataset": dataset,
-        "date": "{0}/to/{1}".format(
-            mDateRange[0].strftime('%Y-%m-%d'),
-            mDateRange[1].strftime('%Y-%m-%d')
-            ),
-        "expver": "0001",
-        "levtype": "sfc",
-        "param": "137.128/165.128/167.128/250.210/251.210",
-        "step": "0",
-        "stream": "oper",
-        "time": "00:00:00/06:00:00/12:00:00/18:00:00",
-        "type": "an",
-        "target": filepath,
-    }
-    server.retrieve(payload)
+    planner = ECMWFPlanner(server,
+                           output_dir=os.path.dirname(os.path.abspath(
+                               filepath)),
+                           max_workers=max_workers)
+    requests = planner.plan(mDateRange, dataset=dataset)
 
-    payload = {
-        "class": "mc",
-        "dataset": dataset,
-        "date": "{0}/to/{1}".format(
-            mDateRange[0].strftime('%Y-%m-%d'),
-            mDateRange[1].strftime('%Y-%m-%d')
-            ),
-        "expver": "0001",
-        "levtype": "sfc",
-        "param": "73.210/74.210/137.128/165.128/167.128/207.210/208.210/209.210/211.210/212.210/250.210/251.210",
-        "step": "0",
-        "stream": "oper",
-        "time": "00:00:00/12:00:00",
-        "type": "fc",
-        "target": filepath,
-    }
-    server.retrieve(payload)
+    def upload_target(request):
+        uploader.submit(request.target)
+
+    # the monthly files and the merged file hold the same fields, so only
+    # one of them is archived
+    uploadMonthly = (uploader is not None) and (upload == 'monthly')
+    targets, errors = planner.retrieve(
+        requests, on_complete=upload_target if uploadMonthly else None)
+
+    if errors:
+        logger.error('{n:d} of {total:d} requests failed. Skip merging {file}'.
+                     format(n=len(errors), total=len(requests),
+                            file=filepath))
+        return None
+
+    planner.merge(requests, filepath)
+    try:
+        build_index(filepath)
+    except ValueError as e:
+        logger.warning('Failed to index {file}: {err}'.format(
+            file=filepath, err=e))
+    if (uploader is not None) and (upload == 'merged'):
+        uploader.submit(filepath)
+
+    return filepath
 
 
 def main():
@@ -75,11 +419,17 @@ def main():
     filename = '{product}_{date}.grib'.format(
         product=product,
         date=tRange[0].strftime('%Y%m'))
-    filepath = os.path.join(CONFIG['ECMWF']['DATA_DIR'], filename)
-    get_ECMWF_file(tRange, dataset=product, filepath=filepath)
+    config = load_download_config()
+    filepath = os.path.join(config['ECMWF']['DATA_DIR'], filename)
+
+    # either the monthly files, uploaded while the other months are
+    # retrieved, or the merged file (see `ECMWF_upload` of [storage])
+    sink = get_sink('bypy', config['ECMWF']['BDY_DIR'], logger=logger)
+    with Uploader(sink) as uploader:
+        get_ECMWF_file(tRange, dataset=product, filepath=filepath,
+                       uploader=uploader)
 
-    bp = ByPy()
-    bp.upload(filepath, os.path.join(CONFIG['ECMWF']['BDY_DIR'], filename))
+    logger.info('Uploads: {summary}'.format(summary=uploader.summary()))
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import os
+import functools
 import toml
 
 CONFIG_DIR = os.path.join(os.path.dirname(__file__), 'config')
@@ -9,9 +10,13 @@ LOGGER_CONFIG_FILE = "logger_config.toml"
 RADIOSONDE_METADATA_FILE = "radiosonde_metadata.toml"
 
 
+@functools.lru_cache(maxsize=None)
 def load_download_config():
     """
     load the configurations related with the download operations
+
+    The configurations are read only once and shared by all the callers, so
+    don't modify the returned dict.
     """
 
     download_config_path = os.path.join(CONFIG_DIR, DOWNLOAD_CONFIG_FILE)
@@ -21,6 +26,26 @@ def load_download_config():
     return configs
 
 
+def download_defaults(section):
+    """
+    get the function which fills the arguments left as None with the
+    defaults of the section of `download_config.toml`.
+
+    Example
+    -------
+    >>> default = download_defaults('transport')
+    >>> default(None, 'pool_size')   # `pool_size` of the [transport] section
+    """
+
+    config = load_download_config()[section]
+
+    def default(value, key):
+        return config[key] if value is None else value
+
+    return default
+
+
+@functools.lru_cache(maxsize=None)
 def load_database_config():
     """
     load the configurations related with the database
@@ -33,6 +58,7 @@ def load_database_config():
     return configs
 
 
+@functools.lru_cache(maxsize=None)
 def load_logger_config():
     """
     load the configurations related with the logger
@@ -45,6 +71,7 @@ def load_logger_config():
     return configs
 
 
+@functools.lru_cache(maxsize=None)
 def load_radiosonde_metadata():
     """
     load the configurations for radiosonde metadata.
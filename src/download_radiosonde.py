@@ -2,25 +2,218 @@ import sys
 import os
 import datetime
 import argparse
-from radiosonde_downloader import RSDownloader
 
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--start', help='start date in the format YYYYMMDD')
-parser.add_argument('--stop', help='stop date in the format YYYYMMDD')
-parser.add_argument('--output_dir', help='output directory')
+def parse_args(argv=None):
+    """
+    parse the command line arguments.
+    """
 
-args = parser.parse_args()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--start', help='start date in the format YYYYMMDD')
+    parser.add_argument('--stop', help='stop date in the format YYYYMMDD')
+    parser.add_argument('--output_dir', help='output directory')
+    parser.add_argument('--station', type=int, nargs='+', default=[57494],
+                        help='station numbers (default: 57494)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='total number of concurrent downloads')
+    parser.add_argument('--parse_workers', type=int, default=None,
+                        help='number of threads parsing the responses')
+    parser.add_argument('--queue_size', type=int, default=None,
+                        help='capacity of the queues between the download, ' +
+                        'parse and write stages')
+    parser.add_argument('--workers_per_host', type=int, default=None,
+                        help='number of concurrent downloads per host')
+    parser.add_argument('--request_rate', type=float, default=None,
+                        help='requests per second to every host')
+    parser.add_argument('--cache', action='store_true',
+                        help='cache the responses on disk')
+    parser.add_argument('--cache_dir', default=None,
+                        help='directory of the response cache ' +
+                        '(implies --cache)')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip the soundings which already exist in ' +
+                        'the output directory (per_launch only)')
+    parser.add_argument('--output_mode', default='per_launch',
+                        choices=['per_launch', 'aggregated', 'parquet'],
+                        help='one netCDF file per launch, one netCDF file ' +
+                        'per station and period, or a parquet dataset ' +
+                        'partitioned by station and year')
+    parser.add_argument('--aggregate_period', default=None,
+                        choices=['month', 'year'],
+                        help='period of the aggregated files')
+    parser.add_argument('--aggregate_layout', default=None,
+                        choices=['ragged', 'padded'],
+                        help='storage of the levels in the aggregated files')
+    parser.add_argument('--catalog', default=None, metavar='CREDENTIAL',
+                        help='record the saved soundings in the catalog of ' +
+                        'the credential in database_config.toml, ' +
+                        "e.g. 'local' for SQLite")
+    parser.add_argument('--html_parser', default='regex',
+                        choices=['regex', 'bs4'],
+                        help='backend to extract the sounding blocks ' +
+                        'from html')
+    parser.add_argument('--derived', action='store_true',
+                        help='add the number density, Rayleigh scattering, ' +
+                        'virtual temperature and u/v wind to the soundings')
+    parser.add_argument('--wavelength', type=float, default=None,
+                        help='wavelength of the Rayleigh scattering [nm]')
+    parser.add_argument('--upload', default=None,
+                        choices=['local', 'bypy'],
+                        help='archive the saved files while downloading')
+    parser.add_argument('--upload_dir', default=None,
+                        help='remote directory of the archive')
+    parser.add_argument('--metrics', default=None, metavar='FILE',
+                        help='save the download, parse and write metrics ' +
+                        'of the run')
+    parser.add_argument('--metrics_format', default='json',
+                        choices=['json', 'prometheus'],
+                        help='format of the metrics file')
 
-if args.output_dir is None:
-    args.output_dir = 'D:\\Data\\Radiosonde\\wuhan'
+    args = parser.parse_args(argv)
+    if (args.upload == 'local') and (args.upload_dir is None):
+        parser.error('--upload local requires --upload_dir')
+    # the archive index is built from the names of the per-launch files, so
+    # it can't tell which soundings the other modes have saved
+    if args.resume and (args.output_mode != 'per_launch'):
+        parser.error('--resume requires --output_mode per_launch')
 
-rs = RSDownloader()
+    return args
 
-startTime = datetime.datetime.strptime(args.start, '%Y%m%d')
-stopTime = datetime.datetime.strptime(args.stop, '%Y%m%d')
 
-rsData, rsDims, rsGAttrs = rs.getData(startTime, stopTime, siteNum=57494)
-iterators = zip(rsData, rsDims, rsGAttrs)
-for thisData, thisDims, thisGAttrs in iterators:
-    rs.save_netCDF(thisData, thisDims, thisGAttrs, args.output_dir, force=True)
+def main(argv=None, downloader=None):
+    """
+    download the soundings of the command line arguments.
+
+    Parameters
+    ----------
+    argv: list
+        command line arguments (default: `sys.argv`).
+    downloader: `RSDownloader`
+        downloader used instead of the one configured by `--html_parser`,
+        `--cache` and `--derived`, e.g. an offline downloader.
+
+    Returns
+    -------
+    status: integer
+        exit status, 1 if any download, parse, write or upload failed.
+    """
+
+    args = parse_args(argv)
+
+    # the downloaders are imported after parsing the arguments, so that
+    # `--help` returns without loading them
+    from radiosonde_downloader import RSDownloader
+    from radiosonde_pipeline import RSPipeline
+    from response_cache import ResponseCache
+    from sounding_archive import ArchiveIndex
+    from radiosonde_backends import get_backend
+    from radiosonde_database import RadiosondeDB
+    from metrics import get_metrics
+    from request_scheduler import RequestScheduler
+    from storage_sinks import Uploader, get_sink
+
+    if args.output_dir is None:
+        args.output_dir = 'D:\\Data\\Radiosonde\\wuhan'
+
+    cache = None
+    if args.cache or (args.cache_dir is not None):
+        cache = ResponseCache(args.cache_dir)
+
+    manifest = None
+    if args.resume:
+        manifest = ArchiveIndex(args.output_dir)
+
+    rs = downloader
+    if rs is None:
+        rs = RSDownloader(html_parser=args.html_parser, cache=cache,
+                          derived=args.derived, wavelength=args.wavelength)
+    scheduler = RequestScheduler(rate=args.request_rate,
+                                 max_concurrency=args.workers_per_host)
+    pipeline = RSPipeline(
+        rs,
+        fetch_workers=args.workers,
+        parse_workers=args.parse_workers,
+        queue_size=args.queue_size,
+        max_workers_per_host=args.workers_per_host,
+        manifest=manifest,
+        scheduler=scheduler)
+
+    startTime = datetime.datetime.strptime(args.start, '%Y%m%d')
+    stopTime = datetime.datetime.strptime(args.stop, '%Y%m%d')
+
+    backendOptions = {}
+    if args.output_mode == 'per_launch':
+        backendOptions = {'downloader': rs, 'force': True}
+    elif args.output_mode == 'aggregated':
+        backendOptions = {'period': args.aggregate_period,
+                          'layout': args.aggregate_layout}
+    backend = get_backend(args.output_mode, args.output_dir,
+                          **backendOptions)
+
+    catalog = None
+    if args.catalog is not None:
+        catalog = RadiosondeDB(args.catalog)
+
+    uploader = None
+    if args.upload is not None:
+        sinkArgs = () if args.upload_dir is None else (args.upload_dir,)
+        uploader = Uploader(get_sink(args.upload, *sinkArgs))
+
+    def write_sounding(thisData, thisDims, thisGAttrs):
+        station = thisGAttrs['station_number']
+        if (manifest is not None) and \
+           ((station, thisData['launch_time']) in manifest):
+            return
+
+        rsFile = backend.write(thisData, thisDims, thisGAttrs)
+
+        if (manifest is not None) and (rsFile is not None):
+            manifest.add(station, thisData['launch_time'])
+        if (catalog is not None) and (rsFile is not None):
+            catalog.add_sounding(thisData, thisDims, thisGAttrs, rsFile)
+        # the files of one launch are final, while the aggregated files are
+        # appended until the backend is closed
+        if (uploader is not None) and (rsFile is not None) and \
+           (args.output_mode == 'per_launch'):
+            uploader.submit(rsFile)
+
+    # downloads, parsing and writing run concurrently, and every sounding
+    # is saved as soon as it's parsed
+    try:
+        errors = pipeline.run(args.station, startTime, stopTime,
+                              write_sounding)
+    finally:
+        backend.close()
+        if catalog is not None:
+            catalog.close()
+        if manifest is not None:
+            manifest.save()
+        if uploader is not None:
+            # only the files touched by this run, the others are archived
+            if args.output_mode != 'per_launch':
+                uploader.submit_files(backend.written_files, args.output_dir)
+            uploader.close()
+
+    for line in pipeline.report():
+        print(line)
+    if uploader is not None:
+        print('upload: {summary}'.format(summary=uploader.summary()))
+
+    metrics = get_metrics()
+    for line in metrics.summary():
+        print(line)
+    if args.metrics is not None:
+        metrics.dump(args.metrics, format=args.metrics_format)
+
+    if errors:
+        return 1
+    if (uploader is not None) and \
+       any(result.status == 'failed' for result in uploader.results):
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
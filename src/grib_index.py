@@ -0,0 +1,379 @@
+import os
+import json
+import mmap
+import collections
+from logger_init import ECMWF_logger
+
+logger = ECMWF_logger()
+
+INDEX_SUFFIX = '.gribidx'
+INDEX_VERSION = 1
+
+# GRIB1 units of the time range (code table 4) in hours
+GRIB1_TIME_UNITS = {0: 1 / 60, 1: 1, 2: 24, 10: 3, 11: 6, 12: 12,
+                    254: 1 / 3600}
+# GRIB2 units of the time range (code table 4.4) in hours
+GRIB2_TIME_UNITS = {0: 1 / 60, 1: 1, 2: 24, 10: 3, 11: 6, 12: 12,
+                    13: 1 / 3600}
+
+# one message of a GRIB file. param is 'number.table' (e.g. '167.128') for
+# GRIB1 and 'discipline.category.number' for GRIB2. date is YYYYMMDD, time
+# is HHMM and step is in hours.
+GribMessage = collections.namedtuple(
+    'GribMessage', ['offset', 'length', 'edition', 'param', 'level_type',
+                    'level', 'date', 'time', 'step']
+)
+
+
+def _uint(data, start, size):
+
+    return int.from_bytes(data[start:(start + size)], 'big')
+
+
+def _step(value, unit, units):
+
+    hours = value * units.get(unit, 1)
+
+    return int(hours) if float(hours).is_integer() else hours
+
+
+def parse_grib1_header(pds, offset, length):
+    """
+    parse the product definition section (section 1) of a GRIB1 message.
+
+    Parameters
+    ----------
+    pds: bytes
+        section 1 of the message.
+    offset: integer
+        position of the message in the file. [byte]
+    length: integer
+        length of the message. [byte]
+    """
+
+    table2 = pds[3]
+    param = pds[8]
+    levelType = pds[9]
+    level = _uint(pds, 10, 2)
+    century = pds[24] if len(pds) > 24 else 21
+    year = (century - 1) * 100 + pds[12]
+    date = year * 10000 + pds[13] * 100 + pds[14]
+    time = pds[15] * 100 + pds[16]
+
+    # P1 spans the octets of P1 and P2 for the time range indicator 10
+    if pds[20] == 10:
+        step = _step(_uint(pds, 18, 2), pds[17], GRIB1_TIME_UNITS)
+    else:
+        step = _step(pds[18], pds[17], GRIB1_TIME_UNITS)
+
+    return GribMessage(offset, length, 1,
+                       '{param:d}.{table:d}'.format(param=param, table=table2),
+                       levelType, level, date, time, step)
+
+
+def parse_grib2_header(discipline, ids, pds, offset, length):
+    """
+    parse the identification (1) and product definition (4) sections of a
+    GRIB2 message.
+
+    Parameters
+    ----------
+    discipline: integer
+        discipline of section 0.
+    ids: bytes
+        section 1 of the message.
+    pds: bytes
+        first section 4 of the message.
+    """
+
+    date = _uint(ids, 12, 2) * 10000 + ids[14] * 100 + ids[15]
+    time = ids[16] * 100 + ids[17]
+
+    step = _step(_uint(pds, 18, 4), pds[17], GRIB2_TIME_UNITS)
+    levelType = pds[22]
+    scale = pds[23]
+    level = _uint(pds, 24, 4)
+    if scale not in (0, 255):
+        level = level / 10 ** scale
+        if level.is_integer():
+            level = int(level)
+
+    param = '{discipline:d}.{category:d}.{number:d}'.format(
+        discipline=discipline, category=pds[9], number=pds[10])
+
+    return GribMessage(offset, length, 2, param, levelType, level, date,
+                       time, step)
+
+
+def _scan_grib1(fh, offset, indicator):
+
+    length = _uint(indicator, 4, 3)
+    fh.seek(offset + 8)
+    pds = fh.read(_uint(indicator, 8, 3))
+
+    if length & 0x800000:
+        # large message of ECMWF: the length is coded in units of 120 bytes
+        # and corrected by the length of section 4
+        length = (length & 0x7fffff) * 120
+        position = offset + 8 + len(pds)
+        for flag in (0x80, 0x40):
+            # optional grid description and bit-map sections
+            if pds[7] & flag:
+                fh.seek(position)
+                position += _uint(fh.read(3), 0, 3)
+        fh.seek(position)
+        sec4Length = _uint(fh.read(3), 0, 3)
+        if sec4Length < 120:
+            length = length - sec4Length + 4
+
+    return parse_grib1_header(pds, offset, length)
+
+
+def _scan_grib2(fh, offset, indicator):
+
+    length = _uint(indicator, 8, 8)
+    ids = pds = None
+
+    # only sections 1 and 4 are read, the others are skipped by their length
+    position = offset + 16
+    while (pds is None) and (position + 5 <= offset + length - 4):
+        fh.seek(position)
+        head = fh.read(5)
+        sectionLength = _uint(head, 0, 4)
+        if sectionLength < 5:
+            break
+
+        if head[4] == 1:
+            ids = head + fh.read(sectionLength - 5)
+        elif head[4] == 4:
+            pds = head + fh.read(sectionLength - 5)
+        position += sectionLength
+
+    if (ids is None) or (pds is None):
+        raise ValueError(('Missing section 1 or 4 in the GRIB2 message ' +
+                          'at {pos:d}').format(pos=offset))
+
+    # only the first field of a message with several fields is indexed
+    return parse_grib2_header(indicator[6], ids, pds, offset, length)
+
+
+def scan_grib(file):
+    """
+    scan the section headers of every message in the GRIB file.
+
+    Only the headers of the messages are read (a few hundred bytes each),
+    and the data sections are skipped with the message lengths of section
+    0. Both GRIB1 and GRIB2 are supported.
+
+    Returns
+    -------
+    messages: list
+        `GribMessage` of every message in the order of the file.
+
+    Raises
+    ------
+    ValueError:
+        if a message is truncated or of an unknown edition.
+    """
+
+    messages = []
+    fileSize = os.path.getsize(file)
+
+    with open(file, 'rb') as fh:
+        offset = 0
+        while offset + 16 <= fileSize:
+            fh.seek(offset)
+            indicator = fh.read(16)
+            if indicator[0:4] != b'GRIB':
+                # skip the padding between the messages
+                fh.seek(offset)
+                chunk = fh.read(65536)
+                position = chunk.find(b'GRIB', 1)
+                if position < 0:
+                    offset += max(1, len(chunk) - 3)
+                else:
+                    offset += position
+                continue
+
+            edition = indicator[7]
+            if edition == 1:
+                message = _scan_grib1(fh, offset, indicator)
+            elif edition == 2:
+                message = _scan_grib2(fh, offset, indicator)
+            else:
+                raise ValueError(('Unknown GRIB edition {edition:d} at ' +
+                                  '{pos:d}').format(edition=edition,
+                                                    pos=offset))
+
+            fh.seek(offset + message.length - 4)
+            if fh.read(4) != b'7777':
+                raise ValueError(('Truncated GRIB message at {pos:d} in ' +
+                                  '{file}').format(pos=offset, file=file))
+
+            messages.append(message)
+            offset += message.length
+
+    return messages
+
+
+def index_file(file):
+    """
+    path of the sidecar index of the GRIB file.
+    """
+
+    return file + INDEX_SUFFIX
+
+
+def build_index(file):
+    """
+    scan the GRIB file and save its index in the sidecar file.
+
+    Returns
+    -------
+    messages: list
+        `GribMessage` of every message.
+    """
+
+    messages = scan_grib(file)
+    stat = os.stat(file)
+
+    tmpFile = '{file}.{pid:d}.tmp'.format(file=index_file(file),
+                                          pid=os.getpid())
+    with open(tmpFile, 'w', encoding='utf-8') as fh:
+        json.dump({
+            'version': INDEX_VERSION,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'fields': list(GribMessage._fields),
+            'messages': [list(message) for message in messages],
+        }, fh)
+    os.replace(tmpFile, index_file(file))
+
+    return messages
+
+
+def load_index(file):
+    """
+    load the sidecar index of the GRIB file, and rebuild it if it's missing
+    or older than the file.
+    """
+
+    try:
+        with open(index_file(file), 'r', encoding='utf-8') as fh:
+            content = json.load(fh)
+
+        stat = os.stat(file)
+        if (content['version'] == INDEX_VERSION) and \
+           (content['size'] == stat.st_size) and \
+           (content['mtime'] == stat.st_mtime):
+            return [GribMessage(*message) for message in content['messages']]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    logger.debug('Build the GRIB index of {file}'.format(file=file))
+
+    return build_index(file)
+
+
+class GribReader(object):
+    """
+    Random access to the messages of a GRIB file through its index.
+
+    The file is memory-mapped, so selecting a parameter only reads the
+    pages of its messages instead of the whole file.
+
+    Example
+    -------
+    >>> with GribReader('cams_nrealtime_201910.grib') as reader:
+    ...     messages = reader.select(param='167.128', time=1200)
+    ...     data = reader.read(messages[0])
+    ...     reader.extract('t2m_12UTC.grib', param='167.128', time=1200)
+    """
+
+    def __init__(self, file):
+
+        self.file = file
+        self.messages = load_index(file)
+        self._fh = open(file, 'rb')
+        self._mmap = None
+        if os.path.getsize(file) > 0:
+            self._mmap = mmap.mmap(self._fh.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+
+    def select(self, **filters):
+        """
+        messages matching all the filters.
+
+        Keywords
+        --------
+        param, level_type, level, date, time, step, edition:
+            required value of the field. A list or tuple of values is
+            matched by any of them.
+
+        Returns
+        -------
+        messages: list
+            `GribMessage` in the order of the file.
+        """
+
+        for key in filters:
+            if key not in GribMessage._fields:
+                raise ValueError('Unknown GRIB field: {key}'.format(key=key))
+
+        def match(message):
+            for key, value in filters.items():
+                if isinstance(value, (list, tuple, set)):
+                    if getattr(message, key) not in value:
+                        return False
+                elif getattr(message, key) != value:
+                    return False
+            return True
+
+        return [message for message in self.messages if match(message)]
+
+    def read(self, message):
+        """
+        bytes of the message.
+        """
+
+        return self._mmap[message.offset:(message.offset + message.length)]
+
+    def iter_messages(self, **filters):
+        """
+        iterate the bytes of the messages matching the filters.
+        """
+
+        for message in self.select(**filters):
+            yield self.read(message)
+
+    def extract(self, output_file, **filters):
+        """
+        write the messages matching the filters into a new GRIB file.
+
+        Returns
+        -------
+        count: integer
+            number of the written messages.
+        """
+
+        count = 0
+        with open(output_file, 'wb') as fh:
+            for data in self.iter_messages(**filters):
+                fh.write(data)
+                count += 1
+
+        return count
+
+    def close(self):
+
+        if self._mmap is not None:
+            self._mmap.close()
+        self._fh.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
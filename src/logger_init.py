@@ -1,9 +1,9 @@
 import os
 import sys
 import logging
+import functools
 from configs import load_logger_config
 
-logger_configs = load_logger_config()
 logModeDict = {
     'INFO': logging.INFO,
     'WARNING': logging.WARNING,
@@ -12,30 +12,36 @@ logModeDict = {
     }
 projectDir = os.path.dirname(__file__)
 
-# check the folder for saving log files
+# folder for saving log files
 logDir = os.path.join(projectDir, 'log')
-if not os.path.exists(logDir):
-    os.mkdir(logDir)
 
 
-def radiosonde_logger_init():
+def config_logger(logger, config):
     """
-    initialize the logger for processing radiosonde data.
+    attach the file and command line handlers of the configuration.
+
+    Parameters
+    ----------
+    logger: `logging.Logger`
+        logger to be configured.
+    config: dict
+        section of `logger_config.toml`.
     """
 
-    rsConfig = logger_configs['radiosonde']
+    # check the folder for saving log files
+    if not os.path.exists(logDir):
+        os.makedirs(logDir, exist_ok=True)
 
     logFile = os.path.join(
-        projectDir, 'log', rsConfig['LOG_FILE'])
-    logger = logging.getLogger(__name__)
+        projectDir, 'log', config['LOG_FILE'])
 
     fh = logging.FileHandler(logFile)
-    fh.setLevel(logModeDict[rsConfig['LOG_MODE_FH']])
+    fh.setLevel(logModeDict[config['LOG_MODE_FH']])
     ch = logging.StreamHandler(sys.stdout)
-    ch.setLevel(logModeDict[rsConfig['LOG_MODE_CH']])
+    ch.setLevel(logModeDict[config['LOG_MODE_CH']])
 
-    formatterFh = logging.Formatter(rsConfig['FORMATTER_FH'])
-    formatterCh = logging.Formatter(rsConfig['FORMATTER_CH'])
+    formatterFh = logging.Formatter(config['FORMATTER_FH'])
+    formatterCh = logging.Formatter(config['FORMATTER_CH'])
     fh.setFormatter(formatterFh)
     ch.setFormatter(formatterCh)
 
@@ -45,3 +51,64 @@ def radiosonde_logger_init():
     logger.setLevel(logModeDict['DEBUG'])
 
     return logger
+
+
+@functools.lru_cache(maxsize=None)
+def radiosonde_logger_init():
+    """
+    initialize the logger for processing radiosonde data.
+    """
+
+    logger = logging.getLogger(__name__)
+    if logger.handlers:
+        # handlers were already attached by another module
+        return logger
+
+    return config_logger(logger, load_logger_config()['radiosonde'])
+
+
+@functools.lru_cache(maxsize=None)
+def ECMWF_logger_init():
+    """
+    initialize the logger for downloading and indexing ECMWF data.
+    """
+
+    logger = logging.getLogger('ECMWF')
+    if logger.handlers:
+        # handlers were already attached by another module
+        return logger
+
+    return config_logger(logger, load_logger_config()['ECMWF'])
+
+
+class LazyLogger(object):
+    """
+    Proxy of a logger which is initialized at its first use.
+
+    Modules create the proxy at import time, so that importing them doesn't
+    read the logger configurations or create the log file.
+    """
+
+    def __init__(self, init):
+
+        self._init = init
+
+    def __getattr__(self, name):
+
+        return getattr(self._init(), name)
+
+
+def radiosonde_logger():
+    """
+    get the lazily initialized logger for processing radiosonde data.
+    """
+
+    return LazyLogger(radiosonde_logger_init)
+
+
+def ECMWF_logger():
+    """
+    get the lazily initialized logger for downloading ECMWF data.
+    """
+
+    return LazyLogger(ECMWF_logger_init)
@@ -0,0 +1,298 @@
+import json
+import time
+import bisect
+import threading
+import contextlib
+
+# upper bounds of the latency histograms [s]
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0,
+                   30.0, 60.0)
+
+# metrics of the radiosonde downloads: name -> (type, help)
+RADIOSONDE_METRICS = {
+    'radiosonde_http_requests_total':
+        ('counter', 'HTTP requests sent to the sounding server'),
+    'radiosonde_http_retries_total':
+        ('counter', 'HTTP requests retried after a failure'),
+    'radiosonde_http_bytes_total':
+        ('counter', 'bytes of the HTTP responses'),
+    'radiosonde_http_seconds':
+        ('histogram', 'time of the HTTP requests including retries'),
+    'radiosonde_busy_pages_total':
+        ('counter', 'busy/error pages returned instead of soundings'),
+    'radiosonde_requeues_total':
+        ('counter', 'tasks re-queued after a busy page'),
+    'radiosonde_cache_hits_total':
+        ('counter', 'responses served by the response cache'),
+    'radiosonde_cache_misses_total':
+        ('counter', 'responses missing in the response cache'),
+    'radiosonde_parse_seconds':
+        ('histogram', 'time of parsing one response'),
+    'radiosonde_soundings_parsed_total':
+        ('counter', 'soundings parsed from the responses'),
+    'radiosonde_levels_parsed_total':
+        ('counter', 'levels parsed from the sounding tables'),
+    'radiosonde_write_seconds':
+        ('histogram', 'time of writing one sounding'),
+    'radiosonde_soundings_written_total':
+        ('counter', 'soundings written by the output backends'),
+}
+
+# registry shared by the process, created by `get_metrics`
+_sharedMetrics = None
+_sharedMetricsLock = threading.Lock()
+
+
+class Histogram(object):
+    """
+    Cumulative histogram of observed values with fixed buckets.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        """
+        number of the observations <= every bucket (and +Inf).
+        """
+
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+
+        return counts
+
+
+class MetricsRegistry(object):
+    """
+    Counters and histograms of a run, with hooks for every event.
+
+    The hooks are called with (kind, name, value) for every increment
+    ('counter') and observation ('histogram'), e.g. to feed another
+    monitoring system or to print the progress. At the end of a run the
+    metrics can be dumped as json or in the Prometheus text format.
+
+    Example
+    -------
+    >>> metrics = get_metrics()
+    >>> metrics.add_hook(lambda kind, name, value: print(name, value))
+    >>> with metrics.timer('radiosonde_parse_seconds'):
+    ...     rs.parse_html(html)
+    >>> print(metrics.to_prometheus())
+    """
+
+    def __init__(self, definitions=None):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        definitions: dict
+            name -> (type, help) of the known metrics (default:
+            `RADIOSONDE_METRICS`). Unknown metrics are created at their
+            first use.
+        """
+
+        if definitions is None:
+            definitions = RADIOSONDE_METRICS
+
+        self.definitions = dict(definitions)
+        self._counters = {}
+        self._histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+        for name, (kind, _) in self.definitions.items():
+            if kind == 'counter':
+                self._counters[name] = 0
+            else:
+                self._histograms[name] = Histogram()
+
+    def add_hook(self, hook):
+        """
+        call `hook(kind, name, value)` for every event.
+        """
+
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+
+        with self._lock:
+            self._hooks.remove(hook)
+
+    def _notify(self, kind, name, value):
+
+        for hook in self._hooks:
+            hook(kind, name, value)
+
+    def increment(self, name, value=1):
+        """
+        increment the counter.
+        """
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        self._notify('counter', name, value)
+
+    def observe(self, name, value):
+        """
+        add an observation to the histogram.
+        """
+
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram()
+            self._histograms[name].observe(value)
+        self._notify('histogram', name, value)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """
+        observe the time of the block in the histogram. [s]
+        """
+
+        tStart = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - tStart)
+
+    def counter(self, name):
+
+        return self._counters.get(name, 0)
+
+    def histogram(self, name):
+
+        return self._histograms.get(name)
+
+    def reset(self):
+        """
+        reset all the metrics to zero.
+        """
+
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+            for name in self._histograms:
+                self._histograms[name] = Histogram(
+                    self._histograms[name].buckets)
+
+    def as_dict(self):
+        """
+        snapshot of all the metrics.
+        """
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                name: {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': dict(zip(
+                        [str(bound) for bound in histogram.buckets] +
+                        ['+Inf'],
+                        histogram.cumulative_counts())),
+                }
+                for name, histogram in self._histograms.items()
+            }
+
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_json(self):
+
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self):
+        """
+        metrics in the Prometheus text exposition format.
+        """
+
+        snapshot = self.as_dict()
+        lines = []
+
+        def header(name, kind):
+            helpText = self.definitions.get(name, (kind, name))[1]
+            lines.append('# HELP {name} {help}'.format(name=name,
+                                                       help=helpText))
+            lines.append('# TYPE {name} {kind}'.format(name=name, kind=kind))
+
+        for name, value in sorted(snapshot['counters'].items()):
+            header(name, 'counter')
+            lines.append('{name} {value}'.format(name=name, value=value))
+
+        for name, item in sorted(snapshot['histograms'].items()):
+            header(name, 'histogram')
+            for bound, count in item['buckets'].items():
+                lines.append('{name}_bucket{{le="{le}"}} {count:d}'.format(
+                    name=name, le=bound, count=count))
+            lines.append('{name}_sum {value!r}'.format(name=name,
+                                                       value=item['sum']))
+            lines.append('{name}_count {value:d}'.format(name=name,
+                                                         value=item['count']))
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, file, format='json'):
+        """
+        save the metrics as 'json' or 'prometheus' text.
+        """
+
+        if format == 'json':
+            text = self.to_json()
+        elif format == 'prometheus':
+            text = self.to_prometheus()
+        else:
+            raise ValueError('Unknown metrics format: {format}'.format(
+                format=format))
+
+        with open(file, 'w', encoding='utf-8') as fh:
+            fh.write(text)
+
+    def summary(self):
+        """
+        totals of the time spent on the network, the parsing and the writing.
+
+        Returns
+        -------
+        summary: list
+            one line for every stage.
+        """
+
+        lines = []
+        for stage, name in [('http', 'radiosonde_http_seconds'),
+                            ('parse', 'radiosonde_parse_seconds'),
+                            ('write', 'radiosonde_write_seconds')]:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                continue
+            lines.append('{stage}: {n:d} calls, {total:.2f} s'.format(
+                stage=stage, n=histogram.count, total=histogram.sum))
+
+        return lines
+
+
+def get_metrics():
+    """
+    get the metrics registry shared by the process.
+    """
+
+    global _sharedMetrics
+
+    with _sharedMetricsLock:
+        if _sharedMetrics is None:
+            _sharedMetrics = MetricsRegistry()
+
+    return _sharedMetrics
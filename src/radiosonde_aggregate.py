@@ -0,0 +1,327 @@
+import os
+import collections
+import numpy as np
+from configs import load_download_config, download_defaults
+from logger_init import radiosonde_logger
+from metrics import get_metrics
+from radiosonde_backends import SoundingBackend
+from radiosonde_schema import get_netcdf_schema, launch_timestamp
+
+logger = radiosonde_logger()
+
+AGGREGATE_PERIODS = {'month': '%Y%m', 'year': '%Y'}
+AGGREGATE_LAYOUTS = ['ragged', 'padded']
+
+TIME_UNITS = 'seconds since 1970-01-01 00:00:00 UTC'
+
+
+class AggregatedNetCDFWriter(SoundingBackend):
+    """
+    Append soundings to one netCDF file per station and month (or year).
+
+    Each file has an unlimited `time` dimension with one entry per sounding.
+    The levels are stored either as a CF contiguous ragged array
+    (layout='ragged', an unlimited `obs` dimension with the `row_size` count
+    variable) or padded to the longest sounding (layout='padded', a
+    (time, level) grid filled with _FillValue).
+
+    Example
+    -------
+    >>> writer = AggregatedNetCDFWriter('/data/radiosonde', period='month')
+    >>> for rsData, rsDims, rsGAttrs in rs.iter_soundings(57494, start, end):
+    ...     writer.write(rsData, rsDims, rsGAttrs)
+    >>> writer.close()
+    """
+
+    def __init__(self, output_dir, *args, period=None, layout=None,
+                 chunk_time=None, chunk_levels=None, complevel=None,
+                 max_open_files=None, file_naming=None):
+        """
+        initialize the instance. The default values are taken from the
+        [radiosonde_aggregate] section of `download_config.toml`.
+
+        Parameters
+        ----------
+        output_dir: str
+            output directory for saving the netCDF files.
+
+        Keywords
+        --------
+        period: str
+            'month' or 'year'. Period of the soundings in one file.
+        layout: str
+            'ragged' or 'padded'. Storage of the levels.
+        chunk_time: integer
+            chunk size along the `time` dimension.
+        chunk_levels: integer
+            chunk size along the `obs` (ragged) or `level` (padded)
+            dimension.
+        complevel: integer
+            zlib compression level (0 disables the compression).
+        max_open_files: integer
+            number of files which are kept open for appending.
+        file_naming: str
+            naming pattern with the fields {sitenum} and {period}.
+        """
+
+        default = download_defaults('radiosonde_aggregate')
+
+        self.output_dir = output_dir
+        self.period = default(period, 'period')
+        self.layout = default(layout, 'layout')
+        self.chunk_time = default(chunk_time, 'chunk_time')
+        self.chunk_levels = default(chunk_levels, 'chunk_levels')
+        self.complevel = default(complevel, 'complevel')
+        self.max_open_files = default(max_open_files, 'max_open_files')
+        self.file_naming = default(file_naming, 'nc_file_naming')
+
+        if self.period not in AGGREGATE_PERIODS:
+            raise ValueError('Unknown period: {period}'.format(
+                period=self.period))
+        if self.layout not in AGGREGATE_LAYOUTS:
+            raise ValueError('Unknown layout: {layout}'.format(
+                layout=self.layout))
+
+        self.schema = get_netcdf_schema()
+        self.metrics = get_metrics()
+        self.netCDF_format = \
+            load_download_config()['radiosonde']['NETCDF_FORMAT']
+
+        # open datasets and their launch times, in the order of last use
+        self._datasets = collections.OrderedDict()
+        self.written_files = []
+
+    def output_filepath(self, station, launch_time):
+        """
+        path of the file which contains the sounding.
+        """
+
+        filename = self.file_naming.format(
+            sitenum=station,
+            period=launch_time.strftime(AGGREGATE_PERIODS[self.period])
+        )
+
+        return os.path.join(self.output_dir, filename)
+
+    def level_dims(self):
+        """
+        netCDF dimensions of the variables along the altitude.
+        """
+
+        if self.layout == 'ragged':
+            return ('obs',)
+        else:
+            return ('time', 'level')
+
+    def _create_dataset(self, filepath, rsGlobalAttrs):
+
+        from netCDF4 import Dataset
+
+        dataset = Dataset(filepath, 'w', format=self.netCDF_format)
+
+        dataset.createDimension('time', None)
+        if self.layout == 'ragged':
+            dataset.createDimension('obs', None)
+            dataset.featureType = 'profile'
+        else:
+            dataset.createDimension('level', None)
+
+        compression = {}
+        if self.complevel > 0:
+            compression = {'zlib': True, 'complevel': self.complevel,
+                           'shuffle': True}
+
+        for varSchema in self.schema.variables.values():
+            if 'altitude' in varSchema.dims:
+                dims = self.level_dims()
+                if self.layout == 'ragged':
+                    chunksizes = (self.chunk_levels,)
+                else:
+                    chunksizes = (self.chunk_time, self.chunk_levels)
+            else:
+                dims = ('time',)
+                chunksizes = (self.chunk_time,)
+
+            self.schema.create_variable(dataset, varSchema.name, dims=dims,
+                                        chunksizes=chunksizes, **compression)
+
+        # launch time is the time coordinate of the profiles
+        dataset.variables['launch_time'].units = TIME_UNITS
+        dataset.variables['launch_time'].calendar = 'standard'
+
+        if self.layout == 'ragged':
+            rowSize = dataset.createVariable(
+                'row_size', np.intc, ('time',),
+                chunksizes=(self.chunk_time,), **compression
+            )
+            rowSize.long_name = 'number of levels of each sounding'
+            rowSize.sample_dimension = 'obs'
+
+        dataset.setncatts({key: value
+                           for key, value in rsGlobalAttrs.items()
+                           if value is not None})
+        dataset.history = self.schema.history()
+
+        return dataset
+
+    def _check_layout(self, dataset, filepath):
+        """
+        raise ValueError if the existing file has another layout.
+        """
+
+        if ('obs' in dataset.dimensions) and ('row_size' in dataset.variables):
+            fileLayout = 'ragged'
+        elif 'level' in dataset.dimensions:
+            fileLayout = 'padded'
+        else:
+            fileLayout = 'unknown'
+
+        if fileLayout != self.layout:
+            dataset.close()
+            raise ValueError(('{file} has the {fileLayout} layout, but the ' +
+                              'writer uses the {layout} layout.').format(
+                                  file=filepath, fileLayout=fileLayout,
+                                  layout=self.layout))
+
+    def _committed_times(self, dataset):
+        """
+        number of the soundings which are completely written. The row size
+        (ragged) or the launch time (padded) of a sounding is written last,
+        so a sounding which failed midway is left out and overwritten by
+        the next one.
+        """
+
+        if self.layout == 'ragged':
+            marker = dataset.variables['row_size']
+        else:
+            marker = dataset.variables['launch_time']
+
+        return int(np.ma.count(marker[:]))
+
+    def _open(self, filepath, rsGlobalAttrs):
+        """
+        get the open dataset of the file, the launch times in it and the
+        indices of the next sounding along `time` and `obs`.
+        """
+
+        if filepath in self._datasets:
+            self._datasets.move_to_end(filepath)
+            return self._datasets[filepath]
+
+        from netCDF4 import Dataset
+
+        if os.path.exists(filepath):
+            dataset = Dataset(filepath, 'a')
+            self._check_layout(dataset, filepath)
+
+            nTime = self._committed_times(dataset)
+            launchTimes = set(
+                np.ma.filled(dataset.variables['launch_time'][:nTime],
+                             np.nan).tolist()
+            )
+            nObs = 0
+            if self.layout == 'ragged':
+                nObs = int(np.ma.filled(
+                    dataset.variables['row_size'][:nTime], 0).sum())
+        else:
+            dataset = self._create_dataset(filepath, rsGlobalAttrs)
+            launchTimes = set()
+            nTime, nObs = 0, 0
+
+        self._datasets[filepath] = (dataset, launchTimes, [nTime, nObs])
+
+        while len(self._datasets) > self.max_open_files:
+            _, (oldDataset, *_) = self._datasets.popitem(last=False)
+            oldDataset.close()
+
+        return self._datasets[filepath]
+
+    def write(self, rsData, rsDims, rsGlobalAttrs):
+        """
+        Append the sounding to its file.
+
+        Parameters
+        ----------
+        rsData: dict
+            radiosonde data of the sounding. See `RSDownloader.getData`.
+        rsDims: dict
+            dimensions of the sounding.
+        rsGlobalAttrs: dict
+            radiosonde metadata of the sounding.
+
+        Returns
+        -------
+        output_filepath: str
+            path of the file. None if the sounding exists in the file.
+        """
+
+        with self.metrics.timer('radiosonde_write_seconds'):
+            output_filepath = self._append(rsData, rsDims, rsGlobalAttrs)
+
+        if output_filepath is not None:
+            self.metrics.increment('radiosonde_soundings_written_total')
+
+        return output_filepath
+
+    def _append(self, rsData, rsDims, rsGlobalAttrs):
+        """
+        append the sounding without the metrics. See `write`.
+        """
+
+        if (not rsData) or (not rsDims) or (not rsGlobalAttrs):
+            return None
+
+        launchTime = rsData['launch_time']
+        output_filepath = self.output_filepath(
+            rsGlobalAttrs['station_number'], launchTime
+        )
+        dataset, launchTimes, nextIndex = self._open(output_filepath,
+                                                     rsGlobalAttrs)
+
+        timestamp = launch_timestamp(launchTime)
+        if timestamp in launchTimes:
+            logger.warning('Sounding at {time} exists in {file}. Jump over'.
+                           format(time=launchTime, file=output_filepath))
+            return None
+
+        iTime, iObs = nextIndex
+        nLevels = rsDims['altitude']
+
+        # the launch time goes after the data and the row size after all,
+        # so that the sounding only counts once it's completely written
+        varKeys = sorted([key for key in rsData if key in dataset.variables],
+                         key=lambda key: key == 'launch_time')
+        for var_key in varKeys:
+            if var_key == 'launch_time':
+                value = timestamp
+            else:
+                value = np.ma.masked_invalid(
+                    np.asarray(rsData[var_key], dtype=np.float64)
+                )
+
+            if 'altitude' in self.schema.variables[var_key].dims:
+                if self.layout == 'ragged':
+                    dataset.variables[var_key][iObs:(iObs + nLevels)] = value
+                else:
+                    dataset.variables[var_key][iTime, :nLevels] = value
+            else:
+                dataset.variables[var_key][iTime] = value
+
+        if self.layout == 'ragged':
+            dataset.variables['row_size'][iTime] = nLevels
+        nextIndex[:] = [iTime + 1, iObs + nLevels]
+
+        launchTimes.add(timestamp)
+        if output_filepath not in self.written_files:
+            self.written_files.append(output_filepath)
+
+        return output_filepath
+
+    def close(self):
+        """
+        Close all the open files.
+        """
+
+        while self._datasets:
+            _, (dataset, *_) = self._datasets.popitem(last=False)
+            dataset.close()
@@ -0,0 +1,464 @@
+import os
+import abc
+import json
+import uuid
+import itertools
+import importlib
+import numpy as np
+from configs import load_download_config, download_defaults
+from configs import load_radiosonde_metadata
+from logger_init import radiosonde_logger
+from metrics import get_metrics
+
+logger = radiosonde_logger()
+
+# output backends: name -> (module, class). The modules are imported when
+# the backend is created, so that the optional dependencies are only needed
+# by the backends in use.
+OUTPUT_BACKENDS = {
+    'per_launch': ('radiosonde_backends', 'NetCDFBackend'),
+    'aggregated': ('radiosonde_aggregate', 'AggregatedNetCDFWriter'),
+    'parquet': ('radiosonde_backends', 'ParquetBackend'),
+}
+
+# sounding metadata stored as columns of every level
+PARQUET_STATION_COLUMNS = [
+    ('station_number', 'int32'),
+    ('station_name', 'string'),
+    ('station_latitude', 'float64'),
+    ('station_longitude', 'float64'),
+    ('station_elevation', 'float64'),
+]
+
+# variable attributes which are not kept in the parquet schema
+PARQUET_RESERVED_ATTRS = ['dtype', 'dims', '_FillValue', 'missing_value']
+
+
+class SoundingBackend(abc.ABC):
+    """
+    Interface of the output backends of the soundings.
+
+    A backend receives the soundings one by one from `write` in the order
+    they are downloaded and must persist all of them before `close` returns.
+    The paths of the files written or appended by the backend are listed in
+    `written_files`, e.g. to archive only the files touched by a run.
+    """
+
+    written_files = ()
+
+    @abc.abstractmethod
+    def write(self, rsData, rsDims, rsGlobalAttrs):
+        """
+        Save a single sounding.
+
+        Parameters
+        ----------
+        rsData: dict
+            radiosonde data of the sounding. See `RSDownloader.getData`.
+        rsDims: dict
+            dimensions of the sounding.
+        rsGlobalAttrs: dict
+            radiosonde metadata of the sounding.
+
+        Returns
+        -------
+        output_filepath: str
+            path of the file which holds the sounding, or of the partition
+            directory for the backends which buffer the soundings. None if
+            the sounding was skipped.
+        """
+
+    def close(self):
+        """
+        Flush the buffered soundings and release the files.
+        """
+
+        pass
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+
+def get_backend(name, output_dir, **kwargs):
+    """
+    create the output backend by its name.
+
+    Parameters
+    ----------
+    name: str
+        one of `OUTPUT_BACKENDS`.
+    output_dir: str
+        output directory of the backend.
+    kwargs: dict
+        keywords passed to the backend.
+    """
+
+    if name not in OUTPUT_BACKENDS:
+        raise ValueError('Unknown output backend: {name}. Choose from {opts}'.
+                         format(name=name, opts=list(OUTPUT_BACKENDS)))
+
+    moduleName, className = OUTPUT_BACKENDS[name]
+    backendClass = getattr(importlib.import_module(moduleName), className)
+
+    return backendClass(output_dir, **kwargs)
+
+
+class NetCDFBackend(SoundingBackend):
+    """
+    One netCDF file per sounding, written by `RSDownloader.save_netCDF`.
+    """
+
+    def __init__(self, output_dir, *args, downloader=None, force=True):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        output_dir: str
+            output directory for saving the netCDF files.
+
+        Keywords
+        --------
+        downloader: `RSDownloader`
+            downloader which writes the files. A new one will be created if
+            it's not given.
+        force: boolean
+            flag to control whether overwrite the netCDF file if it exists.
+        """
+
+        if downloader is None:
+            from radiosonde_downloader import RSDownloader
+            downloader = RSDownloader()
+
+        self.output_dir = output_dir
+        self.downloader = downloader
+        self.force = force
+        self.written_files = []
+
+    def write(self, rsData, rsDims, rsGlobalAttrs):
+
+        output_filepath = self.downloader.save_netCDF(
+            rsData, rsDims, rsGlobalAttrs, self.output_dir, force=self.force)
+        if output_filepath is not None:
+            self.written_files.append(output_filepath)
+
+        return output_filepath
+
+
+class ParquetBackend(SoundingBackend):
+    """
+    Columnar storage of the soundings in Parquet, with one row per level.
+
+    The rows are partitioned by station and year with hive-style
+    directories, e.g. `station=57494/year=2019/part-<uuid>.parquet`, and the
+    station and launch metadata are stored as columns of every row, so that
+    the levels can be filtered with predicate pushdown without opening any
+    netCDF file. The attributes of `radiosonde_metadata.toml` are kept as
+    the field metadata and the schema metadata.
+
+    Soundings are buffered per partition and written in batches of
+    `batch_rows` rows. `write` returns the partition directory of the
+    sounding, whose rows are written there at the latest by `close`. The
+    rows of a sounding which is already in its partition are replaced, so
+    rerunning an overlapping period doesn't duplicate it. Requires
+    `pyarrow`.
+
+    Example
+    -------
+    >>> with ParquetBackend('/data/radiosonde_parquet') as backend:
+    ...     for sounding in rs.iter_soundings(57494, start, end):
+    ...         backend.write(*sounding)
+    >>> import pyarrow.dataset as ds
+    >>> table = read_parquet_soundings(
+    ...     '/data/radiosonde_parquet',
+    ...     columns=['launch_time', 'pressure', 'temperature'],
+    ...     filter=(ds.field('station') == 57494) &
+    ...            (ds.field('pressure') >= 500))
+    """
+
+    def __init__(self, output_dir, *args, batch_rows=None, compression=None):
+        """
+        initialize the instance. The default values are taken from the
+        [radiosonde_parquet] section of `download_config.toml`.
+
+        Parameters
+        ----------
+        output_dir: str
+            root directory of the partitioned dataset.
+
+        Keywords
+        --------
+        batch_rows: integer
+            number of buffered rows of a partition before it's written.
+        compression: str
+            parquet compression codec, e.g. 'zstd', 'snappy' or 'none'.
+        """
+
+        try:
+            import pyarrow   # noqa: F401
+        except ImportError:
+            raise ImportError('pyarrow is required by the parquet backend. ' +
+                              'Install it with `pip install pyarrow`.')
+
+        default = download_defaults('radiosonde_parquet')
+
+        self.output_dir = output_dir
+        self.batch_rows = default(batch_rows, 'batch_rows')
+        self.compression = default(compression, 'compression')
+
+        metadataConfig = load_radiosonde_metadata()
+        variables = [key for key in metadataConfig
+                     if isinstance(metadataConfig[key], dict)]
+        self.level_variables = [
+            key for key in variables
+            if 'altitude' in metadataConfig[key]['dims']]
+        self.sounding_variables = [
+            key for key in variables
+            if ('altitude' not in metadataConfig[key]['dims']) and
+            (key != 'launch_time')]
+
+        self.schema = self._build_schema(metadataConfig)
+        self.metrics = get_metrics()
+
+        # buffered columns of every partition
+        self._buffers = {}
+        self._nRows = {}
+        self.written_files = []
+
+    def _build_schema(self, metadataConfig):
+
+        import pyarrow as pa
+
+        def field_metadata(key):
+            if key not in metadataConfig:
+                return None
+            return {attr: str(value)
+                    for attr, value in metadataConfig[key].items()
+                    if attr not in PARQUET_RESERVED_ATTRS}
+
+        fields = [pa.field(key, getattr(pa, dtype)())
+                  for key, dtype in PARQUET_STATION_COLUMNS]
+        fields.append(pa.field('launch_time', pa.timestamp('s'),
+                               metadata=field_metadata('launch_time')))
+        fields.append(pa.field('level', pa.int32()))
+        fields.extend(pa.field(key, pa.float64(),
+                               metadata=field_metadata(key))
+                      for key in self.level_variables +
+                      self.sounding_variables)
+
+        radiosondeConfig = load_download_config()['radiosonde']
+        schemaMetadata = {
+            'radiosonde_metadata': json.dumps(metadataConfig),
+            'processor_name': radiosondeConfig['processor_name'],
+            'processor_version': radiosondeConfig['processor_version'],
+        }
+
+        return pa.schema(fields, metadata=schemaMetadata)
+
+    def partition_dir(self, station, year):
+        """
+        directory of the partition.
+        """
+
+        return os.path.join(self.output_dir,
+                            'station={station:d}'.format(station=station),
+                            'year={year:d}'.format(year=year))
+
+    def write(self, rsData, rsDims, rsGlobalAttrs):
+
+        if (not rsData) or (not rsDims) or (not rsGlobalAttrs):
+            return None
+
+        with self.metrics.timer('radiosonde_write_seconds'):
+            partition = self._buffer(rsData, rsDims, rsGlobalAttrs)
+
+        self.metrics.increment('radiosonde_soundings_written_total')
+
+        # the rows may stay buffered until `close`, but the partition of
+        # the sounding is known right away
+        return self.partition_dir(*partition)
+
+    def _buffer(self, rsData, rsDims, rsGlobalAttrs):
+        """
+        buffer the rows of the sounding and write its partition when it's
+        full.
+
+        Returns
+        -------
+        partition: tuple
+            (station, year) of the sounding.
+        """
+
+        nLevels = rsDims['altitude']
+        launchTime = rsData['launch_time']
+
+        columns = {}
+        for key, _ in PARQUET_STATION_COLUMNS:
+            columns[key] = [rsGlobalAttrs.get(key)] * nLevels
+        columns['launch_time'] = np.full(
+            nLevels, np.datetime64(launchTime, 's'))
+        columns['level'] = np.arange(nLevels, dtype=np.int32)
+        for key in self.level_variables:
+            if key in rsData:
+                columns[key] = np.asarray(rsData[key], dtype=np.float64)
+            else:
+                columns[key] = np.full(nLevels, np.nan)
+        for key in self.sounding_variables:
+            value = np.asarray(rsData.get(key, np.nan),
+                               dtype=np.float64).reshape(-1)
+            columns[key] = np.full(nLevels,
+                                   value[0] if value.size else np.nan)
+
+        partition = (int(rsGlobalAttrs['station_number']), launchTime.year)
+        self._buffers.setdefault(partition, []).append(columns)
+        self._nRows[partition] = self._nRows.get(partition, 0) + nLevels
+
+        if self._nRows[partition] >= self.batch_rows:
+            self.flush(partition)
+
+        return partition
+
+    def flush(self, partition=None):
+        """
+        write the buffered rows of the partition (all partitions if it's
+        None) into a new parquet file.
+
+        Returns
+        -------
+        output_filepath: str
+            path of the last written file.
+        """
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if partition is None:
+            partitions = list(self._buffers)
+        else:
+            partitions = [partition]
+
+        output_filepath = None
+        for thisPartition in partitions:
+            chunks = self._buffers.pop(thisPartition, [])
+            self._nRows.pop(thisPartition, None)
+
+            # a sounding written twice keeps only its last rows
+            latest = {}
+            for chunk in chunks:
+                if len(chunk['level']):
+                    latest[chunk['launch_time'][0]] = chunk
+            chunks = list(latest.values())
+            if not chunks:
+                continue
+
+            arrays = []
+            for field in self.schema:
+                values = [chunk[field.name] for chunk in chunks]
+                if isinstance(values[0], list):
+                    values = list(itertools.chain.from_iterable(values))
+                else:
+                    values = np.concatenate(values)
+
+                if field.type == pa.float64():
+                    arrays.append(pa.array(values, type=field.type,
+                                           mask=np.isnan(values)))
+                else:
+                    arrays.append(pa.array(values, type=field.type))
+            table = pa.Table.from_arrays(arrays, schema=self.schema)
+
+            thisDir = self.partition_dir(*thisPartition)
+            if not os.path.exists(thisDir):
+                os.makedirs(thisDir)
+            else:
+                self._drop_launches(thisDir, list(latest))
+            output_filepath = os.path.join(
+                thisDir, 'part-{id}.parquet'.format(id=uuid.uuid4().hex))
+            pq.write_table(table, output_filepath,
+                           compression=self.compression)
+            self.written_files.append(output_filepath)
+
+            logger.debug('Write {n:d} rows to {file}'.format(
+                n=table.num_rows, file=output_filepath))
+
+        return output_filepath
+
+    def _drop_launches(self, thisDir, launchTimes):
+        """
+        remove the rows of the launches from the existing files of the
+        partition, so that the soundings of a rerun replace the old ones
+        instead of duplicating them. Files left without rows are deleted.
+        """
+
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        launchTimes = pa.array(np.array(launchTimes, dtype='datetime64[s]'),
+                               type=pa.timestamp('s'))
+
+        for filename in sorted(os.listdir(thisDir)):
+            if not filename.endswith('.parquet'):
+                continue
+
+            filepath = os.path.join(thisDir, filename)
+            isReplaced = pc.is_in(
+                pq.read_table(filepath, columns=['launch_time'])
+                .column('launch_time'),
+                value_set=launchTimes)
+            nReplaced = pc.sum(isReplaced).as_py() or 0
+            if nReplaced == 0:
+                continue
+
+            if nReplaced == len(isReplaced):
+                os.remove(filepath)
+                if filepath in self.written_files:
+                    self.written_files.remove(filepath)
+            else:
+                table = pq.read_table(filepath).filter(pc.invert(isReplaced))
+                # dot files are ignored by the dataset readers
+                tmpFile = os.path.join(thisDir, '.' + filename + '.tmp')
+                pq.write_table(table, tmpFile, compression=self.compression)
+                os.replace(tmpFile, filepath)
+                if filepath not in self.written_files:
+                    self.written_files.append(filepath)
+
+            logger.debug('Replace {n:d} rows of {file}'.format(
+                n=nReplaced, file=filepath))
+
+    def close(self):
+
+        self.flush()
+
+
+def read_parquet_soundings(output_dir, *args, columns=None, filter=None):
+    """
+    read the levels from the partitioned parquet dataset.
+
+    Parameters
+    ----------
+    output_dir: str
+        root directory of the dataset written by `ParquetBackend`.
+
+    Keywords
+    --------
+    columns: list
+        columns to read. All the columns will be read if it's None.
+    filter: `pyarrow.dataset.Expression`
+        predicate pushed down to the partitions and the row groups. The
+        partition keys are available as the fields 'station' and 'year'.
+
+    Returns
+    -------
+    table: `pyarrow.Table`
+    """
+
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(output_dir, format='parquet', partitioning='hive')
+
+    return dataset.to_table(columns=columns, filter=filter)
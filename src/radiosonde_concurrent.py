@@ -0,0 +1,301 @@
+import time
+import heapq
+import itertools
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from configs import load_download_config
+from logger_init import radiosonde_logger
+from radiosonde_downloader import RSDownloader
+from request_scheduler import RequestScheduler, ServerBusyError
+
+logger = radiosonde_logger()
+
+# one fetch+parse task of a station for a time window
+DownloadTask = collections.namedtuple(
+    'DownloadTask', ['station', 'start_time', 'end_time']
+)
+
+# failure of a single task
+TaskError = collections.namedtuple(
+    'TaskError', ['task', 'exception']
+)
+
+
+class ConcurrentRSDownloader(object):
+    """
+    Download the radiosonde data of several stations concurrently.
+
+    Every station and time window planned by `RSDownloader.plan_requests`
+    becomes an independent fetch+parse task running in a thread pool. The
+    requests go through a `RequestScheduler`, and the tasks answered with a
+    busy page are re-queued with a delay. A failed task is logged and
+    reported, but does not abort the other tasks.
+
+    Example
+    -------
+    >>> engine = ConcurrentRSDownloader(max_workers=8)
+    >>> results, errors = engine.download(
+    ...     [57494, 57461], datetime(2019, 1, 1), datetime(2019, 2, 1))
+    >>> rsData, rsDims, rsGAttrs = results[57494]
+    """
+
+    def __init__(self, downloader=None, *args,
+                 max_workers=None, max_workers_per_host=None, manifest=None,
+                 scheduler=None):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        downloader: `RSDownloader`
+            downloader to fetch and parse the data. A new one will be created
+            if it's not given.
+
+        Keywords
+        --------
+        max_workers: integer
+            total number of worker threads.
+        max_workers_per_host: integer
+            maximum number of concurrent requests to the same host.
+        manifest: `SoundingManifest`
+            archived soundings. Tasks whose regular soundings are all
+            archived, or whose window was fetched before, will be skipped.
+        scheduler: `RequestScheduler`
+            rate and concurrency limits of the hosts. A new one limited to
+            `max_workers_per_host` will be created if it's not given.
+        """
+
+        if downloader is None:
+            downloader = RSDownloader()
+        if max_workers is None:
+            max_workers = load_download_config()['radiosonde']['max_workers']
+        if max_workers_per_host is None:
+            max_workers_per_host = \
+                load_download_config()['radiosonde']['max_workers_per_host']
+
+        if (max_workers < 1) or (max_workers_per_host < 1):
+            raise ValueError('Number of workers must be positive.')
+
+        self.downloader = downloader
+        self.max_workers = max_workers
+        if scheduler is None:
+            scheduler = RequestScheduler(max_concurrency=max_workers_per_host)
+        self.scheduler = scheduler
+        self.manifest = manifest
+
+    def plan_tasks(self, stations, start_time, end_time):
+        """
+        Plan the download tasks for all the stations.
+        """
+
+        if start_time > end_time:
+            raise ValueError('start_time is over end_time.')
+
+        windows = self.downloader.plan_requests(start_time, end_time)
+
+        tasks = []
+        for station in stations:
+            for thisStart, thisEnd in windows:
+                if (self.manifest is not None) and \
+                   self.manifest.is_complete(station, thisStart, thisEnd):
+                    logger.debug(
+                        'Skip archived {station:d} from {start} to {end}'.
+                        format(station=station, start=thisStart, end=thisEnd)
+                    )
+                    continue
+                tasks.append(DownloadTask(station, thisStart, thisEnd))
+
+        return tasks
+
+    def record_window(self, task):
+        """
+        record the window of a task whose soundings were all written.
+        """
+
+        if self.manifest is not None:
+            self.manifest.add_window(task.station, task.start_time,
+                                     task.end_time)
+
+    def run_task(self, task):
+        """
+        Fetch and parse the data of a single task.
+        """
+
+        html = self.downloader.fetch_html(
+            task.start_time, task.end_time, task.station,
+            scheduler=self.scheduler
+        )
+
+        return self.downloader.parse_html(
+            html, start_time=task.start_time, end_time=task.end_time
+        )
+
+    def iter_soundings(self, stations, start_time, end_time, errors=None):
+        """
+        Iterate the radiosonde data of several stations as they arrive.
+
+        At most `2 * max_workers` tasks are submitted ahead of the consumer,
+        so that the finished soundings don't pile up in memory when the
+        consumer (e.g., the netCDF writer) is slower than the downloads.
+
+        Parameters
+        ----------
+        stations: list
+            station numbers.
+        start_time: `datetime` obj
+            start time that you want to download the data from.
+        end_time: `datetime` obj
+            end time that you want to download the data from.
+
+        Keywords
+        --------
+        errors: list
+            `TaskError` of every failed task will be appended to it.
+
+        Returns
+        -------
+        iterator of (rsData, rsDims, rsGAttrs) of every sounding. The
+        soundings of one task are ordered by the launch time, but the tasks
+        are yielded in the order of completion.
+        """
+
+        iterators = self._iter_task_results(stations, start_time, end_time,
+                                            errors)
+        for task, dataList, dimsList, gAttrsList in iterators:
+            for item in zip(dataList, dimsList, gAttrsList):
+                yield item
+
+            # the consumer has handled all the soundings of the task
+            self.record_window(task)
+
+    def _iter_task_results(self, stations, start_time, end_time, errors):
+        """
+        run the tasks and yield (task, dataList, dimsList, gAttrsList) of
+        every successful task in the order of completion.
+        """
+
+        tasks = collections.deque(
+            self.plan_tasks(stations, start_time, end_time))
+        # tasks re-queued after a busy page: (ready time, order, task)
+        delayed = []
+        order = itertools.count()
+        nTasks = 0
+        nErrors = 0
+
+        def requeue(task):
+            delay = self.scheduler.retry_delay(task)
+            if delay is None:
+                return False
+
+            logger.warning(('Retry {station:d} from {start} to {end} in ' +
+                            '{delay:.1f} s').format(station=task.station,
+                                                    start=task.start_time,
+                                                    end=task.end_time,
+                                                    delay=delay))
+            heapq.heappush(delayed, (time.monotonic() + delay, next(order),
+                                     task))
+            return True
+
+        def next_task():
+            if delayed and (delayed[0][0] <= time.monotonic()):
+                return heapq.heappop(delayed)[2]
+            if tasks:
+                return tasks.popleft()
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+
+            def submit_tasks():
+                while len(pending) < 2 * self.max_workers:
+                    task = next_task()
+                    if task is None:
+                        return
+                    pending[executor.submit(self.run_task, task)] = task
+
+            submit_tasks()
+            while pending or delayed:
+                timeout = None
+                if delayed:
+                    timeout = max(0.0, delayed[0][0] - time.monotonic())
+                if not pending:
+                    time.sleep(timeout)
+                    submit_tasks()
+                    continue
+
+                done, _ = wait(pending, timeout=timeout,
+                               return_when=FIRST_COMPLETED)
+
+                # the finished tasks are handled in the order of submission
+                for future in [future for future in pending
+                               if future in done]:
+                    task = pending.pop(future)
+                    try:
+                        dataList, dimsList, gAttrsList = future.result()
+                    except Exception as e:
+                        if isinstance(e, ServerBusyError) and requeue(task):
+                            continue
+
+                        logger.error(('Failed to download {station:d} ' +
+                                      'from {start} to {end}: {err}').format(
+                                          station=task.station,
+                                          start=task.start_time,
+                                          end=task.end_time,
+                                          err=e))
+                        nTasks += 1
+                        nErrors += 1
+                        if errors is not None:
+                            errors.append(TaskError(task, e))
+                        continue
+
+                    nTasks += 1
+                    yield task, dataList, dimsList, gAttrsList
+
+                submit_tasks()
+
+        logger.info('Finished {nTasks:d} tasks with {nErrors:d} errors.'.
+                    format(nTasks=nTasks, nErrors=nErrors))
+
+    def download(self, stations, start_time, end_time):
+        """
+        Retrieve the radiosonde data of several stations.
+
+        Parameters
+        ----------
+        stations: list
+            station numbers.
+        start_time: `datetime` obj
+            start time that you want to download the data from.
+        end_time: `datetime` obj
+            end time that you want to download the data from.
+
+        Returns
+        -------
+        results: dict
+            (rsData, rsDims, rsGAttrs) of every station, sorted by the
+            launch time. See `RSDownloader.getData`.
+        errors: list
+            `TaskError` of every failed task.
+        """
+
+        soundings = {station: [] for station in stations}
+        errors = []
+
+        iterators = self._iter_task_results(stations, start_time, end_time,
+                                            errors)
+        for task, dataList, dimsList, gAttrsList in iterators:
+            soundings[task.station].extend(
+                zip(dataList, dimsList, gAttrsList)
+            )
+
+        results = {}
+        for station in stations:
+            items = sorted(soundings[station],
+                           key=lambda item: item[0]['launch_time'])
+            results[station] = (
+                [item[0] for item in items],
+                [item[1] for item in items],
+                [item[2] for item in items]
+            )
+
+        return results, errors
@@ -1,32 +1,376 @@
-import mysql.connector
-from mysql.connector import errorcode
-import toml
+import os
+import datetime
 from configs import load_database_config
-from logger_init import radiosonde_logger_init
+from logger_init import radiosonde_logger
+from radiosonde_schema import EPOCH, launch_timestamp
+
+logger = radiosonde_logger()
+
+SOUNDING_TABLE = 'radiosonde_sounding'
+
+# columns of the sounding catalog. launch_time is stored as UTC seconds
+# since 1970-01-01, so that the range queries compare integers with every
+# backend.
+SOUNDING_COLUMNS = [
+    ('station_number', 'INTEGER NOT NULL'),
+    ('launch_time', 'BIGINT NOT NULL'),
+    ('file_path', 'VARCHAR(512) NOT NULL'),
+    ('n_levels', 'INTEGER'),
+    ('PWV', 'DOUBLE'),
+    ('temperature_LCL', 'DOUBLE'),
+    ('pressure_LCL', 'DOUBLE'),
+]
+SOUNDING_KEYS = [key for key, _ in SOUNDING_COLUMNS]
+
+# SQL which differs between the backends
+DB_DIALECTS = {
+    'sqlite': {
+        'placeholder': '?',
+        # sqlite doesn't accept an index in CREATE TABLE
+        'table_index': '',
+        'create_index': 'CREATE INDEX IF NOT EXISTS {table}_launch_time ' +
+                        'ON {table} (launch_time)',
+    },
+    'mysql': {
+        'placeholder': '%s',
+        # mysql doesn't accept IF NOT EXISTS in CREATE INDEX
+        'table_index': ', INDEX {table}_launch_time (launch_time)',
+        'create_index': None,
+    },
+}
+
+
+def sounding_record(rsData, rsDims, rsGlobalAttrs, file_path):
+    """
+    catalog entry of a sounding saved in `file_path`.
+
+    Returns
+    -------
+    record: tuple
+        values of `SOUNDING_COLUMNS`.
+    """
+
+    def optional_float(key):
+        value = rsData.get(key)
+        return None if (value is None) or (value != value) else float(value)
+
+    return (
+        int(rsGlobalAttrs['station_number']),
+        int(launch_timestamp(rsData['launch_time'])),
+        file_path,
+        int(rsDims['altitude']),
+        optional_float('precipitable_water'),
+        optional_float('temperature_LCL'),
+        optional_float('pressure_LCL'),
+    )
 
-DATABASE_CONFIG = load_database_config()
-USER = DATABASE_CONFIG['login_credential']
-logger = radiosonde_logger_init()
 
 class RadiosondeDB(object):
     """
+    Catalog of the archived soundings.
+
+    Every sounding is one row keyed by (station_number, launch_time), with
+    the path of its file, the number of levels and a few indices. The
+    catalog lives in a local SQLite file or in a MySQL server, depending on
+    the `DATABASE_DRIVER` of the credential in `database_config.toml`.
+
+    Rows are inserted in batches with `executemany`, one transaction per
+    batch, and the (station_number, launch_time) key and the launch_time
+    index keep the station and range queries fast for millions of rows.
+
+    Example
+    -------
+    >>> with RadiosondeDB('local') as db:
+    ...     db.add_sounding(rsData, rsDims, rsGAttrs, rsFile)
+    >>> db.search_soundings(57494, datetime(2019, 1, 1), datetime(2019, 2, 1))
     """
 
-    def __init__(self):
-        
-        self.conn = mysql.connector(
-            host=DATABASE_CONFIG[USER]['DATABASE_HOST'],
-            user=DATABASE_CONFIG[USER]['DATABASE_USERNAME'],
-            password=DATABASE_CONFIG[USER]['DATABASE_PASSWORD'],
-            database=DATABASE_CONFIG[USER]['DATABASE_NAME'],
-            port=DATABASE_CONFIG[USER]['DATABASE_PORT'],
-            raise_on_warnings=True
+    def __init__(self, credential=None, *args, database=None,
+                 batch_size=None):
+        """
+        initialize the instance and create the tables if they don't exist.
+
+        Parameters
+        ----------
+        credential: str
+            section of `database_config.toml` (default: `login_credential`).
+
+        Keywords
+        --------
+        database: str
+            database name, or path of the SQLite file (default:
+            `DATABASE_NAME` of the credential).
+        batch_size: integer
+            number of rows inserted in one transaction (default:
+            `insert_batch_size` in database_config.toml).
+        """
+
+        config = load_database_config()
+        if credential is None:
+            credential = config['login_credential']
+        if batch_size is None:
+            batch_size = config['insert_batch_size']
+
+        section = config[credential]
+        self.driver = section['DATABASE_DRIVER']
+        if self.driver not in DB_DIALECTS:
+            raise ValueError(('Unknown database driver: {driver}. ' +
+                              'Choose from {opts}').format(
+                                  driver=self.driver,
+                                  opts=list(DB_DIALECTS)))
+        self.dialect = DB_DIALECTS[self.driver]
+        self.batch_size = batch_size
+
+        if database is None:
+            database = section['DATABASE_NAME']
+
+        if self.driver == 'sqlite':
+            import sqlite3
+
+            if database != ':memory:':
+                database = os.path.expanduser(database)
+                dbDir = os.path.dirname(database)
+                if dbDir and (not os.path.exists(dbDir)):
+                    os.makedirs(dbDir)
+
+            self.conn = sqlite3.connect(database)
+            # faster bulk ingestion with the write-ahead log
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+        else:
+            import mysql.connector
+
+            self.conn = mysql.connector.connect(
+                host=section['DATABASE_HOST'],
+                user=section['DATABASE_USERNAME'],
+                password=section['DATABASE_PASSWORD'],
+                database=database,
+                port=section['DATABASE_PORT']
+            )
+
+        self._pending = []
+        self.create_tables()
+
+    def _sql(self, statement):
+        """
+        fill the table name and the placeholders of the backend.
+        """
+
+        return statement.format(table=SOUNDING_TABLE,
+                                p=self.dialect['placeholder'])
+
+    def create_tables(self):
+        """
+        create the sounding table and its indexes if they don't exist.
+        """
+
+        columns = ', '.join('{key} {type}'.format(key=key, type=columnType)
+                            for key, columnType in SOUNDING_COLUMNS)
+        statement = ('CREATE TABLE IF NOT EXISTS {table} (' + columns +
+                     ', PRIMARY KEY (station_number, launch_time)' +
+                     self.dialect['table_index'] + ')')
+
+        cursor = self.conn.cursor()
+        cursor.execute(self._sql(statement))
+        if self.dialect['create_index'] is not None:
+            cursor.execute(self._sql(self.dialect['create_index']))
+        self.conn.commit()
+        cursor.close()
+
+    def insert_soundings(self, records):
+        """
+        insert or replace the catalog entries in batches.
+
+        Parameters
+        ----------
+        records: iterable
+            values of `SOUNDING_COLUMNS` for every sounding. See
+            `sounding_record`.
+
+        Returns
+        -------
+        count: integer
+            number of inserted entries.
+        """
+
+        statement = self._sql(
+            'REPLACE INTO {table} (' + ', '.join(SOUNDING_KEYS) + ') ' +
+            'VALUES (' + ', '.join(['{p}'] * len(SOUNDING_KEYS)) + ')'
+        )
+
+        count = 0
+        batch = []
+        cursor = self.conn.cursor()
+        try:
+            for record in records:
+                batch.append(tuple(record))
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(statement, batch)
+                    self.conn.commit()
+                    count += len(batch)
+                    batch = []
+
+            if batch:
+                cursor.executemany(statement, batch)
+                self.conn.commit()
+                count += len(batch)
+        except Exception as e:
+            self.conn.rollback()
+            logger.error('Failed to insert soundings: {err}'.format(err=e))
+            raise e
+        finally:
+            cursor.close()
+
+        return count
+
+    def add_sounding(self, rsData, rsDims, rsGlobalAttrs, file_path):
+        """
+        queue the sounding saved in `file_path`. The queued soundings are
+        inserted every `batch_size` soundings and at `flush`.
+        """
+
+        self._pending.append(
+            sounding_record(rsData, rsDims, rsGlobalAttrs, file_path))
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        insert the queued soundings.
+        """
+
+        pending = self._pending
+        self._pending = []
+
+        return self.insert_soundings(pending)
+
+    def _where(self, station_number=None, start_time=None, end_time=None):
+
+        conditions = []
+        params = []
+        if station_number is not None:
+            conditions.append('station_number = {p}')
+            params.append(int(station_number))
+        if start_time is not None:
+            conditions.append('launch_time >= {p}')
+            params.append(int(launch_timestamp(start_time)))
+        if end_time is not None:
+            conditions.append('launch_time < {p}')
+            params.append(int(launch_timestamp(end_time)))
+
+        where = ''
+        if conditions:
+            where = ' WHERE ' + ' AND '.join(conditions)
+
+        return where, params
+
+    def search_soundings(self, station_number=None, start_time=None,
+                         end_time=None):
+        """
+        search the soundings of the station within [start_time, end_time).
+
+        Parameters
+        ----------
+        station_number: integer
+            station number. All the stations if it's None.
+        start_time: `datetime` obj
+            soundings launched before start_time are left out.
+        end_time: `datetime` obj
+            soundings launched at or after end_time are left out.
+
+        Returns
+        -------
+        soundings: list
+            dict of every sounding with the keys of `SOUNDING_COLUMNS`,
+            ordered by the station and the launch time. launch_time is a
+            `datetime` obj.
+        """
+
+        where, params = self._where(station_number, start_time, end_time)
+        statement = self._sql(
+            'SELECT ' + ', '.join(SOUNDING_KEYS) + ' FROM {table}' + where +
+            ' ORDER BY station_number, launch_time'
         )
 
-    # create tables
+        cursor = self.conn.cursor()
+        cursor.execute(statement, params)
+        rows = cursor.fetchall()
+        cursor.close()
+
+        soundings = []
+        for row in rows:
+            sounding = dict(zip(SOUNDING_KEYS, row))
+            sounding['launch_time'] = EPOCH + \
+                datetime.timedelta(seconds=sounding['launch_time'])
+            soundings.append(sounding)
+
+        return soundings
+
+    def count_soundings(self, station_number=None, start_time=None,
+                        end_time=None):
+        """
+        number of the soundings of the station within [start_time, end_time).
+        """
+
+        where, params = self._where(station_number, start_time, end_time)
+
+        cursor = self.conn.cursor()
+        cursor.execute(self._sql('SELECT COUNT(*) FROM {table}' + where),
+                       params)
+        count = cursor.fetchone()[0]
+        cursor.close()
+
+        return count
+
+    def list_stations(self):
+        """
+        station numbers in the catalog.
+        """
+
+        cursor = self.conn.cursor()
+        cursor.execute(self._sql(
+            'SELECT DISTINCT station_number FROM {table} ' +
+            'ORDER BY station_number'))
+        stations = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+
+        return stations
+
+    def delete_soundings(self, station_number=None, start_time=None,
+                         end_time=None):
+        """
+        delete the soundings of the station within [start_time, end_time).
+
+        Returns
+        -------
+        count: integer
+            number of deleted entries.
+        """
+
+        where, params = self._where(station_number, start_time, end_time)
+
+        cursor = self.conn.cursor()
+        cursor.execute(self._sql('DELETE FROM {table}' + where), params)
+        count = cursor.rowcount
+        self.conn.commit()
+        cursor.close()
+
+        return count
+
+    def close(self):
+        """
+        insert the queued soundings and close the connection.
+        """
+
+        if self._pending:
+            self.flush()
+        self.conn.close()
+
+    def __enter__(self):
 
-    # insert entry
+        return self
 
-    # delete entry
+    def __exit__(self, *args):
 
-    # search entry
\ No newline at end of file
+        self.close()
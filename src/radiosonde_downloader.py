@@ -1,22 +1,26 @@
 import os
-import re
 import tempfile
-import requests
 import datetime
 import logging
-from bs4 import BeautifulSoup
-from netCDF4 import Dataset
-import numpy as np
+import contextlib
 from configs import load_download_config
-from configs import load_radiosonde_metadata
-from logger_init import radiosonde_logger_init
-
-# load configurations
-DOWNLOAD_CONFIG = load_download_config()
-METADATA_CONFIG = load_radiosonde_metadata()
+from logger_init import radiosonde_logger
+from metrics import get_metrics
+from transport import get_transport
+from response_cache import RequestKey
+from station_index import StationIndex, load_station_table
+from station_index import read_station_table
+from sounding_archive import sounding_filename
+from radiosonde_parser import HTML_PARSERS
+from radiosonde_parser import extract_pre_blocks, pair_sounding_blocks
+from radiosonde_parser import parse_sounding_table, split_sounding_lines
+from radiosonde_parser import parse_sounding_indices, is_busy_page
+from request_scheduler import ServerBusyError
+from radiosonde_schema import get_netcdf_schema, launch_timestamp
+from sounding_derived import add_derived_variables
 
 # initialize the logger
-logger = radiosonde_logger_init()
+logger = radiosonde_logger()
 
 PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATION_FILE_NAME = 'radiosonde_station_list.txt'
@@ -45,22 +49,101 @@ def daterange(start_date, end_date):
         yield start_date + datetime.timedelta(n)
 
 
+def monthrange(start_time, end_time):
+    """
+    split the period [start_time, end_time) into month-bounded windows.
+
+    Parameters
+    ----------
+    start_time: datetime obj
+    start time (included)
+    end_time: datetime obj
+    stop time (excluded)
+
+    Returns
+    -------
+    iterator of (start, end) for every month between start_time and
+    end_time. Each window is left-closed and right-open and does not
+    cross the month boundary.
+
+    Example
+    -------
+    >>> list(monthrange(datetime(2019, 1, 15), datetime(2019, 3, 2)))
+    [(datetime(2019, 1, 15), datetime(2019, 2, 1)),
+     (datetime(2019, 2, 1), datetime(2019, 3, 1)),
+     (datetime(2019, 3, 1), datetime(2019, 3, 2))]
+    """
+
+    thisStart = start_time
+    while thisStart < end_time:
+        if thisStart.month == 12:
+            nextMonth = datetime.datetime(thisStart.year + 1, 1, 1)
+        else:
+            nextMonth = datetime.datetime(thisStart.year,
+                                          thisStart.month + 1, 1)
+
+        thisEnd = min(nextMonth, end_time)
+        yield thisStart, thisEnd
+        thisStart = thisEnd
+
+
 class RSDownloader(object):
     """
     Radiosonde downloader to download the radiosonde data from online database.
     """
 
-    def __init__(self, *args, station_file=None):
+    def __init__(self, *args, station_file=None, html_parser='regex',
+                 transport=None, cache=None, metrics=None, derived=False,
+                 wavelength=None):
         """
         initialize the instance.
+
+        Keywords
+        --------
+        html_parser: str
+            backend to extract the `<pre>` blocks from the response. 'regex'
+            (default) scans the text with one compiled pattern, 'bs4' builds
+            a BeautifulSoup DOM.
+        transport: `HTTPTransport`
+            transport for the http requests. The transport shared by all the
+            downloaders will be used if it's not given.
+        cache: `ResponseCache`
+            on-disk cache of the responses. No cache will be used if it's not
+            given.
+        metrics: `MetricsRegistry`
+            registry of the timing and volume metrics of the downloads,
+            parsing and writing. The registry shared by the process will be
+            used if it's not given.
+        derived: boolean
+            add the derived variables (number density, Rayleigh scattering,
+            virtual temperature and wind components) to the parsed
+            soundings. See `sounding_derived.add_derived_variables`.
+        wavelength: float
+            wavelength of the Rayleigh scattering (default: `wavelength` of
+            the [radiosonde_derived] section). [nm]
         """
 
-        self.baseURL = DOWNLOAD_CONFIG['radiosonde']['URL']
+        if html_parser not in HTML_PARSERS:
+            raise ValueError('Unknown html parser: {parser}'.
+                             format(parser=html_parser))
+
+        self.baseURL = load_download_config()['radiosonde']['URL']
+        self.html_parser = html_parser
+        if transport is None:
+            transport = get_transport()
+        self.transport = transport
+        self.cache = cache
+        if metrics is None:
+            metrics = get_metrics()
+        self.metrics = metrics
+        self.derived = derived
+        self.wavelength = wavelength
         # information for global radiosonde stations
         self.station_list_file = os.path.join(
             PROJECT_DIR, 'includes', STATION_FILE_NAME
         )
         self.station_list = self.get_station_names(self.station_list_file)
+        self.station_index = StationIndex(self.station_list)
 
     def getData(self, start_time, end_time, siteNum=57494):
         """
@@ -112,34 +195,124 @@ class RSDownloader(object):
             }
         """
 
-        if start_time > end_time:
-            raise ValueError('start_time is over end_time.')
-
         rsData = []   # radiosonde data
         rsDims = []   # radiosonde data dimensions
         rsGAttrs = []   # radiosonde global attributes
 
-        for thisDate in daterange(start_time, end_time):
+        iterators = self.iter_soundings(siteNum, start_time, end_time)
+        for thisData, thisDims, thisGAttrs in iterators:
+            rsData.append(thisData)
+            rsDims.append(thisDims)
+            rsGAttrs.append(thisGAttrs)
 
-            # get the suitable endDate
-            if (thisDate + datetime.timedelta(1)) > end_time:
-                endDate = end_time
-            else:
-                endDate = thisDate + datetime.timedelta(1)
+        return rsData, rsDims, rsGAttrs
 
-            dataList, dimsList, gAttrsList = self.get_daily_data(
-                thisDate,
-                endDate,
-                siteNum
-            )
+    def iter_soundings(self, stations, start_time, end_time):
+        """
+        Iterate the radiosonde data of the given stations and period.
 
-            iterators = zip(dataList, dimsList, gAttrsList)
-            for thisData, thisDims, thisGAttrs in iterators:
-                rsData.append(thisData)
-                rsDims.append(thisDims)
-                rsGAttrs.append(thisGAttrs)
+        Every sounding is yielded as soon as its request has been parsed, so
+        that it can be saved before the whole period is downloaded.
 
-        return rsData, rsDims, rsGAttrs
+        Parameters
+        ----------
+        stations: integer or list
+            station number(s).
+        start_time: `datetime` obj
+            start time that you want to download the data from.
+        end_time: `datetime` obj
+            end time that you want to download the data from.
+
+        Returns
+        -------
+        iterator of (rsData, rsDims, rsGAttrs) of every sounding, ordered by
+        station and launch time. See `getData`.
+        """
+
+        if start_time > end_time:
+            raise ValueError('start_time is over end_time.')
+
+        if isinstance(stations, int):
+            stations = [stations]
+
+        windows = self.plan_requests(start_time, end_time)
+
+        for siteNum in stations:
+            for thisStart, thisEnd in windows:
+
+                dataList, dimsList, gAttrsList = self.get_period_data(
+                    thisStart,
+                    thisEnd,
+                    siteNum
+                )
+
+                for item in zip(dataList, dimsList, gAttrsList):
+                    yield item
+
+    def plan_requests(self, start_time, end_time):
+        """
+        Split a period into the time windows of the single requests.
+
+        One UWyo request returns all the soundings of a month, therefore the
+        period is split into the fewest month-bounded windows.
+
+        Parameters
+        ----------
+        start_time: `datetime` obj
+            start time of the period (included).
+        end_time: `datetime` obj
+            end time of the period (excluded).
+
+        Returns
+        -------
+        windows: list
+            (start_time, end_time) of every request.
+        """
+
+        return list(monthrange(start_time, end_time))
+
+    def build_request_url(self, start_time, end_time, siteNum=57494):
+        """
+        Build the url for requesting the soundings of a station.
+
+        The window [start_time, end_time) must be within one month. UWyo
+        takes the inclusive hours `FROM` and `TO`, so `TO` is the last hour
+        before end_time.
+        """
+
+        key = self.request_key(start_time, end_time, siteNum)
+
+        reqURL = self.baseURL + \
+            "?region=naconf&TYPE=TEXT%3ALIST&" + \
+            "YEAR={:04d}".format(key.year) + \
+            "&MONTH={:02d}".format(key.month) + \
+            "&FROM={}&".format(key.FROM) + \
+            "TO={}&".format(key.TO) + \
+            "STNM={:05d}".format(key.station)
+
+        return reqURL
+
+    def request_key(self, start_time, end_time, siteNum=57494):
+        """
+        Normalize the request for the window [start_time, end_time).
+
+        Returns
+        -------
+        key: `RequestKey`
+            (station, year, month, FROM, TO) of the request.
+        """
+
+        lastTime = max(end_time - datetime.timedelta(microseconds=1),
+                       start_time)
+        if (lastTime.year, lastTime.month) != \
+           (start_time.year, start_time.month):
+            logger.error('Time window of the request crosses the month ' +
+                         'boundary.')
+            raise ValueError
+
+        return RequestKey(siteNum, start_time.year, start_time.month,
+                          start_time.strftime('%d%H'),
+                          lastTime.strftime('%d%H'))
 
     def get_daily_data(self, start_time, end_time, siteNum=57494):
         """
@@ -151,121 +324,200 @@ class RSDownloader(object):
                          'over one day.')
             raise ValueError
 
+        return self.get_period_data(start_time, end_time, siteNum)
+
+    def get_period_data(self, start_time, end_time, siteNum=57494):
+        """
+        Retrieve the radiosonde data for a window within one month.
+
+        Parameters
+        ----------
+        start_time: `datetime` obj
+            start time of the window (included).
+        end_time: `datetime` obj
+            end time of the window (excluded).
+        siteNum: integer
+            station number.
+
+        Returns
+        -------
+        dataList, dimsList, gAttrsList. See `parse_html`.
+        """
+
+        html = self.fetch_html(start_time, end_time, siteNum)
+
+        return self.parse_html(html, start_time=start_time, end_time=end_time)
+
+    def fetch_html(self, start_time, end_time, siteNum=57494, *args,
+                   scheduler=None):
+        """
+        Retrieve the html text with the soundings of the given period.
+
+        Parameters
+        ----------
+        start_time: `datetime` obj
+            start time of the request.
+        end_time: `datetime` obj
+            end time of the request.
+        siteNum: integer
+            station number.
+
+        Keywords
+        --------
+        scheduler: `RequestScheduler`
+            limits of the requests to the host. They only apply to the
+            requests sent to the network, so the responses from the cache
+            are not throttled.
+
+        Returns
+        -------
+        html: str
+            html text of the response.
+
+        Raises
+        ------
+        ServerBusyError
+            the server answered with a busy/error page.
+        """
+
         logger.info('Download Radiosonde data for {0:d} at {1:s}:00'.format(
             siteNum,
             start_time.strftime('%Y-%m-%d %H')
         ))
 
+        if self.cache is not None:
+            key = self.request_key(start_time, end_time, siteNum)
+            html = self.cache.get(key)
+            if html is not None:
+                logger.debug('Load the response from cache.')
+                self.metrics.increment('radiosonde_cache_hits_total')
+                return html
+            self.metrics.increment('radiosonde_cache_misses_total')
+
         # build the request url
-        reqURL = self.baseURL + \
-            "?region=naconf&TYPE=TEXT%3ALIST&" + \
-            "YEAR={}".format(start_time.strftime('%Y')) + \
-            "&MONTH={}".format(start_time.strftime('%m')) + \
-            "&FROM={}&".format(start_time.strftime('%d%H')) + \
-            "TO={}&".format(end_time.strftime('%d%H')) + \
-            "STNM={:05d}".format(siteNum)
+        reqURL = self.build_request_url(start_time, end_time, siteNum)
 
-        try:
-            # retrieve the html text
-            html = requests.get(reqURL, timeout=15).text
-        except Exception as e:
-            logger.error('Error in retrieving content from {url}'.
-                         format(url=reqURL))
-            raise e
+        if scheduler is None:
+            limits = contextlib.nullcontext()
+        else:
+            limits = scheduler.request(reqURL)
+
+        with limits:
+            try:
+                # retrieve the html text
+                self.metrics.increment('radiosonde_http_requests_total')
+                with self.metrics.timer('radiosonde_http_seconds'):
+                    res = self.transport.get(reqURL)
+                html = res.text
+            except Exception as e:
+                logger.error('Error in retrieving content from {url}'.
+                             format(url=reqURL))
+                raise e
+
+            self.metrics.increment('radiosonde_http_bytes_total',
+                                   len(res.content))
+
+            # an overloaded server answers with an error page, which must not
+            # be taken as a period without soundings
+            if is_busy_page(html):
+                self.metrics.increment('radiosonde_busy_pages_total')
+                logger.warning('Busy page returned by {url}'.format(
+                    url=reqURL))
+                raise ServerBusyError(reqURL)
+
+        # the answers without soundings are cached as well, the recent
+        # ones expire with the TTL of the cache
+        if (self.cache is not None) and res.ok:
+            self.cache.put(key, html)
+
+        return html
+
+    def parse_html(self, html, *args, start_time=None, end_time=None):
+        """
+        Parse the soundings from the html text of the response.
 
-        try:
-            # parse the data
-            soup = BeautifulSoup(html, 'lxml')
-        except Exception as e:
-            errMsg = 'Error in parsing the html for ' + \
-                'retrieving radiosonde data!'
-            logger.error(errMsg)
-            raise e
+        Parameters
+        ----------
+        html: str
+            html text returned by `fetch_html`.
+
+        Keywords
+        --------
+        start_time: `datetime` obj
+            soundings launched before start_time will be dropped.
+        end_time: `datetime` obj
+            soundings launched at or after end_time will be dropped.
+
+        Returns
+        -------
+        dataList: list
+            radiosonde data of every sounding. See `getData`.
+        dimsList: list
+            dimensions of every sounding.
+        gAttrsList: list
+            global attributes of every sounding.
+        """
+
+        with self.metrics.timer('radiosonde_parse_seconds'):
+            dataList, dimsList, gAttrsList = self._parse_html(
+                html, start_time=start_time, end_time=end_time)
+
+            # the soundings of one response are derived as a batch
+            if self.derived:
+                add_derived_variables(dataList, wavelength=self.wavelength)
+
+        self.metrics.increment('radiosonde_soundings_parsed_total',
+                               len(dataList))
+        self.metrics.increment('radiosonde_levels_parsed_total',
+                               sum(dims['altitude'] for dims in dimsList))
+
+        return dataList, dimsList, gAttrsList
+
+    def _parse_html(self, html, *args, start_time=None, end_time=None):
+        """
+        parse the soundings without the metrics. See `parse_html`.
+        """
 
         try:
-            # seach the data and metadata tags
-            preTagList = soup.find_all('pre')
+            # seach the data and metadata blocks
+            preBlocks = extract_pre_blocks(html, parser=self.html_parser)
         except Exception as e:
-            logger.error('Error in searching <pre> in the html text.' +
-                         '\n{url}'.format(url=reqURL))
+            logger.error('Error in searching <pre> in the html text.')
             raise e
 
-        if not((len(preTagList) % 2) is 0):   # determine odd
+        if not ((len(preBlocks) % 2) == 0):   # determine odd
             logger.warn('Expected odd number of <pre> tags.')
 
         dataList = []
         dimsList = []
         gAttrsList = []
 
-        for indxPreTag in range(0, int(len(preTagList) / 2)):
-
-            dataTag = preTagList[indxPreTag * 2]
-            metadataTag = preTagList[indxPreTag * 2 + 1]
-
-            # split the data string into single lines
-            dataLines = dataTag.string.split('\n')
-
-            # jump over the headers and the tail
-            dataLines = dataLines[5:-2]
-
-            col_names = ['pressure', 'height', 'temperature', 'dewpoint',
-                         'RH', 'WVMR', 'wind_direction', 'wind_speed',
-                         'theta_a', 'theta_e', 'theta_v']
-            col_types = [
-                np.float, np.float, np.float, np.float,
-                np.float, np.float, np.float, np.float,
-                np.float, np.float, np.float
-            ]
-            dataType = np.dtype([(col_names[iCol], col_types[iCol])
-                                 for iCol, iType in enumerate(col_types)])
-            data = np.empty(len(dataLines), dtype=dataType)
-
-            def str_2_double(inputStr):
-                """convert the string into float"""
-                if inputStr == '       ':
-                    None
-                else:
-                    return float(inputStr)
-
-            # load the radiosonde data into numpy array
-            for index in range(len(dataLines)):
-                data[index]['pressure'] = str_2_double(
-                    dataLines[index][0:7]
-                )
-                data[index]['height'] = str_2_double(
-                    dataLines[index][7:14]
-                )
-                data[index]['temperature'] = str_2_double(
-                    dataLines[index][14:21]
-                )
-                data[index]['dewpoint'] = str_2_double(
-                    dataLines[index][21:28]
-                )
-                data[index]['RH'] = str_2_double(
-                    dataLines[index][28:35]
-                )
-                data[index]['WVMR'] = str_2_double(
-                    dataLines[index][35:42]
-                )
-                data[index]['wind_direction'] = str_2_double(
-                    dataLines[index][42:49]
-                )
-                data[index]['wind_speed'] = str_2_double(
-                    dataLines[index][49:56]
-                )
-                data[index]['theta_a'] = str_2_double(
-                    dataLines[index][56:63]
-                )
-                data[index]['theta_e'] = str_2_double(
-                    dataLines[index][63:70]
-                )
-                data[index]['theta_v'] = str_2_double(
-                    dataLines[index][70:77]
-                )
+        optionalIndices = \
+            load_download_config()['radiosonde']['sounding_indices']
+
+        for dataStr, metadataStr in pair_sounding_blocks(preBlocks):
 
-            # load souding information
-            metadataStr = metadataTag.string
-            metadataDict = self.__parse_rs_metadata(metadataStr)
+            # load souding information and indices
+            metadataDict = parse_sounding_indices(metadataStr)
+            try:
+                launchTime = datetime.datetime.strptime(
+                    metadataDict['launch_time'], '%y%m%d/%H%M'
+                )
+            except (TypeError, ValueError):
+                logger.warning(('Invalid observation time: {time}. ' +
+                                'Skip the sounding.').format(
+                                    time=metadataDict['launch_time']))
+                continue
+
+            # trim the results to the exact range of the request
+            if (start_time is not None) and (launchTime < start_time):
+                continue
+            if (end_time is not None) and (launchTime >= end_time):
+                continue
+
+            # parse the sounding table in one pass
+            dataLines = split_sounding_lines(dataStr)
+            data = parse_sounding_table(dataLines)
 
             # construct the dimension, variable and global attributes
             dims = {'altitude': len(dataLines), 'nv': 1}
@@ -284,10 +536,10 @@ class RSDownloader(object):
                 'temperature_LCL': metadataDict['temperature_LCL'],
                 'pressure_LCL': metadataDict['pressure_LCL'],
                 'precipitable_water': metadataDict['PWV'],
-                'launch_time': datetime.datetime.strptime(
-                    metadataDict['launch_time'], '%y%m%d/%H%M'
-                )
+                'launch_time': launchTime
             }
+            for key in optionalIndices:
+                variables[key] = metadataDict[key]
             gAttris = {
                 'station_name': self.search_station_name(
                     metadataDict['station_number']
@@ -304,138 +556,6 @@ class RSDownloader(object):
 
         return dataList, dimsList, gAttrsList
 
-    def __parse_rs_metadata(self, content):
-        """
-        Parse the metadata from radiosonde system information.
-
-        Parameters
-        ----------
-        content: str
-            radiosonde station information. See **Example**
-
-        Returns
-        -------
-        data: dict
-            station_number: integer
-            number of the station for launching the radiosonde.
-            launch_time: str
-            time for the launching. e.g., '190916/1200'
-            station_latitude: float
-            latitude of the launching station.
-            station_longitude: float
-            longitude of the launching station.
-            station_elevation: float
-            height of the launching station above mean sea level. [m]
-            temperature_LCL: float
-            temperature of the Lifted Condensation Level. [K]
-            pressure_LCL: float
-            pressure of the Lifted Condensation Level. [hPa]
-            PWV: float
-            Precipitable water for entire sounding. [mm]
-
-        Example
-        -------
-        Station information and sounding indices
-
-                                    Station number: 40179
-                                Observation time: 190916/1200
-                                Station latitude: 32.00
-                                Station longitude: 34.81
-                                Station elevation: 35.0
-                                    Showalter index: 7.75
-                                    Lifted index: 1.55
-            LIFT computed using virtual temperature: 0.82
-                                        SWEAT index: 134.78
-                                            K index: 1.10
-                                Cross totals index: 12.70
-                            Vertical totals index: 21.70
-                                Totals totals index: 34.40
-            Convective Available Potential Energy: 0.00
-                    CAPE using virtual temperature: 17.64
-                            Convective Inhibition: 0.00
-                    CINS using virtual temperature: -18.91
-        Equilibrum Level using virtual temperature: 423.22
-                    LFCT using virtual temperature: 829.22
-                            Bulk Richardson Number: 0.00
-                Bulk Richardson Number using CAPV: 2.10
-        Temp [K] of the Lifted Condensation Level: 289.53
-        Pres [hPa] of the Lifted Condensation Level: 879.95
-            Mean mixed layer potential temperature: 300.31
-                    Mean mixed layer mixing ratio: 13.51
-                    1000 hPa to 500 hPa thickness: 5754.00
-        Precipitable water [mm] for entire sounding: 27.30
-        """
-
-        decoders = {
-            'station_number':
-                (
-                    r'(?<=Station number: )\d+.?\d+',
-                    int,
-                    00000
-                ),
-            'launch_time':
-                (
-                    r'(?<=Observation time: )\d+/\d+',
-                    str,
-                    '000000/0000'
-                ),
-            'station_latitude':
-                (
-                    r'(?<=Station latitude: )-?\d+\.?\d+',
-                    float,
-                    0.0
-                ),
-            'station_longitude':
-                (
-                    r'(?<=Station longitude: )-?\d+\.?\d+',
-                    float,
-                    0.0
-                ),
-            'station_elevation':
-                (
-                    r'(?<=Station elevation: )-?\d\.?\d+',
-                    float,
-                    0.0
-                ),
-            'temperature_LCL':
-                (
-                    r'(?<=Temp [K] of the Lifted Condensation ' +
-                    r'Level: )\d+\.?\d+',
-                    float,
-                    0.0
-                ),
-            'pressure_LCL':
-                (
-                    r'(?<=Pres [hPa] of the Lifted ' +
-                    r'Condensation Level: )\d+\.?\d+',
-                    float,
-                    0.0
-                ),
-            'PWV':
-                (
-                    r'(?<=Precipitable water [mm] ' +
-                    r'for entire sounding: )\d+\.?\d+',
-                    float,
-                    0.0
-                )
-        }
-
-        def find_in_string(key, dec, str):
-            res = re.search(dec[0], str)
-            if res is not None:
-                val = dec[1](res.group())
-            else:
-                val = dec[2]
-            return val
-
-        data = {}
-
-        for key, regex in decoders.items():
-            val = find_in_string(key, regex, content)
-            data.update({key: val})
-
-        return data
-
     def save_netCDF(self, rsData, rsDims, rsGlobalAttrs, output_dir, *args,
                     force=False):
         """
@@ -499,9 +619,14 @@ class RSDownloader(object):
             if res.lower() == 'yes':
                 os.mkdir(output_dir)
 
-        output_file = DOWNLOAD_CONFIG['radiosonde']['nc_file_naming'].format(
-            sitenum=rsGlobalAttrs['station_number'],
-            date=rsData['launch_time'].strftime('%Y%m%d_%H%M')
+        from netCDF4 import Dataset
+
+        downloadConfig = load_download_config()
+
+        output_file = sounding_filename(
+            rsGlobalAttrs['station_number'],
+            rsData['launch_time'],
+            downloadConfig['radiosonde']['nc_file_naming']
         )
         output_filepath = os.path.join(output_dir, output_file)
 
@@ -518,79 +643,88 @@ class RSDownloader(object):
                 file=output_filepath
             ))
 
-        netCDF_format = DOWNLOAD_CONFIG['radiosonde']['NETCDF_FORMAT']
-        dataset = Dataset(output_filepath, 'w',
-                          format=netCDF_format,
-                          zlib=True)
-
-        # create dimensions
-        for dim_key in METADATA_CONFIG['dimensions']:
-            dataset.createDimension(dim_key, rsDims[dim_key])
-
-        # create and write variables, write variable attributes
-        npTypeDict = {
-            'byte': np.byte,
-            'int': np.intc,
-            'float': np.single,
-            'double': np.double,
-            'string': np.str
-        }
-        for var_key in rsData:
-
-            if var_key == 'launch_time':
-                # convert python datetime object to POXIS timestamp
-                rsData[var_key] = rsData[var_key].timestamp()
-
-            # create variables
-            if ('_FillValue' in METADATA_CONFIG[var_key]):
-                dataset.createVariable(
-                    var_key,
-                    npTypeDict[METADATA_CONFIG[var_key]['dtype']],
-                    tuple(METADATA_CONFIG[var_key]['dims']),
-                    fill_value=METADATA_CONFIG[var_key]['_FillValue']
-                )
-            else:
-                dataset.createVariable(
-                    var_key,
-                    npTypeDict[METADATA_CONFIG[var_key]['dtype']],
-                    tuple(METADATA_CONFIG[var_key]['dims'])
-                )
+        schema = get_netcdf_schema()
 
-            # write variables
-            dataset.variables[var_key][:] = rsData[var_key]
-
-            # write attributes
-            for var_attr in METADATA_CONFIG[var_key]:
-                if (var_attr != 'dtype') and \
-                   (var_attr != 'dims') and \
-                   (var_attr != '_FillValue'):
-                    setattr(
-                        dataset.variables[var_key],
-                        var_attr,
-                        METADATA_CONFIG[var_key][var_attr]
-                    )
-
-        # create global attributes
-        for attr_key in rsGlobalAttrs:
-            setattr(
-                dataset,
-                attr_key,
-                rsGlobalAttrs[attr_key]
-            )
+        with self.metrics.timer('radiosonde_write_seconds'):
+            netCDF_format = downloadConfig['radiosonde']['NETCDF_FORMAT']
+            dataset = Dataset(output_filepath, 'w',
+                              format=netCDF_format,
+                              zlib=True)
 
-        historyStr = "{time}: processed by {name}-{version}".format(
-            time=datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
-            name=DOWNLOAD_CONFIG['radiosonde']['processor_name'],
-            version=DOWNLOAD_CONFIG['radiosonde']['processor_version']
-        )
+            # create dimensions
+            schema.create_dimensions(dataset, rsDims)
+
+            # create and write variables with their attributes
+            for var_key in rsData:
+                value = rsData[var_key]
+                if var_key == 'launch_time':
+                    # convert python datetime object to POXIS timestamp
+                    value = launch_timestamp(value)
+
+                variable = schema.create_variable(dataset, var_key)
+                variable[:] = value
+
+            # create global attributes
+            dataset.setncatts({key: value
+                               for key, value in rsGlobalAttrs.items()
+                               if value is not None})
+            dataset.history = schema.history()
+
+            dataset.close()
 
-        dataset.close()
+        self.metrics.increment('radiosonde_soundings_written_total')
 
         return output_filepath
 
+    def save_many(self, rsData, rsDims, rsGlobalAttrs, output_dir, *args,
+                  force=False):
+        """
+        Save a batch of soundings to netCDF files, one file per sounding.
+
+        The netCDF schema is compiled once and reused by all the files.
+
+        Parameters
+        ----------
+        rsData: list
+            radiosonde data of every sounding. See `save_netCDF`.
+        rsDims: list
+            dimensions of every sounding.
+        rsGlobalAttrs: list
+            radiosonde metadata of every sounding.
+        output_dir: str
+            output directory for saving the netCDF files.
+
+        Keywords
+        --------
+        force: boolean
+            flag to control whether overwrite the netCDF files if they exist.
+
+        Returns
+        -------
+        output_filepaths: list
+            path of every written file. Skipped soundings are left out.
+        """
+
+        output_filepaths = []
+        for thisData, thisDims, thisGAttrs in zip(rsData, rsDims,
+                                                  rsGlobalAttrs):
+            output_filepath = self.save_netCDF(thisData, thisDims, thisGAttrs,
+                                               output_dir, force=force)
+            if output_filepath is not None:
+                output_filepaths.append(output_filepath)
+
+        return output_filepaths
+
     def read_station_list(self, file):
         """
         read the list of station information from file.
+
+        Returns
+        -------
+        station_list: ndarray
+            structured array with the fields 'ID', 'lat', 'lon',
+            'elevation' and 'station_name'. See
+            `station_index.read_station_table`.
         """
 
         if (not os.path.exists(file)) or (not os.path.isfile(file)):
@@ -598,28 +732,7 @@ class RSDownloader(object):
                            '{file}'.format(file=file))
             raise FileNotFoundError
 
-        # data type to load the data
-        # e.g.,
-        # "VQW00011602  17.7000  -64.8000   16.8 VI ST CROIX
-        # (BENEDICT FIELD)      1948 1948    346"
-
-        station_list = []
-        with open(file, 'r', encoding='utf-8') as fh:
-            lines = fh.readlines()
-
-            for line in lines:
-                try:
-                    station_list.append({
-                        'ID': int(line[6:11]),
-                        'lat': float(line[12:20]),
-                        'lon': float(line[21:30]),
-                        'elevation': float(line[31:37]),
-                        'station_name': line[41:71].strip()
-                    })
-                except Exception as e:
-                    logger.warning(e)
-
-        return station_list
+        return read_station_table(file)
 
     def list_station_number(self, file=None):
         """
@@ -647,15 +760,20 @@ class RSDownloader(object):
     def get_station_names(self, file=None):
         """
         Get the list of radiosonde station names.
+
+        Returns
+        -------
+        station_list: ndarray
+            structured array with the fields 'ID', 'lat', 'lon', 'elevation'
+            and 'station_name'. It's loaded through the compiled cache next
+            to the station list file. See `load_station_table`.
         """
 
         if file is not None:
             if (not os.path.exists(file)) or (not os.path.isfile(file)):
                 logger.error('{file} does not exist.'.format(file=file))
                 self.update_station_names(file)
-                station_list = self.read_station_list(file)
-            else:
-                station_list = self.read_station_list(file)
+            station_list = load_station_table(file)
         else:
             raise FileExistsError
 
@@ -666,28 +784,71 @@ class RSDownloader(object):
         Search the station name with the given station number.
         """
 
-        for item in self.station_list:
-            if item['ID'] == station_number:
-                # found the station_name then return
-                return item['station_name']
+        item = self.station_index.lookup(station_number)
+        if item is not None:
+            return item['station_name']
 
         logger.warning('No items was found based on the station ' +
                        'number of {number}'.format(number=station_number))
         return None
 
+    def search_nearest_stations(self, lat, lon, n=1):
+        """
+        Search the `n` stations nearest to the given location.
+
+        Parameters
+        ----------
+        lat: float
+            latitude of the location. [degree]
+        lon: float
+            longitude of the location. [degree]
+        n: integer
+            number of stations.
+
+        Returns
+        -------
+        stations: list
+            (station, distance) sorted by the distance. [km]
+        """
+
+        return self.station_index.nearest(lat, lon, n)
+
+    def search_stations_within(self, lat, lon, radius):
+        """
+        Search the stations within the radius of the given location.
+
+        Parameters
+        ----------
+        lat: float
+            latitude of the location. [degree]
+        lon: float
+            longitude of the location. [degree]
+        radius: float
+            search radius. [km]
+
+        Returns
+        -------
+        stations: list
+            (station, distance) sorted by the distance. [km]
+        """
+
+        return self.station_index.within_radius(lat, lon, radius)
+
     def download_station_list(self, file):
         """
         Download the global radiosonde station list.
         """
 
-        reqURL = DOWNLOAD_CONFIG['radiosonde']['URL_station_list']
+        reqURL = load_download_config()['radiosonde']['URL_station_list']
         logger.info('Start downloading the station list from {url}'.
                     format(url=reqURL))
 
         try:
-            res = requests.get(reqURL, timeout=5)
+            res = self.transport.get(reqURL)
+            res.raise_for_status()
         except Exception as e:
             logger.error('Error in connecting {url}'.format(url=reqURL))
+            raise e
 
         with open(file, 'w', encoding='utf-8') as fh:
             fh.write(res.content.decode('utf-8'))
@@ -0,0 +1,272 @@
+import re
+import html as htmllib
+import numpy as np
+
+# columns of the UWyo 'TEXT:LIST' sounding table
+SOUNDING_COLUMNS = [
+    'pressure', 'height', 'temperature', 'dewpoint', 'RH', 'WVMR',
+    'wind_direction', 'wind_speed', 'theta_a', 'theta_e', 'theta_v'
+]
+COLUMN_WIDTH = 7
+LINE_WIDTH = COLUMN_WIDTH * len(SOUNDING_COLUMNS)
+
+# `<pre>` blocks of the response, without building a DOM
+PRE_TAG_PATTERN = re.compile(
+    r'<pre(?:\s[^>]*)?>(.*?)</pre\s*>', re.IGNORECASE | re.DOTALL
+)
+HTML_PARSERS = ['regex', 'bs4']
+
+# messages of the pages which UWyo returns instead of the soundings when the
+# server is overloaded or fails to read its archive
+BUSY_PAGE_PATTERN = re.compile(
+    r"can't get|server (?:is )?(?:too )?busy|try again later",
+    re.IGNORECASE
+)
+
+# labels of the UWyo station information and sounding indices block, and
+# the (key, type) of the parsed fields
+SOUNDING_INDICES = {
+    'Station identifier': ('station_identifier', str),
+    'Station number': ('station_number', int),
+    'Observation time': ('launch_time', str),
+    'Station latitude': ('station_latitude', float),
+    'Station longitude': ('station_longitude', float),
+    'Station elevation': ('station_elevation', float),
+    'Showalter index': ('showalter_index', float),
+    'Lifted index': ('lifted_index', float),
+    'LIFT computed using virtual temperature':
+        ('lifted_index_virtual', float),
+    'SWEAT index': ('sweat_index', float),
+    'K index': ('k_index', float),
+    'Cross totals index': ('cross_totals_index', float),
+    'Vertical totals index': ('vertical_totals_index', float),
+    'Totals totals index': ('totals_totals_index', float),
+    'Convective Available Potential Energy': ('CAPE', float),
+    'CAPE using virtual temperature': ('CAPE_virtual', float),
+    'Convective Inhibition': ('CIN', float),
+    'CINS using virtual temperature': ('CIN_virtual', float),
+    'Equilibrum Level': ('EL', float),
+    'Equilibrum Level using virtual temperature': ('EL_virtual', float),
+    'Level of Free Convection': ('LFC', float),
+    'LFCT using virtual temperature': ('LFC_virtual', float),
+    'Bulk Richardson Number': ('bulk_richardson_number', float),
+    'Bulk Richardson Number using CAPV':
+        ('bulk_richardson_number_virtual', float),
+    'Temp [K] of the Lifted Condensation Level': ('temperature_LCL', float),
+    'Pres [hPa] of the Lifted Condensation Level': ('pressure_LCL', float),
+    'Equivalent potential temp [K] of the LCL': ('theta_e_LCL', float),
+    'Mean mixed layer potential temperature':
+        ('mean_mixed_layer_theta', float),
+    'Mean mixed layer mixing ratio': ('mean_mixed_layer_mixing_ratio', float),
+    '1000 hPa to 500 hPa thickness': ('thickness_1000_500', float),
+    'Precipitable water [mm] for entire sounding': ('PWV', float),
+}
+
+# one "label: value" line of the station information block
+INDEX_LINE_PATTERN = re.compile(
+    r'^[ \t]*(?P<label>[^:\n]*?[^:\s])[ \t]*:[ \t]*(?P<value>\S+)[ \t\r]*$',
+    re.MULTILINE
+)
+
+
+def split_sounding_lines(content):
+    """
+    split the content of a sounding `<pre>` block into data lines.
+
+    Parameters
+    ----------
+    content: str
+        text of the `<pre>` block with the sounding table.
+
+    Returns
+    -------
+    dataLines: list
+        lines of the table without the header and the blank lines.
+
+    Example
+    -------
+    ------------------------------------------------------------------ ...
+       PRES   HGHT   TEMP   DWPT   RELH   MIXR   DRCT   SKNT   THTA   ...
+        hPa     m      C      C      %    g/kg    deg   knot     K    ...
+    ------------------------------------------------------------------ ...
+     1000.0     90
+      925.0    763   12.4    5.4     62   6.17    335      9  292.0   ...
+    """
+
+    lines = content.split('\n')
+
+    # the header is closed by the second dashed line
+    nDashes = 0
+    for iLine, line in enumerate(lines):
+        if line.startswith('---'):
+            nDashes += 1
+            if nDashes == 2:
+                lines = lines[(iLine + 1):]
+                break
+
+    return [line for line in lines if line.strip()]
+
+
+def parse_sounding_table(content, fill_value=np.nan):
+    """
+    parse the fixed-width sounding table in one vectorized pass.
+
+    Parameters
+    ----------
+    content: str or list
+        text of the `<pre>` block with the sounding table, or the data lines
+        of the table returned by `split_sounding_lines`.
+
+    Keywords
+    --------
+    fill_value: float
+        value for the blank fields (default: NaN).
+
+    Returns
+    -------
+    columns: dict
+        contiguous float64 array for each column in `SOUNDING_COLUMNS`.
+    """
+
+    if isinstance(content, str):
+        dataLines = split_sounding_lines(content)
+    else:
+        dataLines = content
+
+    nLines = len(dataLines)
+    if nLines == 0:
+        return {name: np.empty(0, dtype=np.float64)
+                for name in SOUNDING_COLUMNS}
+
+    # pack the table into a (nLines, nColumns, COLUMN_WIDTH) char buffer
+    text = ''.join([line[:LINE_WIDTH].ljust(LINE_WIDTH)
+                    for line in dataLines])
+    buffer = np.frombuffer(
+        text.encode('ascii', 'replace'), dtype=np.uint8
+    ).reshape(nLines, len(SOUNDING_COLUMNS), COLUMN_WIDTH)
+
+    # blank fields are marked before the conversion
+    isBlank = (buffer == ord(' ')).all(axis=2)
+    fields = buffer.reshape(nLines, LINE_WIDTH).view(
+        'S{:d}'.format(COLUMN_WIDTH)
+    ).copy()
+    fields[isBlank] = b'nan'
+
+    values = fields.astype(np.float64)
+    if not np.isnan(fill_value):
+        values[isBlank] = fill_value
+
+    # transpose once so that every column is contiguous
+    values = np.ascontiguousarray(values.T)
+
+    return {name: values[iCol] for iCol, name in enumerate(SOUNDING_COLUMNS)}
+
+
+def extract_pre_blocks(html, parser='regex'):
+    """
+    extract the text of all the `<pre>` blocks in the html response.
+
+    Parameters
+    ----------
+    html: str
+        html text of the response.
+
+    Keywords
+    --------
+    parser: str
+        'regex' scans the text with one compiled pattern (default). 'bs4'
+        builds the BeautifulSoup DOM, which is slower but more tolerant to
+        malformed html.
+
+    Returns
+    -------
+    preBlocks: list
+        text of the `<pre>` blocks in the order of appearance.
+    """
+
+    if parser == 'regex':
+        return [htmllib.unescape(block)
+                for block in PRE_TAG_PATTERN.findall(html)]
+    elif parser == 'bs4':
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, 'lxml')
+        return [tag.get_text() for tag in soup.find_all('pre')]
+    else:
+        raise ValueError('Unknown html parser: {parser}. Choose from {opts}'.
+                         format(parser=parser, opts=HTML_PARSERS))
+
+
+def is_busy_page(html):
+    """
+    whether the response is a busy/error page of the server instead of
+    soundings.
+
+    A page without any `<pre>` block but with one of the messages of
+    `BUSY_PAGE_PATTERN` is an error page, and must not be taken as a period
+    without soundings.
+    """
+
+    return (PRE_TAG_PATTERN.search(html) is None) and \
+        (BUSY_PAGE_PATTERN.search(html) is not None)
+
+
+def pair_sounding_blocks(preBlocks):
+    """
+    pair the `<pre>` blocks into (data, metadata) tuples.
+
+    Every sounding of the UWyo response consists of a `<pre>` block with the
+    sounding table followed by a `<pre>` block with the station information
+    and sounding indices.
+    """
+
+    return [(preBlocks[iPair * 2], preBlocks[iPair * 2 + 1])
+            for iPair in range(len(preBlocks) // 2)]
+
+
+def parse_sounding_indices(content):
+    """
+    parse the station information and sounding indices in one pass.
+
+    Parameters
+    ----------
+    content: str
+        content of the metadata `<pre>` block. e.g.,
+
+                                 Station number: 40179
+                               Observation time: 190916/1200
+                               Station latitude: 32.00
+        ...
+        Temp [K] of the Lifted Condensation Level: 289.53
+        Pres [hPa] of the Lifted Condensation Level: 879.95
+        Precipitable water [mm] for entire sounding: 27.30
+
+    Returns
+    -------
+    indices: dict
+        every field of `SOUNDING_INDICES`, converted to its type. Missing
+        or malformed numbers are NaN (0 for station_number) and missing
+        strings are None.
+    """
+
+    indices = {}
+    for key, dtype in SOUNDING_INDICES.values():
+        if dtype is float:
+            indices[key] = np.nan
+        elif dtype is int:
+            indices[key] = 0
+        else:
+            indices[key] = None
+
+    for match in INDEX_LINE_PATTERN.finditer(content):
+        field = SOUNDING_INDICES.get(match.group('label'))
+        if field is None:
+            continue
+
+        key, dtype = field
+        try:
+            indices[key] = dtype(match.group('value'))
+        except ValueError:
+            pass
+
+    return indices
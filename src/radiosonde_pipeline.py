@@ -0,0 +1,399 @@
+import time
+import queue
+import threading
+from configs import download_defaults
+from logger_init import radiosonde_logger
+from radiosonde_downloader import RSDownloader
+from radiosonde_concurrent import ConcurrentRSDownloader, TaskError
+from request_scheduler import DelayedTaskQueue, ServerBusyError
+
+logger = radiosonde_logger()
+
+PIPELINE_STAGES = ['fetch', 'parse', 'write']
+
+# interval for checking the stop flag while waiting on a full queue [s]
+QUEUE_POLL_INTERVAL = 0.1
+
+
+class StageStats(object):
+    """
+    Throughput statistics of one pipeline stage.
+    """
+
+    def __init__(self, name):
+
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+        self.start_time = None
+        self.stop_time = None
+        self._lock = threading.Lock()
+
+    def record(self, busy_time, items=1, nbytes=0):
+        """
+        record the items processed by one call of the stage.
+        """
+
+        now = time.perf_counter()
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = now - busy_time
+            self.stop_time = now
+            self.items += items
+            self.bytes += nbytes
+            self.busy_time += busy_time
+
+    @property
+    def wall_time(self):
+        """
+        time between the first and the last item of the stage. [s]
+        """
+
+        if self.start_time is None:
+            return 0.0
+
+        return self.stop_time - self.start_time
+
+    @property
+    def throughput(self):
+        """
+        items per second of wall time.
+        """
+
+        if self.wall_time <= 0:
+            return 0.0
+
+        return self.items / self.wall_time
+
+    def summary(self):
+
+        text = '{name}: {items:d} items in {wall:.2f} s ({rate:.2f} /s, ' + \
+            'busy {busy:.2f} s)'
+        text = text.format(name=self.name, items=self.items,
+                           wall=self.wall_time, rate=self.throughput,
+                           busy=self.busy_time)
+
+        if self.bytes and (self.wall_time > 0):
+            text += ', {mbs:.2f} MB/s'.format(
+                mbs=self.bytes / 1024 ** 2 / self.wall_time)
+
+        return text
+
+
+class _PipelineStopped(Exception):
+    pass
+
+
+class RSPipeline(object):
+    """
+    Pipelined download of the radiosonde data.
+
+    The download runs in three stages connected by bounded queues:
+
+    fetch   `fetch_workers` threads downloading the html of the tasks
+            planned by `ConcurrentRSDownloader.plan_tasks`, under the rate
+            and concurrency limits of its `RequestScheduler`. Tasks
+            answered with a busy page are re-queued with a delay.
+    parse   `parse_workers` threads extracting the soundings from the html.
+    write   a single writer (the calling thread) saving every sounding.
+
+    A full queue blocks its producers, so that a slow writer throttles the
+    parsing and the downloads instead of piling the soundings up in memory.
+
+    Example
+    -------
+    >>> pipeline = RSPipeline(fetch_workers=8, parse_workers=2)
+    >>> errors = pipeline.run(
+    ...     [57494, 57461], datetime(2019, 1, 1), datetime(2019, 2, 1),
+    ...     lambda *sounding: rs.save_netCDF(*sounding, '/data'))
+    >>> pipeline.report()
+    """
+
+    def __init__(self, downloader=None, *args, fetch_workers=None,
+                 parse_workers=None, queue_size=None,
+                 max_workers_per_host=None, manifest=None, scheduler=None):
+        """
+        initialize the instance. The default values are taken from the
+        [radiosonde_pipeline] section of `download_config.toml`.
+
+        Parameters
+        ----------
+        downloader: `RSDownloader`
+            downloader to fetch and parse the data. A new one will be created
+            if it's not given.
+
+        Keywords
+        --------
+        fetch_workers: integer
+            number of threads of the fetch stage.
+        parse_workers: integer
+            number of threads of the parse stage.
+        queue_size: integer
+            capacity of the queues between the stages.
+        max_workers_per_host: integer
+            maximum number of concurrent requests to the same host.
+        manifest: `SoundingManifest`
+            archived soundings. Tasks whose regular soundings are all
+            archived, or whose window was fetched before, will be skipped.
+            The windows whose soundings are all written are recorded.
+        scheduler: `RequestScheduler`
+            rate and concurrency limits of the hosts. A new one limited to
+            `max_workers_per_host` will be created if it's not given.
+        """
+
+        default = download_defaults('radiosonde_pipeline')
+
+        if downloader is None:
+            downloader = RSDownloader()
+
+        self.fetch_workers = default(fetch_workers, 'fetch_workers')
+        self.parse_workers = default(parse_workers, 'parse_workers')
+        self.queue_size = default(queue_size, 'queue_size')
+
+        if (self.fetch_workers < 1) or (self.parse_workers < 1):
+            raise ValueError('Number of workers must be positive.')
+        if self.queue_size < 1:
+            raise ValueError('Queue size must be positive.')
+
+        # the planner and the scheduler are shared with the thread pool engine
+        self.engine = ConcurrentRSDownloader(
+            downloader,
+            max_workers=self.fetch_workers,
+            max_workers_per_host=max_workers_per_host,
+            manifest=manifest,
+            scheduler=scheduler)
+        self.downloader = downloader
+
+        self.stats = {name: StageStats(name) for name in PIPELINE_STAGES}
+        self._stop = threading.Event()
+
+    def _put(self, thisQueue, item):
+        """
+        put the item into the queue unless the pipeline is stopped.
+        """
+
+        while not self._stop.is_set():
+            try:
+                thisQueue.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+        raise _PipelineStopped()
+
+    def _get(self, thisQueue):
+        """
+        get an item from the queue unless the pipeline is stopped.
+        """
+
+        while not self._stop.is_set():
+            try:
+                return thisQueue.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+        raise _PipelineStopped()
+
+    def _fetch_worker(self, taskQueue, parseQueue, errors):
+
+        while not self._stop.is_set():
+            try:
+                task = taskQueue.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if task is None:
+                return
+
+            try:
+                self._fetch_task(task, taskQueue, parseQueue, errors)
+            finally:
+                taskQueue.task_done()
+
+    def _fetch_task(self, task, taskQueue, parseQueue, errors):
+
+        t0 = time.perf_counter()
+        try:
+            html = self.downloader.fetch_html(
+                task.start_time, task.end_time, task.station,
+                scheduler=self.engine.scheduler)
+        except Exception as e:
+            if isinstance(e, ServerBusyError):
+                delay = self.engine.scheduler.retry_delay(task)
+                if delay is not None:
+                    logger.warning(('Retry {station:d} from {start} to ' +
+                                    '{end} in {delay:.1f} s').format(
+                                        station=task.station,
+                                        start=task.start_time,
+                                        end=task.end_time,
+                                        delay=delay))
+                    taskQueue.put(task, delay)
+                    return
+
+            logger.error(('Failed to fetch {station:d} from {start} ' +
+                          'to {end}: {err}').format(
+                              station=task.station,
+                              start=task.start_time,
+                              end=task.end_time,
+                              err=e))
+            errors.append(TaskError(task, e))
+            return
+
+        # size of the encoded text, as the cached responses have no content
+        self.stats['fetch'].record(time.perf_counter() - t0,
+                                   nbytes=len(html.encode('utf-8')))
+        self._put(parseQueue, (task, html))
+
+    def _parse_worker(self, parseQueue, writeQueue, errors):
+
+        while True:
+            item = self._get(parseQueue)
+            if item is None:
+                return
+            task, html = item
+
+            t0 = time.perf_counter()
+            try:
+                dataList, dimsList, gAttrsList = self.downloader.parse_html(
+                    html, start_time=task.start_time, end_time=task.end_time)
+            except Exception as e:
+                logger.error(('Failed to parse {station:d} from {start} ' +
+                              'to {end}: {err}').format(
+                                  station=task.station,
+                                  start=task.start_time,
+                                  end=task.end_time,
+                                  err=e))
+                errors.append(TaskError(task, e))
+                continue
+
+            self.stats['parse'].record(time.perf_counter() - t0,
+                                       items=len(dataList))
+            for sounding in zip(dataList, dimsList, gAttrsList):
+                self._put(writeQueue, (task, sounding))
+            # end of the soundings of the task
+            self._put(writeQueue, (task, None))
+
+    def _run_stage(self, target, nWorkers, args, nextQueue, nSentinels):
+        """
+        start the workers of a stage and a thread which signals the end of
+        the stage to the next one once all the workers are finished.
+        """
+
+        def run_worker():
+            try:
+                target(*args)
+            except _PipelineStopped:
+                pass
+
+        workers = [threading.Thread(target=run_worker, daemon=True)
+                   for _ in range(nWorkers)]
+        for worker in workers:
+            worker.start()
+
+        def finish():
+            for worker in workers:
+                worker.join()
+            for _ in range(nSentinels):
+                try:
+                    self._put(nextQueue, None)
+                except _PipelineStopped:
+                    return
+
+        closer = threading.Thread(target=finish, daemon=True)
+        closer.start()
+
+        return workers + [closer]
+
+    def run(self, stations, start_time, end_time, write):
+        """
+        Download the radiosonde data of the stations and write every
+        sounding.
+
+        Parameters
+        ----------
+        stations: integer or list
+            station number(s).
+        start_time: `datetime` obj
+            start time that you want to download the data from.
+        end_time: `datetime` obj
+            end time that you want to download the data from.
+        write: callable
+            `write(rsData, rsDims, rsGAttrs)` called in the calling thread
+            for every sounding. e.g., `RSDownloader.save_netCDF` or
+            `AggregatedNetCDFWriter.write`.
+
+        Returns
+        -------
+        errors: list
+            `TaskError` of every failed fetch, parse or write.
+        """
+
+        if isinstance(stations, int):
+            stations = [stations]
+
+        self.stats = {name: StageStats(name) for name in PIPELINE_STAGES}
+        self._stop.clear()
+        errors = []
+        failedTasks = set()
+
+        taskQueue = DelayedTaskQueue(
+            self.engine.plan_tasks(stations, start_time, end_time))
+        parseQueue = queue.Queue(maxsize=self.queue_size)
+        writeQueue = queue.Queue(maxsize=self.queue_size)
+
+        threads = self._run_stage(self._fetch_worker, self.fetch_workers,
+                                  (taskQueue, parseQueue, errors),
+                                  parseQueue, self.parse_workers)
+        threads += self._run_stage(self._parse_worker, self.parse_workers,
+                                   (parseQueue, writeQueue, errors),
+                                   writeQueue, 1)
+
+        try:
+            while True:
+                item = writeQueue.get()
+                if item is None:
+                    break
+                task, sounding = item
+                if sounding is None:
+                    if task not in failedTasks:
+                        self.engine.record_window(task)
+                    continue
+
+                t0 = time.perf_counter()
+                try:
+                    write(*sounding)
+                except Exception as e:
+                    logger.error(('Failed to write the sounding at ' +
+                                  '{time}: {err}').format(
+                                      time=sounding[0].get('launch_time'),
+                                      err=e))
+                    errors.append(TaskError(task, e))
+                    failedTasks.add(task)
+                    continue
+                self.stats['write'].record(time.perf_counter() - t0)
+        finally:
+            # unblock the workers if the writer is interrupted
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        logger.info('Finished the pipeline with {n:d} errors.'.format(
+            n=len(errors)))
+
+        return errors
+
+    def report(self):
+        """
+        log the throughput of every stage.
+
+        Returns
+        -------
+        summary: list
+            one line for every stage.
+        """
+
+        summary = [self.stats[name].summary() for name in PIPELINE_STAGES]
+        for line in summary:
+            logger.info(line)
+
+        return summary
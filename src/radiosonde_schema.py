@@ -0,0 +1,164 @@
+import datetime
+import functools
+import collections
+import numpy as np
+from configs import load_download_config
+from configs import load_radiosonde_metadata
+
+# numpy types for the `dtype` of the radiosonde metadata
+NP_TYPE_DICT = {
+    'byte': np.byte,
+    'int': np.intc,
+    'float': np.single,
+    'double': np.double,
+    'string': str
+}
+
+# variable attributes which are not written as netCDF attributes
+RESERVED_ATTRS = ['dtype', 'dims', '_FillValue']
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# resolved definition of one netCDF variable
+VariableSchema = collections.namedtuple(
+    'VariableSchema', ['name', 'dtype', 'dims', 'fill_value', 'attrs']
+)
+
+
+def launch_timestamp(launch_time):
+    """
+    convert the (UTC) launch time into seconds since 1970-01-01.
+    """
+
+    return (launch_time - EPOCH).total_seconds()
+
+
+class NetCDFSchema(object):
+    """
+    netCDF schema of the radiosonde data, compiled from
+    `radiosonde_metadata.toml`.
+
+    The dtypes, dimensions, fill values and attribute dicts of every
+    variable are resolved once, so that writing a file only creates the
+    variables and applies their attributes in bulk with `setncatts`.
+
+    Example
+    -------
+    >>> schema = get_netcdf_schema()
+    >>> schema.create_dimensions(dataset, rsDims)
+    >>> variable = schema.create_variable(dataset, 'temperature')
+    >>> dataset.history = schema.history()
+    """
+
+    def __init__(self, metadata=None, processor_name=None,
+                 processor_version=None):
+        """
+        initialize the instance.
+
+        Keywords
+        --------
+        metadata: dict
+            radiosonde metadata (default: `radiosonde_metadata.toml`).
+        processor_name: str
+            name of the processor in the history attribute (default:
+            `processor_name` in download_config.toml).
+        processor_version: str
+            version of the processor in the history attribute (default:
+            `processor_version` in download_config.toml).
+        """
+
+        if metadata is None:
+            metadata = load_radiosonde_metadata()
+
+        config = load_download_config()['radiosonde']
+        if processor_name is None:
+            processor_name = config['processor_name']
+        if processor_version is None:
+            processor_version = config['processor_version']
+
+        self.dimensions = tuple(metadata['dimensions'])
+        self.variables = collections.OrderedDict()
+        for var_key, varConfig in metadata.items():
+            if not isinstance(varConfig, dict):
+                continue
+
+            self.variables[var_key] = VariableSchema(
+                name=var_key,
+                dtype=NP_TYPE_DICT[varConfig['dtype']],
+                dims=tuple(varConfig['dims']),
+                fill_value=varConfig.get('_FillValue'),
+                attrs={key: value for key, value in varConfig.items()
+                       if key not in RESERVED_ATTRS}
+            )
+
+        self.processor = '{name}-{version}'.format(name=processor_name,
+                                                   version=processor_version)
+
+    def __contains__(self, var_key):
+
+        return var_key in self.variables
+
+    def create_dimensions(self, dataset, rsDims):
+        """
+        create the dimensions of a single sounding.
+        """
+
+        for dim_key in self.dimensions:
+            dataset.createDimension(dim_key, rsDims[dim_key])
+
+    def create_variable(self, dataset, var_key, dims=None, **kwargs):
+        """
+        create the variable and write its attributes.
+
+        Parameters
+        ----------
+        dataset: `netCDF4.Dataset`
+        var_key: str
+            name of the variable.
+
+        Keywords
+        --------
+        dims: tuple
+            dimensions of the variable (default: `dims` of the metadata).
+        kwargs: dict
+            keywords passed to `createVariable`, e.g. zlib and chunksizes.
+
+        Returns
+        -------
+        variable: `netCDF4.Variable`
+        """
+
+        varSchema = self.variables[var_key]
+
+        variable = dataset.createVariable(
+            var_key,
+            varSchema.dtype,
+            varSchema.dims if dims is None else dims,
+            fill_value=varSchema.fill_value,
+            **kwargs
+        )
+        variable.setncatts(varSchema.attrs)
+
+        return variable
+
+    def history(self, now=None):
+        """
+        history attribute of a file processed at `now` (UTC).
+        """
+
+        if now is None:
+            now = datetime.datetime.utcnow()
+
+        return '{time}: processed by {processor}'.format(
+            time=now.strftime('%Y-%m-%d %H:%M:%S'), processor=self.processor)
+
+
+@functools.lru_cache(maxsize=None)
+def get_netcdf_schema():
+    """
+    get the schema compiled from `radiosonde_metadata.toml`.
+
+    The schema is compiled only once and shared by all the writers.
+    """
+
+    return NetCDFSchema()
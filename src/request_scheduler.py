@@ -0,0 +1,357 @@
+import time
+import heapq
+import queue
+import itertools
+import threading
+import contextlib
+from urllib.parse import urlparse
+from configs import load_download_config, download_defaults
+from logger_init import radiosonde_logger
+from metrics import get_metrics
+
+logger = radiosonde_logger()
+
+
+class ServerBusyError(Exception):
+    """
+    The server answered with a busy/error page instead of the data.
+    """
+
+    def __init__(self, url):
+
+        super(ServerBusyError, self).__init__(
+            'Server is busy: {url}'.format(url=url))
+        self.url = url
+
+
+class TokenBucket(object):
+    """
+    Token bucket limiting the request rate.
+
+    The bucket holds at most `capacity` tokens and is refilled with `rate`
+    tokens per second. Every request takes one token and waits until one is
+    available, so that bursts of `capacity` requests are allowed but the
+    long-term rate never exceeds `rate`.
+    """
+
+    def __init__(self, rate, capacity):
+
+        if (rate <= 0) or (capacity < 1):
+            raise ValueError('Rate and capacity must be positive.')
+
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """
+        take one token, waiting for the refill if the bucket is empty.
+
+        Returns
+        -------
+        waited: float
+            time waited for the token. [s]
+        """
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """
+        empty the bucket, e.g. to pause the requests after a busy page.
+        """
+
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = 0.0
+
+
+class HostState(object):
+    """
+    Token bucket and AIMD concurrency limit of one host.
+
+    The concurrency limit grows by `increase` per window of successful
+    requests (additive increase) and is multiplied by `decrease_factor`
+    after every busy page (multiplicative decrease), so that it converges to
+    the highest concurrency the server sustains.
+    """
+
+    def __init__(self, host, *args, rate, burst, min_concurrency,
+                 max_concurrency, increase, decrease_factor):
+
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        wait for a free slot under the concurrency limit and a token.
+        """
+
+        with self._cond:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+
+        self.bucket.acquire()
+
+    def release(self):
+
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+
+        with self._cond:
+            self.limit = min(self.max_concurrency,
+                             self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+
+    def on_busy(self):
+
+        with self._cond:
+            self.limit = max(self.min_concurrency,
+                             self.limit * self.decrease_factor)
+            limit = self.limit
+        self.bucket.drain()
+
+        logger.warning('{host} is busy. Reduce the concurrency to {n:d}.'.
+                       format(host=self.host, n=max(1, int(limit))))
+
+
+class RequestScheduler(object):
+    """
+    Politeness scheduler of the requests to the sounding servers.
+
+    Every host has a token bucket limiting the request rate and an AIMD
+    concurrency limit, which is reduced when the host answers with a busy
+    page (`ServerBusyError`) and recovers with the successful requests. The
+    tasks of the busy pages are re-queued with an exponential delay, up to
+    `max_requeues` times.
+
+    Example
+    -------
+    >>> scheduler = RequestScheduler(max_concurrency=4)
+    >>> with scheduler.request(reqURL):
+    ...     res = transport.get(reqURL)
+    >>> html = rs.fetch_html(start_time, end_time, siteNum,
+    ...                      scheduler=scheduler)
+    """
+
+    def __init__(self, *args, rate=None, burst=None, min_concurrency=None,
+                 max_concurrency=None, increase=None, decrease_factor=None,
+                 requeue_delay=None, requeue_delay_max=None,
+                 max_requeues=None):
+        """
+        initialize the instance. The default values are taken from the
+        [radiosonde_scheduler] section of `download_config.toml`.
+
+        Keywords
+        --------
+        rate: float
+            requests per second of every host.
+        burst: integer
+            maximum number of requests sent at once to a host.
+        min_concurrency: integer
+            lower limit of the concurrent requests to a host.
+        max_concurrency: integer
+            upper limit of the concurrent requests to a host (default:
+            `max_workers_per_host` in the [radiosonde] section).
+        increase: float
+            additive increase of the concurrency limit per window of
+            successful requests.
+        decrease_factor: float
+            multiplicative decrease of the concurrency limit after a busy
+            page.
+        requeue_delay: float
+            delay before the first retry of a task with a busy page. It's
+            doubled for every retry. [s]
+        requeue_delay_max: float
+            upper limit of the delay before the retry. [s]
+        max_requeues: integer
+            number of retries of a task with busy pages before it fails.
+        """
+
+        default = download_defaults('radiosonde_scheduler')
+
+        if max_concurrency is None:
+            max_concurrency = \
+                load_download_config()['radiosonde']['max_workers_per_host']
+
+        self.rate = default(rate, 'rate')
+        self.burst = default(burst, 'burst')
+        self.min_concurrency = default(min_concurrency, 'min_concurrency')
+        self.max_concurrency = max_concurrency
+        self.increase = default(increase, 'increase')
+        self.decrease_factor = default(decrease_factor, 'decrease_factor')
+        self.requeue_delay = default(requeue_delay, 'requeue_delay')
+        self.requeue_delay_max = default(requeue_delay_max,
+                                         'requeue_delay_max')
+        self.max_requeues = default(max_requeues, 'max_requeues')
+
+        if (self.min_concurrency < 1) or \
+           (self.max_concurrency < self.min_concurrency):
+            raise ValueError('Invalid concurrency limits: {low} - {high}'.
+                             format(low=self.min_concurrency,
+                                    high=self.max_concurrency))
+        if not (0 < self.decrease_factor < 1):
+            raise ValueError('decrease_factor must be within (0, 1).')
+
+        self.metrics = get_metrics()
+        self._hosts = {}
+        self._requeues = {}
+        self._lock = threading.Lock()
+
+    def host(self, url):
+        """
+        get the state of the host of the url.
+        """
+
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = HostState(
+                    host,
+                    rate=self.rate,
+                    burst=self.burst,
+                    min_concurrency=self.min_concurrency,
+                    max_concurrency=self.max_concurrency,
+                    increase=self.increase,
+                    decrease_factor=self.decrease_factor)
+
+        return self._hosts[host]
+
+    @contextlib.contextmanager
+    def request(self, url):
+        """
+        send the request of the block under the limits of the host.
+
+        A `ServerBusyError` raised in the block reduces the concurrency of
+        the host, and is raised again.
+        """
+
+        hostState = self.host(url)
+        hostState.acquire()
+        try:
+            yield
+        except ServerBusyError:
+            hostState.on_busy()
+            raise
+        else:
+            hostState.on_success()
+        finally:
+            hostState.release()
+
+    def retry_delay(self, task):
+        """
+        delay before re-queueing the task after a busy page.
+
+        Returns
+        -------
+        delay: float
+            delay before the retry [s]. None if the task has been re-queued
+            `max_requeues` times.
+        """
+
+        with self._lock:
+            attempt = self._requeues.get(task, 0)
+            if attempt >= self.max_requeues:
+                return None
+            self._requeues[task] = attempt + 1
+
+        self.metrics.increment('radiosonde_requeues_total')
+
+        return min(self.requeue_delay_max, self.requeue_delay * 2 ** attempt)
+
+
+class DelayedTaskQueue(object):
+    """
+    Queue of tasks which can be put back with a delay.
+
+    `get` returns the next task whose delay has passed, and None once the
+    queue is empty and every task taken from it has been marked with
+    `task_done`, i.e. no task can be re-queued anymore.
+    """
+
+    def __init__(self, tasks=()):
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._unfinished = 0
+        self._cond = threading.Condition()
+
+        for task in tasks:
+            self.put(task)
+
+    def put(self, task, delay=0.0):
+
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay,
+                                        next(self._counter), task))
+            self._unfinished += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        get the next ready task.
+
+        Raises
+        ------
+        queue.Empty
+            no task is ready within the timeout.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._heap and (self._heap[0][0] <= now):
+                    return heapq.heappop(self._heap)[2]
+                if (not self._heap) and (self._unfinished == 0):
+                    return None
+
+                waitTime = None
+                if self._heap:
+                    waitTime = self._heap[0][0] - now
+                if deadline is not None:
+                    if now >= deadline:
+                        raise queue.Empty()
+                    remaining = deadline - now
+                    waitTime = remaining if waitTime is None \
+                        else min(waitTime, remaining)
+
+                self._cond.wait(waitTime)
+
+    def task_done(self):
+        """
+        mark a task taken by `get` as finished.
+        """
+
+        with self._cond:
+            self._unfinished -= 1
+            self._cond.notify_all()
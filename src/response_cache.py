@@ -0,0 +1,217 @@
+import os
+import gzip
+import time
+import datetime
+import threading
+import collections
+from configs import download_defaults
+from logger_init import radiosonde_logger
+
+logger = radiosonde_logger()
+
+CACHE_FILE_SUFFIX = '.html.gz'
+
+# normalized sounding request. FROM and TO are 'DDHH' strings.
+RequestKey = collections.namedtuple(
+    'RequestKey', ['station', 'year', 'month', 'FROM', 'TO']
+)
+
+
+def request_last_time(key):
+    """
+    get the last hour covered by the request.
+    """
+
+    return datetime.datetime(key.year, key.month,
+                             int(key.TO[0:2]), int(key.TO[2:4]))
+
+
+class ResponseCache(object):
+    """
+    Persistent cache of the sounding responses.
+
+    Every response is stored as a gzip-compressed file named after the
+    normalized request. Requests for historical months never expire, while
+    the requests of the recent days expire after `recent_ttl`, because the
+    online database may still receive new soundings for them. The total
+    size of the cache is bounded by evicting the least recently used
+    responses. The eviction goes down to `evict_ratio` of `max_size`, so
+    that the cache directory isn't scanned again by every later `put`.
+
+    The modification time of every file records when it was stored and the
+    access time records the last hit.
+    """
+
+    def __init__(self, cache_dir=None, *args, max_size=None, evict_ratio=None,
+                 recent_ttl=None, recent_days=None):
+        """
+        initialize the instance. The default values are taken from the
+        [radiosonde_cache] section of `download_config.toml`.
+
+        Parameters
+        ----------
+        cache_dir: str
+            directory for saving the responses.
+
+        Keywords
+        --------
+        max_size: float
+            maximum size of the cache. [MB]
+        evict_ratio: float
+            fraction of `max_size` which the eviction shrinks the cache to.
+        recent_ttl: float
+            time to live of the responses for recent requests. [s]
+        recent_days: float
+            requests ending within `recent_days` before now are recent. [day]
+        """
+
+        default = download_defaults('radiosonde_cache')
+
+        self.cache_dir = os.path.expanduser(default(cache_dir, 'CACHE_DIR'))
+        self.max_size = int(default(max_size, 'max_size') * 1024 ** 2)
+        self.evict_ratio = default(evict_ratio, 'evict_ratio')
+        self.recent_ttl = default(recent_ttl, 'recent_ttl')
+        self.recent_days = default(recent_days, 'recent_days')
+
+        if not (0 < self.evict_ratio <= 1):
+            raise ValueError('evict_ratio must be within (0, 1].')
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        self._lock = threading.Lock()
+        self._size = sum(
+            os.path.getsize(os.path.join(self.cache_dir, file))
+            for file in os.listdir(self.cache_dir)
+            if file.endswith(CACHE_FILE_SUFFIX)
+        )
+
+    def key_path(self, key):
+        """
+        path of the cache file for the request.
+        """
+
+        filename = '{station:05d}_{year:04d}{month:02d}_{FROM}_{TO}{sfx}'.\
+            format(sfx=CACHE_FILE_SUFFIX, **key._asdict())
+
+        return os.path.join(self.cache_dir, filename)
+
+    def is_historical(self, key, now=None):
+        """
+        whether the request is too old to receive new soundings.
+        """
+
+        if now is None:
+            now = datetime.datetime.utcnow()
+
+        recentTime = now - datetime.timedelta(days=self.recent_days)
+
+        return request_last_time(key) < recentTime
+
+    def get(self, key):
+        """
+        get the cached response of the request.
+
+        Returns
+        -------
+        html: str
+            html text of the response. None if the request is not cached or
+            has expired.
+        """
+
+        path = self.key_path(key)
+
+        with self._lock:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return None
+
+            if (not self.is_historical(key)) and \
+               (time.time() - stat.st_mtime > self.recent_ttl):
+                logger.debug('Expired cache {file}'.format(file=path))
+                self._remove(path, stat.st_size)
+                return None
+
+            try:
+                with gzip.open(path, 'rb') as fh:
+                    html = fh.read().decode('utf-8')
+            except (OSError, EOFError) as e:
+                logger.warning('Corrupted cache {file}: {err}'.format(
+                    file=path, err=e))
+                self._remove(path, stat.st_size)
+                return None
+
+            # record the hit for the LRU eviction
+            os.utime(path, (time.time(), stat.st_mtime))
+
+        return html
+
+    def put(self, key, html):
+        """
+        save the response of the request.
+        """
+
+        path = self.key_path(key)
+        tmpPath = '{path}.{pid:d}.{tid:d}.tmp'.format(
+            path=path, pid=os.getpid(), tid=threading.get_ident())
+
+        with gzip.open(tmpPath, 'wb') as fh:
+            fh.write(html.encode('utf-8'))
+
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmpPath, path)
+            self._size += os.path.getsize(path)
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def clear(self):
+        """
+        remove all the cached responses.
+        """
+
+        with self._lock:
+            for file in os.listdir(self.cache_dir):
+                if file.endswith(CACHE_FILE_SUFFIX):
+                    os.remove(os.path.join(self.cache_dir, file))
+            self._size = 0
+
+    @property
+    def size(self):
+        """
+        total size of the cached responses. [bytes]
+        """
+
+        return self._size
+
+    def _remove(self, path, size):
+
+        try:
+            os.remove(path)
+            self._size -= size
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """
+        remove the least recently used responses until the cache fits into
+        `evict_ratio * max_size`.
+        """
+
+        lowWater = self.evict_ratio * self.max_size
+
+        entries = []
+        for file in os.listdir(self.cache_dir):
+            if file.endswith(CACHE_FILE_SUFFIX):
+                path = os.path.join(self.cache_dir, file)
+                stat = os.stat(path)
+                entries.append((stat.st_atime, stat.st_size, path))
+
+        for atime, size, path in sorted(entries):
+            if self._size <= lowWater:
+                break
+            logger.debug('Evict cache {file}'.format(file=path))
+            self._remove(path, size)
@@ -0,0 +1,588 @@
+import os
+import re
+import bisect
+import hashlib
+import datetime
+import threading
+import numpy as np
+from configs import load_download_config
+from logger_init import radiosonde_logger
+
+logger = radiosonde_logger()
+
+# format of the {date} field in `nc_file_naming`
+NC_DATE_FORMAT = '%Y%m%d_%H%M'
+NC_DATE_PATTERN = r'\d{8}_\d{4}'
+
+EPOCH = datetime.datetime(1970, 1, 1)
+INDEX_VERSION = 2
+
+
+def sounding_filename(station, launch_time, file_naming=None):
+    """
+    name of the netCDF file for the sounding.
+
+    Parameters
+    ----------
+    station: integer
+        station number.
+    launch_time: datetime obj
+        launch time of the sounding.
+
+    Keywords
+    --------
+    file_naming: str
+        naming pattern (default: `nc_file_naming` in download_config.toml).
+    """
+
+    if file_naming is None:
+        file_naming = load_download_config()['radiosonde']['nc_file_naming']
+
+    return file_naming.format(sitenum=station,
+                              date=launch_time.strftime(NC_DATE_FORMAT))
+
+
+def compile_file_pattern(file_naming=None):
+    """
+    compile the naming pattern of the netCDF files into a regex.
+
+    e.g., "radiosonde_{sitenum}_{date}.nc" ->
+    "radiosonde_(?P<sitenum>\\d+)_(?P<date>\\d{8}_\\d{4})\\.nc"
+    """
+
+    if file_naming is None:
+        file_naming = load_download_config()['radiosonde']['nc_file_naming']
+
+    fields = {'sitenum': r'(?P<sitenum>\d+)',
+              'date': r'(?P<date>' + NC_DATE_PATTERN + r')'}
+
+    pattern = ''
+    for part in re.split(r'(\{\w+\})', file_naming):
+        if re.fullmatch(r'\{\w+\}', part):
+            pattern += fields[part[1:-1]]
+        else:
+            pattern += re.escape(part)
+
+    return re.compile(pattern + '$')
+
+
+def parse_sounding_filename(filename, pattern=None):
+    """
+    parse the station number and launch time from the file name.
+
+    Returns
+    -------
+    key: tuple
+        (station, launch_time). None if the name doesn't match the pattern.
+    """
+
+    if pattern is None:
+        pattern = compile_file_pattern()
+
+    match = pattern.match(filename)
+    if match is None:
+        return None
+
+    try:
+        launchTime = datetime.datetime.strptime(match.group('date'),
+                                                NC_DATE_FORMAT)
+    except ValueError:
+        return None
+
+    return int(match.group('sitenum')), launchTime
+
+
+def to_seconds(launch_time):
+    """
+    UTC seconds since 1970-01-01 of the launch time.
+    """
+
+    return int((launch_time - EPOCH).total_seconds())
+
+
+def from_seconds(seconds):
+
+    return EPOCH + datetime.timedelta(seconds=int(seconds))
+
+
+def expected_launch_times(start_time, end_time, launch_hours=None):
+    """
+    regular launch times within [start_time, end_time).
+
+    Keywords
+    --------
+    launch_hours: list
+        synoptic hours of the launches (default: `launch_hours` in
+        download_config.toml).
+    """
+
+    if launch_hours is None:
+        launch_hours = load_download_config()['radiosonde']['launch_hours']
+
+    thisDay = datetime.datetime(start_time.year, start_time.month,
+                                start_time.day)
+    while thisDay < end_time:
+        for hour in sorted(launch_hours):
+            launchTime = thisDay + datetime.timedelta(hours=hour)
+            if start_time <= launchTime < end_time:
+                yield launchTime
+        thisDay = thisDay + datetime.timedelta(days=1)
+
+
+class SoundingManifest(object):
+    """
+    Manifest of the archived soundings in the output directory.
+
+    The directory is scanned once when the manifest is created. New
+    soundings are added after they are written, so that the download
+    planner can skip the requests whose soundings are all archived.
+
+    Stations often miss launches, so the windows which were downloaded and
+    written completely are recorded as well, and are not requested again
+    even if some of their regular soundings don't exist. Only the windows
+    which ended `settled_days` before are recorded, as UWyo may still add
+    soundings to the recent ones.
+    """
+
+    def __init__(self, output_dir, *args, file_naming=None,
+                 settled_days=None):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        output_dir: str
+            directory of the netCDF files.
+
+        Keywords
+        --------
+        file_naming: str
+            naming pattern (default: `nc_file_naming` in
+            download_config.toml).
+        settled_days: float
+            windows ending within `settled_days` before now are not
+            recorded (default: `settled_days` of the [radiosonde_archive]
+            section). [day]
+        """
+
+        if settled_days is None:
+            settled_days = \
+                load_download_config()['radiosonde_archive']['settled_days']
+
+        self.output_dir = output_dir
+        self.pattern = compile_file_pattern(file_naming)
+        self.settled_days = settled_days
+        self._soundings = set()
+        # fetched windows of every station: [(start_time, end_time)]
+        self._windows = {}
+        self._lock = threading.Lock()
+
+        self.scan()
+
+    def scan(self):
+        """
+        scan the output directory for the archived soundings.
+        """
+
+        soundings = set()
+        if os.path.isdir(self.output_dir):
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    key = parse_sounding_filename(entry.name, self.pattern)
+                    if key is not None:
+                        soundings.add(key)
+
+        with self._lock:
+            self._soundings = soundings
+
+        logger.info('Found {n:d} archived soundings in {path}'.format(
+            n=len(soundings), path=self.output_dir))
+
+    def __len__(self):
+
+        return len(self._soundings)
+
+    def __contains__(self, key):
+
+        return key in self._soundings
+
+    def add(self, station, launch_time):
+        """
+        add an archived sounding.
+        """
+
+        with self._lock:
+            self._soundings.add((station, launch_time))
+
+    def add_file(self, filepath):
+        """
+        add an archived sounding by the path of its file.
+        """
+
+        key = parse_sounding_filename(os.path.basename(filepath),
+                                      self.pattern)
+        if key is not None:
+            self.add(*key)
+
+    def add_window(self, station, start_time, end_time, now=None):
+        """
+        record a window whose soundings were all downloaded and written,
+        including the windows without any sounding.
+
+        Returns
+        -------
+        isRecorded: boolean
+            False if the window is too recent to be recorded.
+        """
+
+        if now is None:
+            now = datetime.datetime.utcnow()
+
+        if end_time > now - datetime.timedelta(days=self.settled_days):
+            return False
+
+        with self._lock:
+            windows = self._windows.setdefault(station, [])
+            if (start_time, end_time) not in windows:
+                windows.append((start_time, end_time))
+
+        return True
+
+    def is_fetched(self, station, start_time, end_time):
+        """
+        whether the period is covered by a recorded window.
+        """
+
+        return any((windowStart <= start_time) and (end_time <= windowEnd)
+                   for windowStart, windowEnd in
+                   self._windows.get(station, []))
+
+    def is_complete(self, station, start_time, end_time, launch_hours=None):
+        """
+        whether the period doesn't need to be downloaded, i.e., it's covered
+        by a recorded window or all its regular soundings are archived.
+
+        Parameters
+        ----------
+        station: integer
+            station number.
+        start_time: datetime obj
+            start of the period (included).
+        end_time: datetime obj
+            end of the period (excluded).
+
+        Keywords
+        --------
+        launch_hours: list
+            synoptic hours of the launches (default: `launch_hours` in
+            download_config.toml).
+        """
+
+        if self.is_fetched(station, start_time, end_time):
+            return True
+
+        return all(
+            (station, launchTime) in self._soundings
+            for launchTime in expected_launch_times(
+                start_time, end_time, launch_hours)
+        )
+
+
+class ArchiveIndex(SoundingManifest):
+    """
+    Sorted and persistent index of the archived soundings.
+
+    The launch times of every station are kept as a sorted list of UTC
+    seconds, so that the range, count and gap queries are binary searches
+    instead of globbing the directory and opening the files. The index is
+    saved outside the output directory (see `INDEX_DIR` of the
+    [radiosonde_archive] section) together with the modification time of the
+    directory, and the directory is only rescanned when files were added or
+    removed by others since the index was saved. Soundings written by the
+    downloader are added incrementally. The fetched windows are saved with
+    the index and survive the rescans.
+
+    Example
+    -------
+    >>> index = ArchiveIndex('/data/radiosonde')
+    >>> index.count(57494, datetime(2015, 1, 1), datetime(2016, 1, 1))
+    730
+    >>> index.missing(57494, datetime(2015, 1, 1), datetime(2016, 1, 1))
+    [datetime.datetime(2015, 3, 2, 12, 0)]
+    """
+
+    def __init__(self, output_dir, *args, file_naming=None, index_file=None,
+                 settled_days=None):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        output_dir: str
+            directory of the netCDF files.
+
+        Keywords
+        --------
+        file_naming: str
+            naming pattern (default: `nc_file_naming` in
+            download_config.toml).
+        index_file: str
+            path of the saved index (default: a file in `INDEX_DIR` named
+            after the output directory).
+        settled_days: float
+            see `SoundingManifest`.
+        """
+
+        if index_file is None:
+            indexDir = os.path.expanduser(
+                load_download_config()['radiosonde_archive']['INDEX_DIR'])
+            dirHash = hashlib.sha1(
+                os.path.abspath(output_dir).encode('utf-8')).hexdigest()
+            index_file = os.path.join(
+                indexDir, 'archive_{hash}.npz'.format(hash=dirHash[:16]))
+
+        self.index_file = index_file
+        self._times = {}
+        self._count = 0
+
+        SoundingManifest.__init__(self, output_dir, file_naming=file_naming,
+                                  settled_days=settled_days)
+
+    def _directory_mtime(self):
+
+        try:
+            return os.stat(self.output_dir).st_mtime_ns
+        except FileNotFoundError:
+            return -1
+
+    def scan(self):
+        """
+        load the saved index, or scan the output directory if the index is
+        missing or outdated.
+        """
+
+        if self.load():
+            return
+
+        SoundingManifest.scan(self)
+
+        times = {}
+        for station, launchTime in self._soundings:
+            times.setdefault(station, []).append(to_seconds(launchTime))
+        for station in times:
+            times[station].sort()
+
+        with self._lock:
+            self._times = times
+            self._count = len(self._soundings)
+            # the set is only needed for the scan
+            self._soundings = set()
+
+        self.save()
+
+    def load(self):
+        """
+        load the saved index if the output directory didn't change since it
+        was saved.
+
+        Returns
+        -------
+        isLoaded: boolean
+        """
+
+        try:
+            with np.load(self.index_file) as data:
+                if int(data['version']) != INDEX_VERSION:
+                    return False
+                isCurrent = (int(data['directory_mtime']) ==
+                             self._directory_mtime())
+                stations = data['station']
+                launchTimes = data['launch_time']
+                windowKeys = zip(data['window_station'].tolist(),
+                                 data['window_start'].tolist(),
+                                 data['window_end'].tolist())
+                windows = {}
+                for station, windowStart, windowEnd in windowKeys:
+                    windows.setdefault(station, []).append(
+                        (from_seconds(windowStart), from_seconds(windowEnd)))
+        except (OSError, ValueError, KeyError):
+            return False
+
+        # the fetched windows don't depend on the files, so they are kept
+        # when the directory is rescanned
+        with self._lock:
+            self._windows = windows
+
+        if not isCurrent:
+            return False
+
+        # the saved keys are sorted by station and launch time
+        times = {}
+        bounds = np.flatnonzero(np.diff(stations)) + 1
+        for thisStations, thisTimes in zip(np.split(stations, bounds),
+                                           np.split(launchTimes, bounds)):
+            if thisStations.size:
+                times[int(thisStations[0])] = thisTimes.tolist()
+
+        with self._lock:
+            self._times = times
+            self._count = launchTimes.size
+
+        logger.info('Loaded {n:d} archived soundings from {file}'.format(
+            n=self._count, file=self.index_file))
+
+        return True
+
+    def save(self):
+        """
+        save the index with the current modification time of the output
+        directory.
+        """
+
+        with self._lock:
+            stationList = sorted(self._times)
+            stations = np.concatenate(
+                [np.full(len(self._times[station]), station, dtype=np.int32)
+                 for station in stationList] + [np.zeros(0, dtype=np.int32)])
+            launchTimes = np.concatenate(
+                [np.asarray(self._times[station], dtype=np.int64)
+                 for station in stationList] + [np.zeros(0, dtype=np.int64)])
+
+            windowKeys = [(station, to_seconds(windowStart),
+                           to_seconds(windowEnd))
+                          for station in sorted(self._windows)
+                          for windowStart, windowEnd in self._windows[station]]
+            windowKeys = np.array(windowKeys,
+                                  dtype=np.int64).reshape(-1, 3)
+
+        indexDir = os.path.dirname(self.index_file)
+        try:
+            if indexDir and (not os.path.exists(indexDir)):
+                os.makedirs(indexDir)
+            tmpFile = '{file}.{pid:d}.tmp.npz'.format(file=self.index_file,
+                                                      pid=os.getpid())
+            np.savez(tmpFile, version=INDEX_VERSION,
+                     directory_mtime=self._directory_mtime(),
+                     station=stations, launch_time=launchTimes,
+                     window_station=windowKeys[:, 0],
+                     window_start=windowKeys[:, 1],
+                     window_end=windowKeys[:, 2])
+            os.replace(tmpFile, self.index_file)
+        except OSError as e:
+            logger.warning('Failed to save the archive index: {err}'.format(
+                err=e))
+
+    def __len__(self):
+
+        return self._count
+
+    def __contains__(self, key):
+
+        station, launchTime = key
+        times = self._times.get(station)
+        if not times:
+            return False
+
+        seconds = to_seconds(launchTime)
+        iTime = bisect.bisect_left(times, seconds)
+
+        return (iTime < len(times)) and (times[iTime] == seconds)
+
+    def add(self, station, launch_time):
+        """
+        add an archived sounding.
+        """
+
+        seconds = to_seconds(launch_time)
+        with self._lock:
+            times = self._times.setdefault(station, [])
+            iTime = bisect.bisect_left(times, seconds)
+            if (iTime < len(times)) and (times[iTime] == seconds):
+                return
+            times.insert(iTime, seconds)
+            self._count += 1
+
+    def stations(self):
+        """
+        station numbers in the archive.
+        """
+
+        return sorted(station for station in self._times
+                      if self._times[station])
+
+    def _bounds(self, times, start_time, end_time):
+
+        iStart = 0
+        iStop = len(times)
+        if start_time is not None:
+            iStart = bisect.bisect_left(times, to_seconds(start_time))
+        if end_time is not None:
+            iStop = bisect.bisect_left(times, to_seconds(end_time))
+
+        return iStart, max(iStart, iStop)
+
+    def query(self, station, start_time=None, end_time=None):
+        """
+        launch times of the archived soundings within [start_time, end_time).
+
+        Returns
+        -------
+        launchTimes: list
+            sorted `datetime` objs.
+        """
+
+        times = self._times.get(station, [])
+        iStart, iStop = self._bounds(times, start_time, end_time)
+
+        return [from_seconds(seconds) for seconds in times[iStart:iStop]]
+
+    def count(self, station=None, start_time=None, end_time=None):
+        """
+        number of the archived soundings within [start_time, end_time) of
+        the station (all the stations if it's None).
+        """
+
+        if station is None:
+            stations = list(self._times)
+        else:
+            stations = [station]
+
+        count = 0
+        for thisStation in stations:
+            times = self._times.get(thisStation, [])
+            iStart, iStop = self._bounds(times, start_time, end_time)
+            count += iStop - iStart
+
+        return count
+
+    def missing(self, station, start_time, end_time, launch_hours=None):
+        """
+        regular launches within [start_time, end_time) which are not
+        archived, e.g. the missing 00Z/12Z soundings.
+
+        Keywords
+        --------
+        launch_hours: list
+            synoptic hours of the launches (default: `launch_hours` in
+            download_config.toml).
+
+        Returns
+        -------
+        launchTimes: list
+            sorted `datetime` objs.
+        """
+
+        times = self._times.get(station, [])
+        iStart, iStop = self._bounds(times, start_time, end_time)
+        archived = set(times[iStart:iStop])
+
+        return [launchTime for launchTime in
+                expected_launch_times(start_time, end_time, launch_hours)
+                if to_seconds(launchTime) not in archived]
+
+    def is_complete(self, station, start_time, end_time, launch_hours=None):
+
+        if self.is_fetched(station, start_time, end_time):
+            return True
+
+        return not self.missing(station, start_time, end_time, launch_hours)
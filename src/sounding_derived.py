@@ -0,0 +1,298 @@
+import numpy as np
+from configs import load_download_config
+from radiosonde_schema import get_netcdf_schema
+
+# physical constants
+BOLTZMANN = 1.380649e-23   # [J*K-1]
+ZERO_CELSIUS = 273.15   # [K]
+EPSILON = 0.622   # ratio of the molar masses of water vapor and dry air
+KNOT = 0.514444   # [m*s-1]
+# number density of the standard air (288.15 K, 1013.25 hPa) [m-3]
+STANDARD_NUMBER_DENSITY = 101325.0 / (BOLTZMANN * 288.15)
+# volume concentration of CO2 in the standard air [%]
+CO2_CONCENTRATION = 0.036
+
+# derived variables along the altitude, in the order of
+# radiosonde_metadata.toml
+DERIVED_VARIABLES = [
+    'number_density', 'rayleigh_extinction', 'rayleigh_backscatter',
+    'virtual_temperature', 'u_wind', 'v_wind'
+]
+
+# sounding variables needed by the derived variables
+DERIVED_INPUTS = [
+    'pressure', 'temperature', 'water_vapor_mixing_ratio', 'wind_speed',
+    'wind_direction'
+]
+
+
+def stack_soundings(dataList, keys):
+    """
+    stack the profiles of many soundings into padded 2-D arrays.
+
+    The values equal to the `_FillValue` of radiosonde_metadata.toml (e.g.
+    profiles read back from the netCDF files) and the NaNs of the blank
+    fields are both marked with NaN, and the profiles are padded with NaN
+    to the longest sounding.
+
+    Parameters
+    ----------
+    dataList: list
+        radiosonde data of every sounding. See `RSDownloader.parse_html`.
+    keys: list
+        variables along the altitude to be stacked.
+
+    Returns
+    -------
+    columns: dict
+        (nSoundings, nLevels) float64 array for every key.
+    nLevels: ndarray
+        number of the levels of every sounding.
+    """
+
+    schema = get_netcdf_schema()
+    nLevels = np.array([len(rsData['altitude']) for rsData in dataList],
+                       dtype=np.intp)
+    maxLevels = int(nLevels.max()) if nLevels.size else 0
+    # levels of every sounding in the padded grid
+    isLevel = np.arange(maxLevels) < nLevels[:, np.newaxis]
+
+    columns = {}
+    for key in keys:
+        values = np.full((len(dataList), maxLevels), np.nan)
+        if dataList:
+            values[isLevel] = np.concatenate(
+                [np.asarray(rsData[key], dtype=np.float64).reshape(-1)
+                 for rsData in dataList])
+
+        fillValue = schema.variables[key].fill_value
+        if fillValue is not None:
+            values[values == fillValue] = np.nan
+        columns[key] = values
+
+    return columns, nLevels
+
+
+def unstack_soundings(columns, nLevels):
+    """
+    split the padded 2-D arrays back into the profiles of every sounding.
+
+    Returns
+    -------
+    profiles: list
+        dict with the 1-D array of every key for every sounding.
+    """
+
+    return [{key: values[iSounding, :nLevels[iSounding]].copy()
+             for key, values in columns.items()}
+            for iSounding in range(len(nLevels))]
+
+
+def number_density(pressure, temperature):
+    """
+    number density of the air molecules with the ideal gas law.
+
+    Parameters
+    ----------
+    pressure: array_like
+        air pressure. [hPa]
+    temperature: array_like
+        air temperature. [degC]
+
+    Returns
+    -------
+    number_density: ndarray
+        [m-3]
+    """
+
+    return np.asarray(pressure) * 100 / \
+        (BOLTZMANN * (np.asarray(temperature) + ZERO_CELSIUS))
+
+
+def king_factor(wavelength):
+    """
+    King correction factor of the air for the anisotropy of the molecules
+    (Bates, 1984; Bodhaine et al., 1999).
+
+    Parameters
+    ----------
+    wavelength: float
+        [nm]
+    """
+
+    wvl2 = (wavelength * 1e-3) ** -2   # [um-2]
+    fN2 = 1.034 + 3.17e-4 * wvl2
+    fO2 = 1.096 + 1.385e-3 * wvl2 + 1.448e-4 * wvl2 ** 2
+
+    return (78.084 * fN2 + 20.946 * fO2 + 0.934 * 1.00 +
+            CO2_CONCENTRATION * 1.15) / \
+        (78.084 + 20.946 + 0.934 + CO2_CONCENTRATION)
+
+
+def rayleigh_cross_section(wavelength):
+    """
+    Rayleigh scattering cross section of the air molecules (Bucholtz,
+    1995) and its backscatter part.
+
+    Parameters
+    ----------
+    wavelength: float
+        [nm]
+
+    Returns
+    -------
+    sigma: float
+        total scattering cross section. [m2]
+    sigmaBack: float
+        differential cross section at 180 degree. [m2*sr-1]
+    """
+
+    # refractive index of the standard air (Peck and Reeder, 1972)
+    wvn2 = (wavelength * 1e-3) ** -2   # [um-2]
+    nS = 1 + (5791817 / (238.0185 - wvn2) + 167909 / (57.362 - wvn2)) * 1e-8
+
+    fK = king_factor(wavelength)
+    sigma = 24 * np.pi ** 3 * (nS ** 2 - 1) ** 2 / \
+        ((wavelength * 1e-9) ** 4 * STANDARD_NUMBER_DENSITY ** 2 *
+         (nS ** 2 + 2) ** 2) * fK
+
+    # Rayleigh phase function at 180 degree with the depolarization
+    depol = 6 * (fK - 1) / (3 + 7 * fK)
+    gamma = depol / (2 - depol)
+    phaseBack = 3 / (4 * (1 + 2 * gamma)) * (2 + 2 * gamma)
+
+    return sigma, sigma * phaseBack / (4 * np.pi)
+
+
+def virtual_temperature(temperature, mixing_ratio):
+    """
+    virtual temperature of the moist air.
+
+    Parameters
+    ----------
+    temperature: array_like
+        air temperature. [degC]
+    mixing_ratio: array_like
+        water vapor mixing ratio. [g*kg-1]
+
+    Returns
+    -------
+    virtual_temperature: ndarray
+        [K]
+    """
+
+    wvmr = np.asarray(mixing_ratio) * 1e-3
+
+    return (np.asarray(temperature) + ZERO_CELSIUS) * \
+        (1 + wvmr / EPSILON) / (1 + wvmr)
+
+
+def wind_components(wind_speed, wind_direction):
+    """
+    zonal and meridional wind from the speed and the direction where the
+    wind blows from.
+
+    Parameters
+    ----------
+    wind_speed: array_like
+        [knot]
+    wind_direction: array_like
+        [deg], clockwise from north.
+
+    Returns
+    -------
+    u, v: ndarray
+        [m*s-1], positive eastward and northward.
+    """
+
+    speed = np.asarray(wind_speed) * KNOT
+    direction = np.deg2rad(wind_direction)
+
+    return -speed * np.sin(direction), -speed * np.cos(direction)
+
+
+def compute_derived(columns, wavelength=None):
+    """
+    compute the derived variables of a batch of soundings at once.
+
+    Parameters
+    ----------
+    columns: dict
+        arrays of `DERIVED_INPUTS` of the same shape, e.g. stacked by
+        `stack_soundings`. Missing values are NaN.
+    wavelength: float
+        wavelength of the Rayleigh scattering (default: `wavelength` of the
+        [radiosonde_derived] section). [nm]
+
+    Returns
+    -------
+    derived: dict
+        array of every variable in `DERIVED_VARIABLES`. Levels with any
+        missing input are NaN.
+    """
+
+    if wavelength is None:
+        wavelength = load_download_config()['radiosonde_derived']['wavelength']
+
+    sigma, sigmaBack = rayleigh_cross_section(wavelength)
+
+    derived = {}
+    derived['number_density'] = number_density(columns['pressure'],
+                                               columns['temperature'])
+    derived['rayleigh_extinction'] = derived['number_density'] * sigma
+    derived['rayleigh_backscatter'] = derived['number_density'] * sigmaBack
+    derived['virtual_temperature'] = virtual_temperature(
+        columns['temperature'], columns['water_vapor_mixing_ratio'])
+    derived['u_wind'], derived['v_wind'] = wind_components(
+        columns['wind_speed'], columns['wind_direction'])
+
+    return derived
+
+
+def add_derived_variables(dataList, *args, wavelength=None):
+    """
+    add the derived variables to the radiosonde data of many soundings.
+
+    The soundings are stacked into padded 2-D arrays, so that every
+    variable is computed in one vectorized pass over the batch. The
+    variables are described in radiosonde_metadata.toml and are written by
+    all the output backends like the parsed variables.
+
+    Parameters
+    ----------
+    dataList: list
+        radiosonde data of every sounding, which is updated in place with
+        the `DERIVED_VARIABLES` and `rayleigh_wavelength`.
+
+    Keywords
+    --------
+    wavelength: float
+        wavelength of the Rayleigh scattering (default: `wavelength` of the
+        [radiosonde_derived] section). [nm]
+
+    Returns
+    -------
+    dataList: list
+
+    Example
+    -------
+    >>> dataList, dimsList, gAttrsList = rs.get_daily_data(start, end)
+    >>> add_derived_variables(dataList, wavelength=355)
+    >>> dataList[0]['rayleigh_backscatter']
+    """
+
+    if not dataList:
+        return dataList
+
+    if wavelength is None:
+        wavelength = load_download_config()['radiosonde_derived']['wavelength']
+
+    columns, nLevels = stack_soundings(dataList, DERIVED_INPUTS)
+    derived = compute_derived(columns, wavelength=wavelength)
+
+    for rsData, profiles in zip(dataList,
+                                unstack_soundings(derived, nLevels)):
+        rsData.update(profiles)
+        rsData['rayleigh_wavelength'] = wavelength
+
+    return dataList
@@ -0,0 +1,369 @@
+import os
+import hashlib
+import numpy as np
+from logger_init import radiosonde_logger
+
+logger = radiosonde_logger()
+
+EARTH_RADIUS = 6371.0   # mean radius of the Earth [km]
+
+# parsed IGRA station list
+STATION_DTYPE = np.dtype([
+    ('ID', np.int32),
+    ('lat', np.float64),
+    ('lon', np.float64),
+    ('elevation', np.float64),
+    ('station_name', 'U30')
+])
+CACHE_VERSION = 1
+
+
+def haversine(lat, lon, lats, lons):
+    """
+    great-circle distance between one point and an array of points.
+
+    Parameters
+    ----------
+    lat: float
+        latitude of the point. [degree]
+    lon: float
+        longitude of the point. [degree]
+    lats: array
+        latitudes of the points. [degree]
+    lons: array
+        longitudes of the points. [degree]
+
+    Returns
+    -------
+    distance: array
+        distance between the point and every point. [km]
+    """
+
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dLat = lat2 - lat1
+    dLon = np.radians(lons) - np.radians(lon)
+
+    a = np.sin(dLat / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin(dLon / 2) ** 2
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def read_station_table(file):
+    """
+    parse the IGRA station list into a structured array.
+
+    Parameters
+    ----------
+    file: str
+        path of the station list. e.g.,
+        "VQW00011602  17.7000  -64.8000   16.8 VI ST CROIX
+        (BENEDICT FIELD)      1948 1948    346"
+
+    Returns
+    -------
+    stations: ndarray
+        structured array with `STATION_DTYPE`. Lines which can't be parsed
+        (e.g., stations without a WMO number) are skipped.
+    """
+
+    rows = []
+    nBadLines = 0
+    with open(file, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            try:
+                rows.append((
+                    int(line[6:11]),
+                    float(line[12:20]),
+                    float(line[21:30]),
+                    float(line[31:37]),
+                    line[41:71].strip()
+                ))
+            except ValueError:
+                nBadLines += 1
+
+    if nBadLines:
+        logger.debug('Skipped {n:d} lines without station number in {file}'.
+                     format(n=nBadLines, file=file))
+
+    return np.array(rows, dtype=STATION_DTYPE)
+
+
+def file_signature(file, *args, digest=False):
+    """
+    signature of the file for validating the cache.
+
+    Returns
+    -------
+    signature: dict
+        size and mtime of the file, and its sha1 if `digest` is True.
+    """
+
+    stat = os.stat(file)
+    signature = {'version': CACHE_VERSION,
+                 'size': stat.st_size,
+                 'mtime': stat.st_mtime_ns}
+
+    if digest:
+        with open(file, 'rb') as fh:
+            signature['sha1'] = hashlib.sha1(fh.read()).hexdigest()
+
+    return signature
+
+
+def read_signature(file):
+
+    try:
+        with open(file, 'r', encoding='utf-8') as fh:
+            items = [item.split('=', 1) for item in fh.read().split()]
+        signature = {key: value for key, value in items}
+        for key in ['version', 'size', 'mtime']:
+            signature[key] = int(signature[key])
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return signature
+
+
+def write_signature(file, signature):
+
+    with open(file, 'w', encoding='utf-8') as fh:
+        fh.write(' '.join('{0}={1}'.format(key, value)
+                          for key, value in signature.items()))
+
+
+def load_station_table(file, cache_file=None):
+    """
+    load the IGRA station list through a compiled `.npy` cache.
+
+    The cache is saved next to the station list and memory-mapped when it's
+    loaded, so the startup doesn't scale with the number of stations. It's
+    validated by the size and mtime of the station list. If they changed,
+    the sha1 of the station list is compared before parsing it again.
+
+    Parameters
+    ----------
+    file: str
+        path of the station list.
+
+    Keywords
+    --------
+    cache_file: str
+        path of the cache (default: station list with `.npy` extension).
+
+    Returns
+    -------
+    stations: ndarray
+        read-only structured array with `STATION_DTYPE`.
+    """
+
+    if cache_file is None:
+        cache_file = os.path.splitext(file)[0] + '.npy'
+    signature_file = cache_file + '.sig'
+
+    signature = file_signature(file)
+    cachedSignature = read_signature(signature_file)
+
+    if (cachedSignature is not None) and os.path.exists(cache_file):
+        isValid = all(cachedSignature[key] == signature[key]
+                      for key in ['version', 'size', 'mtime'])
+
+        if (not isValid) and (cachedSignature['size'] == signature['size']):
+            # e.g., the file was downloaded again with the same content
+            signature = file_signature(file, digest=True)
+            isValid = (cachedSignature.get('sha1') == signature['sha1'])
+            if isValid:
+                try:
+                    write_signature(signature_file, signature)
+                except OSError:
+                    pass
+
+        if isValid:
+            try:
+                return np.load(cache_file, mmap_mode='r')
+            except (OSError, ValueError) as e:
+                logger.warning('Failed to load {file}: {err}'.format(
+                    file=cache_file, err=e))
+
+    stations = read_station_table(file)
+
+    if 'sha1' not in signature:
+        signature = file_signature(file, digest=True)
+
+    try:
+        tmpFile = '{file}.{pid:d}.tmp'.format(file=cache_file,
+                                              pid=os.getpid())
+        with open(tmpFile, 'wb') as fh:
+            np.save(fh, stations)
+        os.replace(tmpFile, cache_file)
+        write_signature(signature_file, signature)
+    except OSError as e:
+        logger.debug('Failed to save the cache of station list: {err}'.
+                     format(err=e))
+
+    return stations
+
+
+class StationIndex(object):
+    """
+    Index of the radiosonde stations for lookups by ID and by location.
+
+    Stations are looked up by ID with a dict. For spatial queries the
+    stations are sorted by latitude, so that the candidates within a
+    radius are selected with a binary search before computing the
+    vectorized haversine distance.
+
+    Example
+    -------
+    >>> index = StationIndex(rs.station_list)
+    >>> index.lookup(57494)['station_name']
+    'WUHAN'
+    >>> index.within_radius(30.5, 114.4, 300)   # stations around Wuhan
+    """
+
+    def __init__(self, station_list):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        station_list: ndarray or list
+            structured array returned by `load_station_table`, or list of
+            dicts. Every item has the keys 'ID', 'lat', 'lon', 'elevation'
+            and 'station_name'.
+        """
+
+        self.station_list = station_list
+
+        if isinstance(station_list, np.ndarray):
+            ids = station_list['ID']
+            lats = np.asarray(station_list['lat'], dtype=np.float64)
+            lons = np.asarray(station_list['lon'], dtype=np.float64)
+        else:
+            ids = np.array([item['ID'] for item in station_list],
+                           dtype=np.int64)
+            lats = np.array([item['lat'] for item in station_list],
+                            dtype=np.float64)
+            lons = np.array([item['lon'] for item in station_list],
+                            dtype=np.float64)
+
+        self._ids = ids
+        self._positions = None
+
+        # positions sorted by latitude for the spatial queries
+        self._order = np.argsort(lats, kind='stable')
+        self._sortedLats = lats[self._order]
+        self._lats = lats
+        self._lons = lons
+
+    def __len__(self):
+
+        return len(self.station_list)
+
+    def __contains__(self, ID):
+
+        return ID in self.positions
+
+    @property
+    def positions(self):
+        """
+        position of every station ID, built at the first lookup.
+        """
+
+        if self._positions is None:
+            # the first station wins for duplicated IDs
+            positions = {}
+            for position, ID in enumerate(self._ids.tolist()):
+                positions.setdefault(ID, position)
+            self._positions = positions
+
+        return self._positions
+
+    def station(self, position):
+        """
+        station information at the position of the station list.
+
+        The records of the structured arrays are converted to dicts of
+        python scalars, so that the station number can be passed to the
+        downloaders as an integer.
+        """
+
+        station = self.station_list[position]
+        if isinstance(station, np.void):
+            station = {name: station[name].item()
+                       for name in station.dtype.names}
+
+        return station
+
+    def lookup(self, ID):
+        """
+        search the station by ID.
+
+        Returns
+        -------
+        station: dict
+            station information. None if the station doesn't exist.
+        """
+
+        position = self.positions.get(ID)
+        if position is None:
+            return None
+
+        return self.station(position)
+
+    def nearest(self, lat, lon, n=1):
+        """
+        search the `n` stations nearest to the location.
+
+        Returns
+        -------
+        stations: list
+            (station, distance) sorted by the distance. [km]
+        """
+
+        if n <= 0 or len(self) == 0:
+            return []
+
+        distance = haversine(lat, lon, self._lats, self._lons)
+        n = min(n, distance.size)
+        positions = np.argpartition(distance, n - 1)[:n]
+        positions = positions[np.argsort(distance[positions], kind='stable')]
+
+        return [(self.station(position), float(distance[position]))
+                for position in positions]
+
+    def within_radius(self, lat, lon, radius):
+        """
+        search the stations within the radius of the location.
+
+        Parameters
+        ----------
+        lat: float
+            latitude of the location. [degree]
+        lon: float
+            longitude of the location. [degree]
+        radius: float
+            search radius. [km]
+
+        Returns
+        -------
+        stations: list
+            (station, distance) sorted by the distance. [km]
+        """
+
+        # latitude band which contains all the candidates
+        dLat = np.degrees(radius / EARTH_RADIUS)
+        iStart = np.searchsorted(self._sortedLats, lat - dLat, side='left')
+        iStop = np.searchsorted(self._sortedLats, lat + dLat, side='right')
+        candidates = self._order[iStart:iStop]
+
+        distance = haversine(lat, lon,
+                             self._lats[candidates], self._lons[candidates])
+        isWithin = distance <= radius
+        candidates = candidates[isWithin]
+        distance = distance[isWithin]
+        sortIndx = np.lexsort((candidates, distance))
+
+        return [(self.station(candidates[i]), float(distance[i]))
+                for i in sortIndx]
@@ -0,0 +1,519 @@
+import os
+import abc
+import json
+import shutil
+import hashlib
+import posixpath
+import threading
+import importlib
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from configs import load_download_config
+from logger_init import radiosonde_logger
+
+# storage sinks: name -> (module, class). The modules of the sinks are
+# imported when the sink is created, like the output backends.
+STORAGE_SINKS = {
+    'local': ('storage_sinks', 'LocalSink'),
+    'bypy': ('storage_sinks', 'ByPySink'),
+    'generic': ('storage_sinks', 'GenericSink'),
+}
+
+# size and md5 of a file
+FileDigest = collections.namedtuple('FileDigest', ['size', 'md5'])
+
+# outcome of an upload: 'uploaded', 'skipped' or 'failed'
+UploadResult = collections.namedtuple(
+    'UploadResult', ['local_path', 'remote_path', 'status', 'error']
+)
+
+
+def file_digest(file, chunk_size=None):
+    """
+    size and md5 of the file, read in chunks.
+    """
+
+    if chunk_size is None:
+        chunk_size = load_download_config()['storage']['chunk_size']
+
+    md5 = hashlib.md5()
+    with open(file, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            md5.update(chunk)
+
+    return FileDigest(os.path.getsize(file), md5.hexdigest())
+
+
+class StorageSink(abc.ABC):
+    """
+    Interface of the storage sinks which archive the downloaded files.
+
+    `put` uploads a local file unless the remote copy is identical. The
+    digest of the remote copy comes from `remote_digest`, which by default
+    looks up a ledger of the files uploaded by this sink. The ledger is
+    saved as json outside the data directories (see `LEDGER_DIR` of the
+    [storage] section). The messages of the sink and of its `Uploader` go
+    to the logger passed by the downloader which uses it.
+    """
+
+    def __init__(self, root='', *args, chunk_size=None, ledger_file=None,
+                 logger=None):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        root: str
+            remote directory which the remote paths are relative to.
+
+        Keywords
+        --------
+        chunk_size: integer
+            size of the chunks of the transfer and the hashing. [byte]
+        ledger_file: str
+            json file of the uploaded files (default: a file in
+            `LEDGER_DIR` named after the sink and the root).
+        logger: `logging.Logger`
+            logger of the downloader which uses the sink (default: the
+            radiosonde logger).
+        """
+
+        config = load_download_config()['storage']
+        if chunk_size is None:
+            chunk_size = config['chunk_size']
+        if ledger_file is None:
+            rootHash = hashlib.sha1(
+                '{sink}:{root}'.format(sink=type(self).__name__,
+                                       root=root).encode('utf-8')
+            ).hexdigest()
+            ledger_file = os.path.join(
+                os.path.expanduser(config['LEDGER_DIR']),
+                'ledger_{hash}.json'.format(hash=rootHash[:16]))
+
+        if logger is None:
+            logger = radiosonde_logger()
+
+        self.root = root
+        self.chunk_size = chunk_size
+        self.logger = logger
+        self.ledger_file = ledger_file
+        self._ledger = None
+        self._lock = threading.Lock()
+
+    def remote_path(self, remote):
+
+        return posixpath.join(self.root, remote)
+
+    def _load_ledger(self):
+
+        if self._ledger is None:
+            self._ledger = {}
+            if os.path.isfile(self.ledger_file):
+                try:
+                    with open(self.ledger_file, 'r', encoding='utf-8') as fh:
+                        self._ledger = json.load(fh)
+                except (OSError, ValueError) as e:
+                    self.logger.warning(
+                        'Failed to load the ledger {file}: {err}'.format(
+                            file=self.ledger_file, err=e))
+
+        return self._ledger
+
+    def record(self, remote, digest):
+        """
+        record the digest of an uploaded file in the ledger.
+        """
+
+        with self._lock:
+            ledger = self._load_ledger()
+            ledger[self.remote_path(remote)] = list(digest)
+
+            ledgerDir = os.path.dirname(self.ledger_file)
+            try:
+                if ledgerDir and (not os.path.exists(ledgerDir)):
+                    os.makedirs(ledgerDir, exist_ok=True)
+                tmpFile = '{file}.{pid:d}.tmp'.format(file=self.ledger_file,
+                                                      pid=os.getpid())
+                with open(tmpFile, 'w', encoding='utf-8') as fh:
+                    json.dump(ledger, fh)
+                os.replace(tmpFile, self.ledger_file)
+            except OSError as e:
+                self.logger.warning(
+                    'Failed to save the ledger {file}: {err}'.format(
+                        file=self.ledger_file, err=e))
+
+    def remote_digest(self, remote):
+        """
+        digest of the remote file. None if it's unknown.
+        """
+
+        with self._lock:
+            digest = self._load_ledger().get(self.remote_path(remote))
+
+        return None if digest is None else FileDigest(*digest)
+
+    @abc.abstractmethod
+    def upload(self, local_path, remote):
+        """
+        transfer the local file to the remote path.
+        """
+
+    def put(self, local_path, remote):
+        """
+        upload the file unless the remote copy has the same size and md5.
+
+        Returns
+        -------
+        uploaded: boolean
+            False if the upload was skipped.
+        """
+
+        remoteDigest = self.remote_digest(remote)
+
+        # the size is compared first, so that the hash is only computed for
+        # the candidates of identical files
+        if (remoteDigest is not None) and \
+           (remoteDigest.size == os.path.getsize(local_path)):
+            digest = file_digest(local_path, self.chunk_size)
+            if digest == remoteDigest:
+                self.logger.debug(
+                    '{file} is identical. Skip the upload.'.format(
+                        file=self.remote_path(remote)))
+                return False
+        else:
+            digest = None
+
+        self.upload(local_path, remote)
+
+        if digest is None:
+            digest = file_digest(local_path, self.chunk_size)
+        self.record(remote, digest)
+
+        return True
+
+    def close(self):
+
+        pass
+
+
+class LocalSink(StorageSink):
+    """
+    Archive on the local filesystem, e.g. a mounted NAS.
+
+    The files are copied in chunks to a temporary file which is renamed
+    when the copy is complete, and the remote digest is computed from the
+    archived file itself instead of the ledger.
+    """
+
+    def remote_path(self, remote):
+
+        return os.path.join(self.root, remote)
+
+    def remote_digest(self, remote):
+
+        remoteFile = self.remote_path(remote)
+        if not os.path.isfile(remoteFile):
+            return None
+
+        return file_digest(remoteFile, self.chunk_size)
+
+    def record(self, remote, digest):
+
+        pass
+
+    def upload(self, local_path, remote):
+
+        remoteFile = self.remote_path(remote)
+        remoteDir = os.path.dirname(remoteFile)
+        if remoteDir and (not os.path.exists(remoteDir)):
+            os.makedirs(remoteDir, exist_ok=True)
+
+        partFile = remoteFile + '.part'
+        with open(local_path, 'rb') as fIn, open(partFile, 'wb') as fOut:
+            shutil.copyfileobj(fIn, fOut, self.chunk_size)
+        os.replace(partFile, remoteFile)
+
+
+class ByPySink(StorageSink):
+    """
+    Archive on Baidu Yun through `bypy`.
+
+    bypy uploads the files in slices of `chunk_size` and skips the content
+    which already exists on the server (rapid upload). Baidu Yun doesn't
+    expose a reliable md5 of the remote files, so identical files are
+    detected with the ledger of the uploads.
+
+    A `ByPy` client keeps the state of the upload in progress, so every
+    upload thread gets its own client.
+    """
+
+    def __init__(self, root=None, *args, chunk_size=None, ledger_file=None,
+                 logger=None):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        root: str
+            remote directory under the app directory of Baidu Yun (default:
+            `BDY_DIR` of the [storage] section).
+        """
+
+        if root is None:
+            root = load_download_config()['storage']['BDY_DIR']
+
+        super(ByPySink, self).__init__(root, chunk_size=chunk_size,
+                                       ledger_file=ledger_file,
+                                       logger=logger)
+
+        from bypy import ByPy
+
+        self._clientClass = ByPy
+        self._local = threading.local()
+
+    @property
+    def client(self):
+        """
+        `ByPy` client of the current thread.
+        """
+
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._clientClass(slice_size=self.chunk_size)
+            self._local.client = client
+
+        return client
+
+    def upload(self, local_path, remote):
+
+        res = self.client.upload(local_path, self.remote_path(remote),
+                                 ondup='overwrite')
+        if res != 0:
+            raise IOError('bypy failed to upload {file} (error {code})'.
+                          format(file=local_path, code=res))
+
+
+class GenericSink(StorageSink):
+    """
+    Archive through user-provided functions, e.g. an S3 or FTP client.
+
+    Example
+    -------
+    >>> sink = GenericSink(lambda local, remote: s3.upload_file(
+    ...     local, 'bucket', remote), root='radiosonde')
+    """
+
+    def __init__(self, upload_func, root='', *args, digest_func=None,
+                 chunk_size=None, ledger_file=None, logger=None):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        upload_func: callable
+            `upload_func(local_path, remote_path)` transferring the file.
+        root: str
+            remote directory which the remote paths are relative to.
+
+        Keywords
+        --------
+        digest_func: callable
+            `digest_func(remote_path)` returning the (size, md5) of the
+            remote file or None. The ledger of the uploads is used if it's
+            not given.
+        """
+
+        super(GenericSink, self).__init__(root, chunk_size=chunk_size,
+                                          ledger_file=ledger_file,
+                                          logger=logger)
+        self.upload_func = upload_func
+        self.digest_func = digest_func
+
+    def remote_digest(self, remote):
+
+        if self.digest_func is None:
+            return super(GenericSink, self).remote_digest(remote)
+
+        digest = self.digest_func(self.remote_path(remote))
+
+        return None if digest is None else FileDigest(*digest)
+
+    def upload(self, local_path, remote):
+
+        self.upload_func(local_path, self.remote_path(remote))
+
+
+def get_sink(name, *args, **kwargs):
+    """
+    create the storage sink by its name.
+
+    Parameters
+    ----------
+    name: str
+        one of `STORAGE_SINKS`.
+    args, kwargs:
+        arguments passed to the sink.
+    """
+
+    if name not in STORAGE_SINKS:
+        raise ValueError('Unknown storage sink: {name}. Choose from {opts}'.
+                         format(name=name, opts=list(STORAGE_SINKS)))
+
+    moduleName, className = STORAGE_SINKS[name]
+    sinkClass = getattr(importlib.import_module(moduleName), className)
+
+    return sinkClass(*args, **kwargs)
+
+
+class Uploader(object):
+    """
+    Upload the downloaded files in the background.
+
+    Files are submitted as soon as they are finished, so that the uploads
+    overlap with the remaining downloads instead of running after them.
+
+    Example
+    -------
+    >>> with Uploader(get_sink('bypy')) as uploader:
+    ...     for file in download_files():
+    ...         uploader.submit(file, os.path.basename(file))
+    >>> uploader.summary()
+    """
+
+    def __init__(self, sink, *args, max_workers=None):
+        """
+        initialize the instance.
+
+        Parameters
+        ----------
+        sink: `StorageSink`
+            destination of the files.
+
+        Keywords
+        --------
+        max_workers: integer
+            number of concurrent uploads (default: `max_workers` of the
+            [storage] section).
+        """
+
+        if max_workers is None:
+            max_workers = load_download_config()['storage']['max_workers']
+        if max_workers < 1:
+            raise ValueError('Number of workers must be positive.')
+
+        self.sink = sink
+        self.max_workers = max_workers
+        self.results = []
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _put(self, local_path, remote):
+
+        try:
+            uploaded = self.sink.put(local_path, remote)
+        except Exception as e:
+            self.sink.logger.error('Failed to upload {file}: {err}'.format(
+                file=local_path, err=e))
+            return UploadResult(local_path, remote, 'failed', e)
+
+        return UploadResult(local_path, remote,
+                            'uploaded' if uploaded else 'skipped', None)
+
+    def submit(self, local_path, remote=None):
+        """
+        queue the upload of the file.
+
+        Parameters
+        ----------
+        local_path: str
+            path of the local file.
+        remote: str
+            path relative to the root of the sink (default: the file name).
+
+        Returns
+        -------
+        future: `concurrent.futures.Future`
+            future of the `UploadResult`.
+        """
+
+        if remote is None:
+            remote = os.path.basename(local_path)
+
+        future = self._executor.submit(self._put, local_path, remote)
+        self._futures.append(future)
+
+        return future
+
+    def submit_files(self, local_files, local_dir, remote_dir=''):
+        """
+        queue the uploads of the files under the directory, keeping their
+        paths relative to the directory.
+
+        Returns
+        -------
+        futures: list
+            future of the `UploadResult` of every file.
+        """
+
+        futures = []
+        for localFile in local_files:
+            relPath = os.path.relpath(localFile, local_dir)
+            futures.append(self.submit(
+                localFile, posixpath.join(remote_dir, *relPath.split(os.sep))))
+
+        return futures
+
+    def submit_tree(self, local_dir, remote_dir=''):
+        """
+        queue the uploads of all the files under the directory, keeping the
+        relative paths.
+        """
+
+        localFiles = []
+        for dirpath, _, filenames in os.walk(local_dir):
+            for filename in sorted(filenames):
+                localFiles.append(os.path.join(dirpath, filename))
+
+        return self.submit_files(localFiles, local_dir, remote_dir)
+
+    def wait(self):
+        """
+        wait for the queued uploads.
+
+        Returns
+        -------
+        results: list
+            `UploadResult` of every upload, in the order of submission.
+        """
+
+        futures = self._futures
+        self._futures = []
+        self.results.extend(future.result() for future in futures)
+
+        return self.results
+
+    def close(self):
+
+        self.wait()
+        self._executor.shutdown()
+        self.sink.close()
+
+    def summary(self):
+        """
+        number of the uploaded, skipped and failed files.
+        """
+
+        counts = collections.Counter(result.status for result in self.results)
+        text = '{uploaded:d} uploaded, {skipped:d} skipped, {failed:d} failed'
+
+        return text.format(uploaded=counts['uploaded'],
+                           skipped=counts['skipped'],
+                           failed=counts['failed'])
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
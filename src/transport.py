@@ -0,0 +1,144 @@
+import time
+import random
+import threading
+from configs import download_defaults
+from metrics import get_metrics
+from logger_init import radiosonde_logger
+
+logger = radiosonde_logger()
+
+# shared transport of the process, created by `get_transport`
+_sharedTransport = None
+_sharedTransportLock = threading.Lock()
+
+
+class HTTPTransport(object):
+    """
+    Pooled HTTP transport with keep-alive and retry/backoff.
+
+    All the requests go through one `requests.Session`, so the TCP/TLS
+    connections are reused. Timeouts, connection errors and 5xx responses
+    are retried with exponential backoff and full jitter.
+    """
+
+    def __init__(self, *args, pool_size=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_factor=None,
+                 backoff_max=None, metrics=None):
+        """
+        initialize the instance. The default values are taken from the
+        [transport] section of `download_config.toml`.
+
+        Keywords
+        --------
+        pool_size: integer
+            maximum number of connections kept alive for every host.
+        connect_timeout: float
+            timeout for establishing the connection. [s]
+        read_timeout: float
+            timeout for waiting the response. [s]
+        max_retries: integer
+            number of retries after the first attempt.
+        backoff_factor: float
+            upper limit of the delay before the first retry. [s]
+        backoff_max: float
+            upper limit of the delay between retries. [s]
+        metrics: `MetricsRegistry`
+            registry counting the retries (default: the registry shared by
+            the process).
+        """
+
+        default = download_defaults('transport')
+
+        self.pool_size = default(pool_size, 'pool_size')
+        self.timeout = (default(connect_timeout, 'connect_timeout'),
+                        default(read_timeout, 'read_timeout'))
+        self.max_retries = default(max_retries, 'max_retries')
+        self.backoff_factor = default(backoff_factor, 'backoff_factor')
+        self.backoff_max = default(backoff_max, 'backoff_max')
+        if metrics is None:
+            metrics = get_metrics()
+        self.metrics = metrics
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size,
+                              max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def backoff(self, attempt):
+        """
+        delay before the given retry. (full jitter)
+        """
+
+        cap = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+
+        return random.uniform(0, cap)
+
+    def get(self, url, **kwargs):
+        """
+        send a GET request with retries.
+
+        Parameters
+        ----------
+        url: str
+            url of the request.
+        kwargs: dict
+            keywords passed to `requests.Session.get`.
+
+        Returns
+        -------
+        res: `requests.Response`
+            response of the last attempt.
+        """
+
+        import requests
+
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            isLastAttempt = (attempt == self.max_retries)
+
+            try:
+                res = self.session.get(url, **kwargs)
+            except (requests.exceptions.Timeout,
+                    requests.exceptions.ConnectionError) as e:
+                if isLastAttempt:
+                    raise e
+                reason = repr(e)
+            else:
+                if res.status_code < 500:
+                    return res
+                if isLastAttempt:
+                    res.raise_for_status()
+                reason = 'HTTP {code:d}'.format(code=res.status_code)
+
+            delay = self.backoff(attempt)
+            self.metrics.increment('radiosonde_http_retries_total')
+            logger.warning('Retry {url} in {delay:.1f} s ({reason})'.format(
+                url=url, delay=delay, reason=reason))
+            time.sleep(delay)
+
+    def close(self):
+        """
+        close the pooled connections.
+        """
+
+        self.session.close()
+
+
+def get_transport():
+    """
+    get the transport shared by all the downloaders of the process.
+    """
+
+    global _sharedTransport
+
+    with _sharedTransportLock:
+        if _sharedTransport is None:
+            _sharedTransport = HTTPTransport()
+
+    return _sharedTransport
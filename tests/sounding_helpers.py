@@ -0,0 +1,71 @@
+"""
+Offline fixtures shared by the radiosonde tests.
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+from radiosonde_downloader import RSDownloader
+
+SOUNDING_BLOCK = """<PRE>
+-----------------------------------------------------------------------------
+   PRES   HGHT   TEMP   DWPT   RELH   MIXR   DRCT   SKNT   THTA   THTE   THTV
+    hPa     m      C      C      %    g/kg    deg   knot     K      K      K 
+-----------------------------------------------------------------------------
+  925.0    763   12.4    5.4     62   6.17    335      9  292.0  310.0  293.1
+</PRE><H3>Station information and sounding indices</H3><PRE>
+                             Station number: {station:d}
+                           Observation time: {time}
+</PRE>
+"""
+
+
+class OfflineRSDownloader(RSDownloader):
+    """
+    downloader which serves 00Z and 12Z soundings without network.
+
+    The soundings of the last day are served as well, so that the trimming
+    to the requested range is tested.
+    """
+
+    def fetch_html(self, start_time, end_time, siteNum=57494, *args,
+                   scheduler=None):
+
+        if siteNum == 99999:
+            raise ConnectionError('station is not reachable')
+
+        blocks = []
+        thisTime = datetime(start_time.year, start_time.month, start_time.day)
+        while thisTime <= end_time:
+            blocks.append(SOUNDING_BLOCK.format(
+                station=siteNum, time=thisTime.strftime('%y%m%d/%H%M')))
+            thisTime = thisTime + timedelta(hours=12)
+
+        return '<HTML><BODY>' + ''.join(blocks) + '</BODY></HTML>'
+
+
+def make_sounding(launch_time, nLevels):
+    """
+    build a sounding in the format of `RSDownloader.getData`.
+    """
+
+    levels = np.arange(nLevels, dtype=np.float64)
+    rsData = {key: levels + 1 for key in [
+        'pressure', 'altitude', 'temperature', 'dewpoint',
+        'relative_humidity', 'water_vapor_mixing_ratio', 'wind_direction',
+        'wind_speed', 'theta_a', 'theta_e', 'theta_v']}
+    rsData['temperature'][0] = np.nan
+    rsData.update({'temperature_LCL': 280.0, 'pressure_LCL': 900.0,
+                   'precipitable_water': 20.0, 'launch_time': launch_time})
+    rsDims = {'altitude': nLevels, 'nv': 1}
+    rsGAttrs = {'station_name': 'WUHAN', 'station_number': 57494,
+                'station_latitude': 30.6, 'station_longitude': 114.05,
+                'station_elevation': 23.0}
+
+    return rsData, rsDims, rsGAttrs
@@ -0,0 +1,193 @@
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+from ECMWF_downloader import ECMWFPlanner, get_ECMWF_file, month_windows
+from ECMWF_downloader import is_valid_grib
+from storage_sinks import LocalSink, Uploader
+
+
+class FakeECMWFServer(object):
+    """
+    stand-in of `ECMWFDataServer` writing a small GRIB-like file with the
+    payload for every retrieval.
+    """
+
+    def __init__(self, delay=0.02, fail_types=()):
+
+        self.delay = delay
+        self.fail_types = fail_types
+        self.payloads = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def retrieve(self, payload):
+
+        with self._lock:
+            self.payloads.append(payload)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        try:
+            time.sleep(self.delay)
+            if payload['type'] in self.fail_types:
+                raise RuntimeError('MARS request failed')
+
+            with open(payload['target'], 'wb') as fh:
+                fh.write(b'GRIB' + payload['date'].encode('utf-8') +
+                         payload['type'].encode('utf-8') + b'7777')
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.outputDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outputDir, ignore_errors=True)
+
+    def test_month_windows(self):
+        print('---> Test on month_windows')
+
+        self.assertEqual(
+            list(month_windows(datetime(2019, 11, 15), datetime(2020, 1, 5))),
+            [(datetime(2019, 11, 15), datetime(2019, 11, 30)),
+             (datetime(2019, 12, 1), datetime(2019, 12, 31)),
+             (datetime(2020, 1, 1), datetime(2020, 1, 5))])
+
+    def test_plan(self):
+        print('---> Test on ECMWFPlanner.plan')
+
+        planner = ECMWFPlanner(FakeECMWFServer(), output_dir=self.outputDir,
+                               max_workers=2)
+        requests = planner.plan([datetime(2019, 10, 15),
+                                 datetime(2019, 12, 10)])
+
+        self.assertEqual(len(requests), 6)
+        self.assertEqual(len(set(request.target for request in requests)), 6)
+        self.assertEqual([request.type for request in requests],
+                         ['an'] * 3 + ['fc'] * 3)
+        self.assertEqual(requests[0].payload['date'],
+                         '2019-10-15/to/2019-10-31')
+        self.assertEqual(requests[2].payload['date'],
+                         '2019-12-01/to/2019-12-10')
+        self.assertEqual(
+            os.path.basename(requests[3].target),
+            'cams_nrealtime_fc_201910.grib')
+        self.assertRaises(ValueError, planner.plan,
+                          [datetime(2019, 12, 1), datetime(2019, 1, 1)])
+
+    def test_retrieve(self):
+        print('---> Test on ECMWFPlanner.retrieve')
+
+        server = FakeECMWFServer()
+        planner = ECMWFPlanner(server, output_dir=self.outputDir,
+                               max_workers=2)
+        requests = planner.plan([datetime(2019, 1, 1), datetime(2019, 4, 30)])
+
+        targets, errors = planner.retrieve(requests)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(targets, [request.target for request in requests])
+        self.assertEqual(len(server.payloads), 8)
+        self.assertLessEqual(server.max_active, 2)
+        self.assertTrue(all(is_valid_grib(target) for target in targets))
+        self.assertFalse(any(file.endswith('.part')
+                             for file in os.listdir(self.outputDir)))
+
+        # complete targets are skipped and a truncated one is retrieved again
+        with open(requests[1].target, 'wb') as fh:
+            fh.write(b'GRIB')
+        server.payloads = []
+        targets, errors = planner.retrieve(requests)
+
+        self.assertEqual(len(targets), 8)
+        self.assertEqual([payload['date'] for payload in server.payloads],
+                         [requests[1].payload['date']])
+
+    def test_retrieve_error(self):
+        print('---> Test on ECMWFPlanner.retrieve with failed requests')
+
+        planner = ECMWFPlanner(FakeECMWFServer(fail_types=('fc',)),
+                               output_dir=self.outputDir, max_workers=3)
+        requests = planner.plan([datetime(2019, 1, 1), datetime(2019, 2, 28)])
+
+        targets, errors = planner.retrieve(requests)
+
+        self.assertEqual(len(targets), 2)
+        self.assertEqual([request.type for request, _ in errors],
+                         ['fc', 'fc'])
+        self.assertFalse(any(planner.is_complete(request)
+                             for request, _ in errors))
+
+    def test_get_ECMWF_file(self):
+        print('---> Test on get_ECMWF_file')
+
+        filepath = os.path.join(self.outputDir, 'cams_201910.grib')
+        server = FakeECMWFServer()
+
+        result = get_ECMWF_file([datetime(2019, 10, 1),
+                                 datetime(2019, 11, 30)],
+                                filepath=filepath, server=server)
+
+        self.assertEqual(result, filepath)
+        with open(filepath, 'rb') as fh:
+            content = fh.read()
+
+        # both types are kept in the merged file
+        self.assertEqual(content.count(b'GRIB'), 4)
+        self.assertLess(content.index(b'2019-10-01/to/2019-10-31an'),
+                        content.index(b'2019-10-01/to/2019-10-31fc'))
+
+        with open(os.path.join(
+                self.outputDir,
+                'cams_nrealtime_an_201910.grib.done'), 'r') as fh:
+            self.assertEqual(json.load(fh)['payload']['type'], 'an')
+
+        # either the monthly files or the merged file are archived
+        archiveDir = os.path.join(self.outputDir, 'archive')
+        with Uploader(LocalSink(archiveDir)) as uploader:
+            get_ECMWF_file([datetime(2019, 10, 1), datetime(2019, 11, 30)],
+                           filepath=filepath, server=server,
+                           uploader=uploader, upload='monthly')
+        self.assertEqual(sorted(os.listdir(archiveDir)),
+                         ['cams_nrealtime_an_201910.grib',
+                          'cams_nrealtime_an_201911.grib',
+                          'cams_nrealtime_fc_201910.grib',
+                          'cams_nrealtime_fc_201911.grib'])
+        self.assertEqual(uploader.summary(),
+                         '4 uploaded, 0 skipped, 0 failed')
+
+        mergedDir = os.path.join(self.outputDir, 'archive_merged')
+        with Uploader(LocalSink(mergedDir)) as uploader:
+            get_ECMWF_file([datetime(2019, 10, 1), datetime(2019, 11, 30)],
+                           filepath=filepath, server=server,
+                           uploader=uploader, upload='merged')
+        self.assertEqual(os.listdir(mergedDir), ['cams_201910.grib'])
+
+        self.assertRaises(ValueError, get_ECMWF_file,
+                          [datetime(2019, 10, 1), datetime(2019, 11, 30)],
+                          filepath=filepath, server=server, upload='all')
+
+        self.assertIsNone(get_ECMWF_file(
+            [datetime(2019, 12, 1), datetime(2019, 12, 31)],
+            filepath=filepath, server=FakeECMWFServer(fail_types=('an',))))
+
+
+if __name__ == '__main__':
+    unittest.main()
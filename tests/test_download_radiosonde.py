@@ -0,0 +1,114 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+testPath = os.path.join(projectDir, 'tests')
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(testPath)
+
+from download_radiosonde import main
+from radiosonde_database import RadiosondeDB
+from sounding_helpers import OfflineRSDownloader
+
+try:
+    import pyarrow   # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.outputDir = os.path.join(self.tmpDir, 'data')
+        os.makedirs(self.outputDir)
+
+        # the catalog and the archive index are kept under the home folder
+        self.home = os.environ.get('HOME')
+        os.environ['HOME'] = self.tmpDir
+
+    def tearDown(self):
+        if self.home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = self.home
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    @unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet_catalog(self):
+        print('---> Test on download_radiosonde with parquet and catalog')
+
+        status = main(['--start', '20190101', '--stop', '20190106',
+                       '--output_dir', self.outputDir,
+                       '--output_mode', 'parquet', '--catalog', 'local'],
+                      downloader=OfflineRSDownloader())
+        self.assertEqual(status, 0)
+
+        from radiosonde_backends import read_parquet_soundings
+
+        # every sounding is catalogued, including the rows buffered until
+        # the backend was closed
+        partition = os.path.join(self.outputDir, 'station=57494',
+                                 'year=2019')
+        with RadiosondeDB('local') as db:
+            soundings = db.search_soundings(57494)
+        self.assertEqual(len(soundings), 10)
+        self.assertEqual(soundings[0]['launch_time'], datetime(2019, 1, 1))
+        self.assertTrue(all(item['file_path'] == partition
+                            for item in soundings))
+        self.assertEqual(
+            read_parquet_soundings(self.outputDir).num_rows,
+            sum(item['n_levels'] for item in soundings))
+
+    def test_resume(self):
+        print('---> Test on download_radiosonde with --resume')
+
+        argv = ['--start', '20190101', '--stop', '20190103',
+                '--output_dir', self.outputDir, '--resume']
+        self.assertEqual(main(argv, downloader=OfflineRSDownloader()), 0)
+        files = sorted(os.listdir(self.outputDir))
+        self.assertEqual(len(files), 4)
+
+        # the archived soundings are not written again
+        mtimes = [os.path.getmtime(os.path.join(self.outputDir, file))
+                  for file in files]
+        self.assertEqual(main(argv, downloader=OfflineRSDownloader()), 0)
+        self.assertEqual(
+            [os.path.getmtime(os.path.join(self.outputDir, file))
+             for file in files], mtimes)
+
+        # the other output modes can't be resumed
+        for mode in ['aggregated', 'parquet']:
+            with self.assertRaises(SystemExit):
+                main(argv + ['--output_mode', mode],
+                     downloader=OfflineRSDownloader())
+
+    def test_upload_written_files(self):
+        print('---> Test on download_radiosonde with --upload')
+
+        # files of the previous runs are not hashed and uploaded again
+        with open(os.path.join(self.outputDir, 'old.nc'), 'wb') as fh:
+            fh.write(b'archived')
+
+        archiveDir = os.path.join(self.tmpDir, 'archive')
+        status = main(['--start', '20190101', '--stop', '20190103',
+                       '--output_dir', self.outputDir,
+                       '--output_mode', 'aggregated',
+                       '--upload', 'local', '--upload_dir', archiveDir],
+                      downloader=OfflineRSDownloader())
+        self.assertEqual(status, 0)
+
+        written = sorted(set(os.listdir(self.outputDir)) - {'old.nc'})
+        self.assertEqual(len(written), 1)
+        self.assertEqual(sorted(os.listdir(archiveDir)), written)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import sys
+import os
+import time
+import struct
+import shutil
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+from grib_index import GribReader, GribMessage, build_index, index_file
+from grib_index import load_index, scan_grib
+
+
+def grib1_message(param, date, hour, step=0, level_type=1, level=0,
+                  table=128, data=b'\x00' * 64):
+    """
+    GRIB1 message with a product definition section and a dummy data
+    section.
+    """
+
+    year, month, day = date // 10000, date // 100 % 100, date % 100
+    pds = struct.pack(
+        '>3sBBBBBBB2sBBBBBBBBBHBBBH',
+        (28).to_bytes(3, 'big'), table, 98, 0, 255, 0, param, level_type,
+        level.to_bytes(2, 'big'), year % 100, month, day, hour, 0, 1, step,
+        0, 0, 0, 0, year // 100 + 1, 0, 0)
+    bds = (11 + len(data)).to_bytes(3, 'big') + b'\x00' * 8 + data
+    length = 8 + len(pds) + len(bds) + 4
+
+    return b'GRIB' + length.to_bytes(3, 'big') + b'\x01' + pds + bds + \
+        b'7777'
+
+
+def grib2_message(discipline, category, number, date, hour, step=0,
+                  level_type=103, level=2, data=b'\x00' * 64):
+    """
+    GRIB2 message with identification, grid and product definition
+    sections and a dummy data section.
+    """
+
+    year, month, day = date // 10000, date // 100 % 100, date % 100
+    ids = struct.pack('>IBHHBBBHBBBBBBB', 21, 1, 98, 0, 4, 0, 1, year,
+                      month, day, hour, 0, 0, 0, 1)
+    gds = struct.pack('>IB', 10, 3) + b'\x00' * 5
+    pds = struct.pack('>IBHHBBBBBHBBIBBIBBI', 34, 4, 0, 0, category, number,
+                      2, 0, 153, 0, 0, 1, step, level_type, 0, level, 255,
+                      0, 0)
+    drs = struct.pack('>IB', 5 + len(data), 7) + data
+    body = ids + gds + pds + drs
+    length = 16 + len(body) + 4
+
+    return b'GRIB\x00\x00' + bytes([discipline, 2]) + \
+        length.to_bytes(8, 'big') + body + b'7777'
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.outputDir = tempfile.mkdtemp()
+        self.gribFile = os.path.join(self.outputDir, 'cams.grib')
+        self.contents = [
+            grib1_message(167, 20191001, 0),
+            grib1_message(137, 20191001, 0),
+            grib1_message(167, 20191001, 12, step=3),
+            grib1_message(250, 20191002, 0, table=210, data=b'\x01' * 100),
+            grib2_message(0, 0, 0, 20191002, 12, step=6),
+        ]
+        with open(self.gribFile, 'wb') as fh:
+            fh.write(b''.join(self.contents))
+
+    def tearDown(self):
+        shutil.rmtree(self.outputDir, ignore_errors=True)
+
+    def test_scan_grib(self):
+        print('---> Test on scan_grib')
+
+        messages = scan_grib(self.gribFile)
+
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(messages[0], GribMessage(
+            0, len(self.contents[0]), 1, '167.128', 1, 0, 20191001, 0, 0))
+        self.assertEqual(messages[2].time, 1200)
+        self.assertEqual(messages[2].step, 3)
+        self.assertEqual(messages[3].param, '250.210')
+        self.assertEqual(messages[3].offset,
+                         sum(len(content) for content in self.contents[:3]))
+        self.assertEqual(messages[4], GribMessage(
+            messages[3].offset + len(self.contents[3]),
+            len(self.contents[4]), 2, '0.0.0', 103, 2, 20191002, 1200, 6))
+
+        # padding between the messages is skipped
+        with open(self.gribFile, 'wb') as fh:
+            fh.write(self.contents[0] + b'\x00' * 7 + self.contents[1])
+        messages = scan_grib(self.gribFile)
+        self.assertEqual([message.offset for message in messages],
+                         [0, len(self.contents[0]) + 7])
+
+        # truncated messages are errors
+        with open(self.gribFile, 'wb') as fh:
+            fh.write(self.contents[0] + self.contents[1][:-10])
+        self.assertRaises(ValueError, scan_grib, self.gribFile)
+
+    def test_index(self):
+        print('---> Test on build_index and load_index')
+
+        messages = build_index(self.gribFile)
+        self.assertTrue(os.path.isfile(index_file(self.gribFile)))
+        self.assertEqual(load_index(self.gribFile), messages)
+
+        # a modified GRIB file invalidates the index
+        time.sleep(0.01)
+        with open(self.gribFile, 'ab') as fh:
+            fh.write(grib1_message(165, 20191003, 0))
+        self.assertEqual(len(load_index(self.gribFile)), 6)
+
+        # a broken index is rebuilt
+        with open(index_file(self.gribFile), 'w') as fh:
+            fh.write('{')
+        self.assertEqual(len(load_index(self.gribFile)), 6)
+
+    def test_reader(self):
+        print('---> Test on GribReader')
+
+        with GribReader(self.gribFile) as reader:
+            self.assertTrue(os.path.isfile(index_file(self.gribFile)))
+
+            messages = reader.select(param='167.128')
+            self.assertEqual(len(messages), 2)
+            self.assertEqual(reader.read(messages[1]), self.contents[2])
+
+            self.assertEqual(len(reader.select(date=20191001, time=0)), 2)
+            self.assertEqual(len(reader.select(param=['137.128', '0.0.0'])),
+                             2)
+            self.assertEqual(list(reader.iter_messages(edition=2)),
+                             [self.contents[4]])
+            self.assertRaises(ValueError, reader.select, variable='t2m')
+
+            subsetFile = os.path.join(self.outputDir, 't2m.grib')
+            self.assertEqual(reader.extract(subsetFile, param='167.128'), 2)
+
+        with open(subsetFile, 'rb') as fh:
+            self.assertEqual(fh.read(), self.contents[0] + self.contents[2])
+        self.assertEqual(len(scan_grib(subsetFile)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import MetricsRegistry, Histogram
+from sounding_helpers import OfflineRSDownloader
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.outputDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outputDir, ignore_errors=True)
+
+    def test_histogram(self):
+        print('---> Test on Histogram')
+
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in [0.05, 0.1, 0.5, 2.0]:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 2.65)
+        self.assertEqual(histogram.cumulative_counts(), [2, 3, 4])
+
+    def test_hooks(self):
+        print('---> Test on MetricsRegistry hooks')
+
+        metrics = MetricsRegistry()
+        events = []
+        metrics.add_hook(lambda kind, name, value: events.append((kind, name)))
+
+        metrics.increment('radiosonde_http_bytes_total', 100)
+        with metrics.timer('radiosonde_parse_seconds'):
+            pass
+
+        self.assertEqual(events, [
+            ('counter', 'radiosonde_http_bytes_total'),
+            ('histogram', 'radiosonde_parse_seconds')])
+        self.assertEqual(metrics.counter('radiosonde_http_bytes_total'), 100)
+        self.assertEqual(
+            metrics.histogram('radiosonde_parse_seconds').count, 1)
+
+    def test_dump(self):
+        print('---> Test on MetricsRegistry.dump')
+
+        metrics = MetricsRegistry()
+        metrics.increment('radiosonde_cache_hits_total', 3)
+        metrics.observe('radiosonde_http_seconds', 0.2)
+
+        jsonFile = os.path.join(self.outputDir, 'metrics.json')
+        metrics.dump(jsonFile)
+        with open(jsonFile, 'r', encoding='utf-8') as fh:
+            snapshot = json.load(fh)
+        self.assertEqual(
+            snapshot['counters']['radiosonde_cache_hits_total'], 3)
+        self.assertEqual(
+            snapshot['histograms']['radiosonde_http_seconds']['count'], 1)
+
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE radiosonde_http_seconds histogram', text)
+        self.assertIn('radiosonde_cache_hits_total 3\n', text)
+        self.assertIn('radiosonde_http_seconds_bucket{le="0.5"} 1', text)
+        self.assertIn('radiosonde_http_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('radiosonde_http_seconds_count 1', text)
+
+        self.assertRaises(ValueError, metrics.dump, jsonFile, 'xml')
+
+    def test_downloader_metrics(self):
+        print('---> Test on the metrics of RSDownloader')
+
+        metrics = MetricsRegistry()
+        rs = OfflineRSDownloader(metrics=metrics)
+        rsData, rsDims, rsGAttrs = rs.getData(datetime(2019, 1, 1),
+                                              datetime(2019, 1, 3))
+
+        self.assertEqual(
+            metrics.counter('radiosonde_soundings_parsed_total'), 4)
+        self.assertEqual(
+            metrics.counter('radiosonde_levels_parsed_total'), 4)
+        self.assertEqual(
+            metrics.histogram('radiosonde_parse_seconds').count, 1)
+
+        rs.save_many(rsData, rsDims, rsGAttrs, self.outputDir, force=True)
+
+        self.assertEqual(
+            metrics.counter('radiosonde_soundings_written_total'), 4)
+        self.assertEqual(
+            metrics.histogram('radiosonde_write_seconds').count, 4)
+        self.assertEqual(len(metrics.summary()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from radiosonde_aggregate import AggregatedNetCDFWriter
+from sounding_helpers import make_sounding
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.outputDir = tempfile.mkdtemp()
+        try:
+            import netCDF4   # noqa: F401
+        except ImportError:
+            self.skipTest('netCDF4 is not installed')
+
+    def tearDown(self):
+        shutil.rmtree(self.outputDir, ignore_errors=True)
+
+    def test_ragged(self):
+        print('---> Test on AggregatedNetCDFWriter with ragged layout')
+
+        from netCDF4 import Dataset
+
+        with AggregatedNetCDFWriter(self.outputDir, period='month',
+                                    layout='ragged') as writer:
+            rsFile = writer.write(*make_sounding(datetime(2018, 12, 1), 3))
+            writer.write(*make_sounding(datetime(2018, 12, 1, 12), 5))
+            writer.write(*make_sounding(datetime(2019, 1, 1), 2))
+
+        # append to the existing file and skip the duplicated sounding
+        with AggregatedNetCDFWriter(self.outputDir, period='month',
+                                    layout='ragged') as writer:
+            self.assertIsNone(
+                writer.write(*make_sounding(datetime(2018, 12, 1), 3)))
+            writer.write(*make_sounding(datetime(2018, 12, 2), 4))
+
+        self.assertEqual(os.path.basename(rsFile),
+                         'radiosonde_57494_201812.nc')
+        self.assertEqual(len(os.listdir(self.outputDir)), 2)
+
+        with Dataset(rsFile) as dataset:
+            self.assertEqual(dataset.variables['row_size'][:].tolist(),
+                             [3, 5, 4])
+            self.assertEqual(len(dataset.dimensions['obs']), 12)
+            self.assertEqual(dataset.variables['pressure'][3:8].tolist(),
+                             [1, 2, 3, 4, 5])
+            self.assertTrue(dataset.variables['temperature'][3] is
+                            np.ma.masked)
+            self.assertEqual(dataset.station_number, 57494)
+
+    def test_padded(self):
+        print('---> Test on AggregatedNetCDFWriter with padded layout')
+
+        from netCDF4 import Dataset
+
+        with AggregatedNetCDFWriter(self.outputDir, period='year',
+                                    layout='padded') as writer:
+            writer.write(*make_sounding(datetime(2018, 12, 1), 3))
+            rsFile = writer.write(*make_sounding(datetime(2018, 1, 1), 5))
+
+        self.assertEqual(os.path.basename(rsFile), 'radiosonde_57494_2018.nc')
+
+        with Dataset(rsFile) as dataset:
+            pressure = dataset.variables['pressure'][:]
+            self.assertEqual(pressure.shape, (2, 5))
+            self.assertEqual(pressure[0, :3].tolist(), [1, 2, 3])
+            self.assertTrue(pressure[0, 4] is np.ma.masked)
+
+    def test_layout_mismatch(self):
+        print('---> Test on AggregatedNetCDFWriter with another layout')
+
+        with AggregatedNetCDFWriter(self.outputDir, period='month',
+                                    layout='ragged') as writer:
+            writer.write(*make_sounding(datetime(2018, 12, 1), 3))
+
+        with AggregatedNetCDFWriter(self.outputDir, period='month',
+                                    layout='padded') as writer:
+            with self.assertRaises(ValueError):
+                writer.write(*make_sounding(datetime(2018, 12, 2), 3))
+
+    def test_failed_write(self):
+        print('---> Test on AggregatedNetCDFWriter with a failed write')
+
+        from netCDF4 import Dataset
+
+        badSounding = make_sounding(datetime(2018, 12, 1, 12), 5)
+        badSounding[0]['precipitable_water'] = 'n/a'
+
+        with AggregatedNetCDFWriter(self.outputDir, period='month',
+                                    layout='ragged') as writer:
+            rsFile = writer.write(*make_sounding(datetime(2018, 12, 1), 3))
+            with self.assertRaises(ValueError):
+                writer.write(*badSounding)
+
+        # the failed sounding is overwritten by the next one
+        with AggregatedNetCDFWriter(self.outputDir, period='month',
+                                    layout='ragged') as writer:
+            writer.write(*make_sounding(datetime(2018, 12, 2), 4))
+
+        with Dataset(rsFile) as dataset:
+            self.assertEqual(dataset.variables['row_size'][:].tolist(),
+                             [3, 4])
+            self.assertEqual(dataset.variables['pressure'][3:7].tolist(),
+                             [1, 2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
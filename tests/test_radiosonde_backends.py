@@ -0,0 +1,163 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from radiosonde_backends import get_backend, NetCDFBackend, SoundingBackend
+from radiosonde_aggregate import AggregatedNetCDFWriter
+from sounding_helpers import make_sounding
+
+try:
+    import pyarrow   # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+class RecordingDownloader(object):
+    """
+    downloader which records the soundings passed to `save_netCDF`.
+    """
+
+    def __init__(self):
+
+        self.saved = []
+
+    def save_netCDF(self, rsData, rsDims, rsGAttrs, output_dir, force=False):
+
+        self.saved.append((rsData['launch_time'], output_dir, force))
+
+        return os.path.join(output_dir, 'sounding.nc')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.outputDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outputDir, ignore_errors=True)
+
+    def test_get_backend(self):
+        print('---> Test on get_backend')
+
+        downloader = RecordingDownloader()
+        backend = get_backend('per_launch', self.outputDir,
+                              downloader=downloader)
+        self.assertIsInstance(backend, NetCDFBackend)
+        with backend:
+            rsFile = backend.write(*make_sounding(datetime(2019, 1, 1), 3))
+        self.assertEqual(rsFile, os.path.join(self.outputDir, 'sounding.nc'))
+        self.assertEqual(downloader.saved,
+                         [(datetime(2019, 1, 1), self.outputDir, True)])
+
+        self.assertIsInstance(
+            get_backend('aggregated', self.outputDir, layout='padded'),
+            AggregatedNetCDFWriter)
+
+        with self.assertRaises(ValueError):
+            get_backend('hdf5', self.outputDir)
+
+        # incomplete backends fail when they are created
+        class IncompleteBackend(SoundingBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend()
+
+    @unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet(self):
+        print('---> Test on ParquetBackend')
+
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+        from radiosonde_backends import read_parquet_soundings
+
+        with get_backend('parquet', self.outputDir, batch_rows=6) as backend:
+            rsFile = backend.write(
+                *make_sounding(datetime(2018, 12, 31, 12), 3))
+            backend.write(*make_sounding(datetime(2019, 1, 1), 4))
+            backend.write(*make_sounding(datetime(2019, 1, 1, 12), 5))
+
+        # the partition is returned although the rows were still buffered
+        self.assertEqual(rsFile, os.path.join(self.outputDir, 'station=57494',
+                                              'year=2018'))
+
+        partitions = sorted(os.listdir(os.path.join(self.outputDir,
+                                                    'station=57494')))
+        self.assertEqual(partitions, ['year=2018', 'year=2019'])
+
+        table = read_parquet_soundings(self.outputDir)
+        self.assertEqual(table.num_rows, 12)
+
+        # the filter is pushed down to the partitions and the row groups
+        table = read_parquet_soundings(
+            self.outputDir,
+            columns=['launch_time', 'level', 'pressure', 'temperature',
+                     'precipitable_water'],
+            filter=(ds.field('year') == 2019) & (ds.field('pressure') > 3))
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(sorted(table.column('level').to_pylist()),
+                         [3, 3, 4])
+        self.assertEqual(table.column('precipitable_water').to_pylist(),
+                         [20.0] * 3)
+
+        # NaN is stored as null
+        table = read_parquet_soundings(
+            self.outputDir, columns=['temperature'],
+            filter=ds.field('level') == 0)
+        self.assertEqual(table.column('temperature').null_count, 3)
+
+        # the radiosonde metadata is kept in the schema
+        file = os.path.join(self.outputDir, 'station=57494', 'year=2018')
+        schema = pq.read_schema(os.path.join(file, os.listdir(file)[0]))
+        metadata = json.loads(schema.metadata[b'radiosonde_metadata'])
+        self.assertEqual(metadata['pressure']['units'], 'hPa')
+        self.assertEqual(schema.field('pressure').metadata[b'units'], b'hPa')
+        self.assertTrue(np.issubdtype(
+            schema.field('launch_time').type.to_pandas_dtype(),
+            np.datetime64))
+
+    @unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet_rerun(self):
+        print('---> Test on rerunning ParquetBackend')
+
+        from radiosonde_backends import read_parquet_soundings
+
+        launchTimes = [datetime(2019, 1, 1), datetime(2019, 1, 1, 12),
+                       datetime(2019, 1, 2)]
+        with get_backend('parquet', self.outputDir, batch_rows=6) as backend:
+            for launchTime in launchTimes[:2]:
+                backend.write(*make_sounding(launchTime, 4))
+
+        # the overlapping period is rerun, with one sounding written twice
+        with get_backend('parquet', self.outputDir, batch_rows=6) as backend:
+            for launchTime in launchTimes[1:] + launchTimes[2:]:
+                backend.write(*make_sounding(launchTime, 3))
+
+        table = read_parquet_soundings(self.outputDir,
+                                       columns=['launch_time', 'level'])
+        self.assertEqual(table.num_rows, 4 + 3 + 3)
+        rows = sorted(zip(table.column('launch_time').to_pylist(),
+                          table.column('level').to_pylist()))
+        self.assertEqual(len(set(rows)), len(rows))
+        self.assertEqual(
+            [launchTime for launchTime, level in rows if level == 3],
+            [launchTimes[0]])
+
+        # the rewritten file of the first run is listed with the new ones
+        self.assertEqual(len(backend.written_files), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import sys
+import os
+import unittest
+from datetime import datetime
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from radiosonde_concurrent import ConcurrentRSDownloader
+from sounding_archive import SoundingManifest
+from station_index import STATION_DTYPE, StationIndex
+from sounding_helpers import OfflineRSDownloader
+
+
+class Test(unittest.TestCase):
+
+    def test_download(self):
+        print('---> Test on ConcurrentRSDownloader.download')
+
+        engine = ConcurrentRSDownloader(OfflineRSDownloader(),
+                                        max_workers=4,
+                                        max_workers_per_host=2)
+        results, errors = engine.download(
+            [57494, 99999], datetime(2018, 12, 31, 12), datetime(2019, 1, 2))
+
+        rsData, rsDims, rsGAttrs = results[57494]
+        self.assertEqual([item['launch_time'] for item in rsData],
+                         [datetime(2018, 12, 31, 12), datetime(2019, 1, 1),
+                          datetime(2019, 1, 1, 12)])
+        self.assertEqual(rsGAttrs[0]['station_number'], 57494)
+
+        # failures are reported per task without aborting the run
+        self.assertEqual(results[99999], ([], [], []))
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(errors[0].task.station, 99999)
+
+    def test_iter_soundings(self):
+        print('---> Test on ConcurrentRSDownloader.iter_soundings')
+
+        engine = ConcurrentRSDownloader(OfflineRSDownloader(),
+                                        max_workers=1,
+                                        max_workers_per_host=1)
+        errors = []
+        iterator = engine.iter_soundings(
+            [57494, 99999], datetime(2018, 11, 1), datetime(2019, 2, 1),
+            errors=errors)
+
+        # soundings are yielded while the other tasks are still pending
+        rsData, rsDims, rsGAttrs = next(iterator)
+        self.assertEqual(rsData['launch_time'], datetime(2018, 11, 1))
+
+        launchTimes = [rsData['launch_time']] + \
+            [item[0]['launch_time'] for item in iterator]
+        self.assertEqual(len(launchTimes), (30 + 31 + 31) * 2)
+        self.assertEqual(len(errors), 3)
+
+    def test_indexed_station(self):
+        print('---> Test on the downloaders with a station of StationIndex')
+
+        stationList = np.array([(57494, 30.6, 114.05, 23.0, 'WUHAN')],
+                               dtype=STATION_DTYPE)
+        station = StationIndex(stationList).lookup(57494)['ID']
+        self.assertIs(type(station), int)
+
+        rsData = [item[0] for item in OfflineRSDownloader().iter_soundings(
+            station, datetime(2019, 1, 1), datetime(2019, 1, 2))]
+        self.assertEqual([item['launch_time'] for item in rsData],
+                         [datetime(2019, 1, 1), datetime(2019, 1, 1, 12)])
+
+    def test_skip_archived(self):
+        print('---> Test on ConcurrentRSDownloader with a manifest')
+
+        manifest = SoundingManifest(os.path.join(projectDir, 'not_exist'))
+        for day in range(1, 32):
+            manifest.add(57494, datetime(2018, 12, day, 0))
+            manifest.add(57494, datetime(2018, 12, day, 12))
+
+        engine = ConcurrentRSDownloader(OfflineRSDownloader(),
+                                        max_workers=2,
+                                        max_workers_per_host=2,
+                                        manifest=manifest)
+        tasks = engine.plan_tasks(
+            [57494], datetime(2018, 12, 1), datetime(2019, 2, 1))
+
+        self.assertEqual([task.start_time for task in tasks],
+                         [datetime(2019, 1, 1)])
+
+    def test_record_windows(self):
+        print('---> Test on ConcurrentRSDownloader recording the windows')
+
+        manifest = SoundingManifest(os.path.join(projectDir, 'not_exist'),
+                                    settled_days=3)
+        engine = ConcurrentRSDownloader(OfflineRSDownloader(),
+                                        max_workers=2,
+                                        max_workers_per_host=2,
+                                        manifest=manifest)
+        soundings = list(engine.iter_soundings(
+            [57494, 99999], datetime(2018, 12, 1), datetime(2019, 2, 1)))
+        self.assertEqual(len(soundings), (31 + 31) * 2)
+
+        # the windows are skipped even without the files, but the failed
+        # ones are downloaded again
+        tasks = engine.plan_tasks(
+            [57494, 99999], datetime(2018, 12, 1), datetime(2019, 2, 1))
+        self.assertEqual([task.station for task in tasks], [99999, 99999])
+
+
+if __name__ == '__main__':
+    unittest.main()
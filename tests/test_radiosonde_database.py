@@ -0,0 +1,127 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from radiosonde_database import RadiosondeDB, sounding_record
+from sounding_helpers import make_sounding
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.dbFile = os.path.join(self.tmpDir, 'catalog', 'radiosonde.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def test_sounding_record(self):
+        print('---> Test on sounding_record')
+
+        rsData, rsDims, rsGAttrs = make_sounding(datetime(2019, 1, 1, 12), 3)
+        rsData['pressure_LCL'] = float('nan')
+
+        self.assertEqual(
+            sounding_record(rsData, rsDims, rsGAttrs, 'a.nc'),
+            (57494, 1546344000, 'a.nc', 3, 20.0, 280.0, None))
+
+    def test_catalog(self):
+        print('---> Test on RadiosondeDB')
+
+        records = []
+        for station in [57494, 57461]:
+            for iLaunch in range(2 * 62):
+                launchTime = datetime(2018, 12, 1) + \
+                    timedelta(hours=12 * iLaunch)
+                records.append(sounding_record(
+                    *make_sounding(launchTime, 3),
+                    file_path='{0:d}_{1:d}.nc'.format(station, iLaunch)))
+                records[-1] = (station,) + records[-1][1:]
+
+        with RadiosondeDB('local', database=self.dbFile,
+                          batch_size=50) as db:
+            self.assertEqual(db.insert_soundings(records), 248)
+            # existing soundings are replaced
+            self.assertEqual(db.insert_soundings(records[:10]), 10)
+            self.assertEqual(db.count_soundings(), 248)
+
+        # the catalog persists
+        with RadiosondeDB('local', database=self.dbFile) as db:
+            self.assertEqual(db.list_stations(), [57461, 57494])
+
+            soundings = db.search_soundings(57494, datetime(2019, 1, 1),
+                                            datetime(2019, 1, 2))
+            self.assertEqual([item['launch_time'] for item in soundings],
+                             [datetime(2019, 1, 1), datetime(2019, 1, 1, 12)])
+            self.assertEqual(soundings[0]['file_path'], '57494_62.nc')
+            self.assertEqual(soundings[0]['n_levels'], 3)
+            self.assertEqual(soundings[0]['PWV'], 20.0)
+
+            self.assertEqual(
+                db.count_soundings(start_time=datetime(2019, 1, 1)), 124)
+            self.assertEqual(
+                db.delete_soundings(57461, end_time=datetime(2019, 1, 1)), 62)
+            self.assertEqual(db.count_soundings(57461), 62)
+
+    def test_add_sounding(self):
+        print('---> Test on RadiosondeDB.add_sounding')
+
+        db = RadiosondeDB('local', database=':memory:', batch_size=2)
+        for hour in [0, 12, 24]:
+            db.add_sounding(*make_sounding(datetime(2019, 1, 1) +
+                                           timedelta(hours=hour), 3),
+                            file_path='a.nc')
+
+        # the first batch is inserted, the last sounding is queued
+        self.assertEqual(db.count_soundings(), 2)
+        db.flush()
+        self.assertEqual(db.count_soundings(), 3)
+        db.close()
+
+    def test_mysql_catalog(self):
+        print('---> Test on RadiosondeDB with the mysql driver')
+
+        connector = mock.MagicMock()
+        mysql = mock.MagicMock(connector=connector)
+        modules = {'mysql': mysql, 'mysql.connector': connector}
+
+        with mock.patch.dict(sys.modules, modules):
+            # the table exists after the first connection
+            for _ in range(2):
+                db = RadiosondeDB('admin')
+                db.close()
+
+        self.assertEqual(connector.connect.call_count, 2)
+        _, kwargs = connector.connect.call_args
+        self.assertNotIn('raise_on_warnings', kwargs)
+        self.assertEqual(kwargs['database'], 'mua')
+
+        cursor = connector.connect.return_value.cursor.return_value
+        statement = cursor.execute.call_args_list[0][0][0]
+        self.assertTrue(statement.startswith(
+            'CREATE TABLE IF NOT EXISTS radiosonde_sounding ('))
+        self.assertIn('INDEX radiosonde_sounding_launch_time (launch_time)',
+                      statement)
+
+        with mock.patch.dict(sys.modules, modules):
+            db = RadiosondeDB('admin')
+        cursor.reset_mock()
+        cursor.fetchone.return_value = (2,)
+        self.assertEqual(db.count_soundings(57494, datetime(2019, 1, 1)), 2)
+        cursor.execute.assert_called_once_with(
+            'SELECT COUNT(*) FROM radiosonde_sounding WHERE ' +
+            'station_number = %s AND launch_time >= %s', [57494, 1546300800])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import sys
 import os
 import shutil
 import unittest
+import tempfile
+import subprocess
 from datetime import datetime
 
 projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -10,8 +12,10 @@ testPath = os.path.join(projectDir, 'tests')
 srcPath = os.path.join(projectDir, 'src')
 
 sys.path.append(srcPath)
+sys.path.append(testPath)
 
-from radiosonde_downloader import RSDownloader
+from radiosonde_downloader import RSDownloader, monthrange
+from sounding_helpers import OfflineRSDownloader
 
 
 class Test(unittest.TestCase):
@@ -65,6 +69,64 @@ class Test(unittest.TestCase):
 
         self.assertEqual(station_name, 'WUHAN')
 
+    def test_monthrange(self):
+        print('---> Test on monthrange')
+
+        windows = list(monthrange(datetime(2018, 12, 15, 12),
+                                  datetime(2019, 2, 3)))
+
+        self.assertEqual(windows, [
+            (datetime(2018, 12, 15, 12), datetime(2019, 1, 1)),
+            (datetime(2019, 1, 1), datetime(2019, 2, 1)),
+            (datetime(2019, 2, 1), datetime(2019, 2, 3))
+        ])
+
+    def test_build_request_url(self):
+        print('---> Test on RSDownloader.build_request_url')
+
+        rs = RSDownloader()
+        reqURL = rs.build_request_url(datetime(2018, 12, 1),
+                                      datetime(2019, 1, 1), 57494)
+
+        self.assertIn('YEAR=2018&MONTH=12&FROM=0100&TO=3123&STNM=57494',
+                      reqURL)
+        self.assertRaises(ValueError, rs.build_request_url,
+                          datetime(2018, 12, 1), datetime(2019, 1, 2), 57494)
+
+    def test_lazy_imports(self):
+        print('---> Test on lazy imports of radiosonde_downloader')
+
+        code = 'import sys, radiosonde_downloader; ' + \
+            'print([m for m in ["netCDF4", "bs4", "requests"] ' + \
+            'if m in sys.modules])'
+        res = subprocess.run([sys.executable, '-c', code], cwd=srcPath,
+                             stdout=subprocess.PIPE,
+                             universal_newlines=True)
+
+        self.assertEqual(res.stdout.strip(), '[]')
+
+    def test_iter_soundings(self):
+        print('---> Test on RSDownloader.iter_soundings')
+
+        rs = RSDownloader()
+        requests = []
+
+        def get_period_data(start_time, end_time, siteNum=57494):
+            requests.append((start_time, end_time, siteNum))
+            return [{'launch_time': start_time}], [{}], [{}]
+
+        rs.get_period_data = get_period_data
+        iterator = rs.iter_soundings([57494, 57461], datetime(2018, 12, 1),
+                                     datetime(2019, 2, 1))
+
+        # nothing is requested before the first item is consumed
+        self.assertEqual(requests, [])
+        next(iterator)
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(len(list(iterator)), 3)
+        self.assertEqual(requests[-1],
+                         (datetime(2019, 1, 1), datetime(2019, 2, 1), 57461))
+
     def test_get_daily_data(self):
         print('---> Test on RSDownloader.get_daily_data')
 
@@ -113,6 +175,38 @@ class Test(unittest.TestCase):
 
         shutil.rmtree(tmpFolder, ignore_errors=True)
 
+    def test_save_many(self):
+        print('---> Test on RSDownloader.save_many')
+
+        from netCDF4 import Dataset
+
+        rs = OfflineRSDownloader()
+        html = rs.fetch_html(datetime(2019, 1, 1), datetime(2019, 1, 2))
+        rsData, rsDims, rsGAttrs = rs.parse_html(html,
+                                                 end_time=datetime(2019, 1, 2))
+
+        tmpFolder = tempfile.mkdtemp()
+        try:
+            rsFiles = rs.save_many(rsData, rsDims, rsGAttrs, tmpFolder)
+            self.assertEqual(len(rsFiles), 2)
+
+            # existing files are not overwritten without force
+            self.assertEqual(
+                rs.save_many(rsData, rsDims, rsGAttrs, tmpFolder), [])
+
+            with Dataset(rsFiles[1]) as dataset:
+                self.assertIn('processed by', dataset.history)
+                self.assertEqual(dataset.station_number, 57494)
+                self.assertEqual(dataset.variables['pressure'].units, 'hPa')
+                self.assertEqual(dataset.variables['pressure'][:].tolist(),
+                                 [925.0])
+                self.assertEqual(dataset.variables['launch_time'][:],
+                                 datetime(2019, 1, 1, 12).timestamp() -
+                                 datetime(1970, 1, 1).timestamp())
+            self.assertIsInstance(rsData[1]['launch_time'], datetime)
+        finally:
+            shutil.rmtree(tmpFolder, ignore_errors=True)
+
 
 def main():
 
@@ -122,8 +216,13 @@ def main():
         Test('test_RSDownloader_init'),
         Test('test_list_station_number'),
         Test('test_search_station_name'),
+        Test('test_monthrange'),
+        Test('test_build_request_url'),
+        Test('test_lazy_imports'),
+        Test('test_iter_soundings'),
         Test('test_get_daily_data'),
-        Test('test_save_netCDF')
+        Test('test_save_netCDF'),
+        Test('test_save_many')
         ]   # setup the test list
     suite.addTests(tests)
 
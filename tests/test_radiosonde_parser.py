@@ -0,0 +1,177 @@
+import sys
+import os
+import unittest
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+from radiosonde_parser import parse_sounding_table, split_sounding_lines
+from radiosonde_parser import extract_pre_blocks, pair_sounding_blocks
+from radiosonde_parser import parse_sounding_indices, SOUNDING_INDICES
+
+SOUNDING_TABLE = """
+-----------------------------------------------------------------------------
+   PRES   HGHT   TEMP   DWPT   RELH   MIXR   DRCT   SKNT   THTA   THTE   THTV
+    hPa     m      C      C      %    g/kg    deg   knot     K      K      K 
+-----------------------------------------------------------------------------
+ 1000.0     90                                                               
+  925.0    763   12.4    5.4     62   6.17    335      9  292.0  310.0  293.1
+  850.0   1485    9.0   -3.0     43   3.61    320     14  295.8  306.7  296.5
+"""
+
+SOUNDING_HTML = """<HTML>
+<TITLE>University of Wyoming - Radiosonde Data</TITLE>
+<BODY BGCOLOR="white">
+<H2>57494 Wuhan Observations at 00Z 01 Dec 2018</H2>
+<PRE>{table}</PRE><H3>Station information and sounding indices</H3><PRE>
+                             Station number: 57494
+                           Observation time: 181201/0000
+</PRE>
+</BODY></HTML>""".format(table=SOUNDING_TABLE)
+
+
+SOUNDING_INDICES_BLOCK = """
+                         Station identifier: LLBG
+                             Station number: 40179
+                           Observation time: 190916/1200
+                           Station latitude: 32.00
+                          Station longitude: 34.81
+                          Station elevation: 35.0
+                            Showalter index: 7.75
+                               Lifted index: 1.55
+    LIFT computed using virtual temperature: 0.82
+                                SWEAT index: 134.78
+                                    K index: 1.10
+                         Cross totals index: 12.70
+                      Vertical totals index: 21.70
+                        Totals totals index: 34.40
+      Convective Available Potential Energy: 0.00
+             CAPE using virtual temperature: 17.64
+                      Convective Inhibition: 0.00
+             CINS using virtual temperature: -18.91
+                           Equilibrum Level: 423.22
+ Equilibrum Level using virtual temperature: 423.22
+                   Level of Free Convection: 829.22
+             LFCT using virtual temperature: 829.22
+                     Bulk Richardson Number: 0.00
+          Bulk Richardson Number using CAPV: 2.10
+  Temp [K] of the Lifted Condensation Level: 289.53
+Pres [hPa] of the Lifted Condensation Level: 879.95
+   Equivalent potential temp [K] of the LCL: 336.27
+     Mean mixed layer potential temperature: 300.31
+              Mean mixed layer mixing ratio: 13.51
+              1000 hPa to 500 hPa thickness: 5754.00
+Precipitable water [mm] for entire sounding: 27.30
+"""
+
+
+class Test(unittest.TestCase):
+
+    def test_split_sounding_lines(self):
+        print('---> Test on split_sounding_lines')
+
+        dataLines = split_sounding_lines(SOUNDING_TABLE)
+
+        self.assertEqual(len(dataLines), 3)
+        self.assertTrue(dataLines[0].startswith(' 1000.0'))
+
+    def test_parse_sounding_table(self):
+        print('---> Test on parse_sounding_table')
+
+        data = parse_sounding_table(SOUNDING_TABLE)
+
+        np.testing.assert_array_equal(data['pressure'],
+                                      [1000.0, 925.0, 850.0])
+        np.testing.assert_array_equal(data['height'], [90, 763, 1485])
+        self.assertTrue(np.isnan(data['temperature'][0]))
+        self.assertEqual(data['theta_v'][2], 296.5)
+        self.assertTrue(data['dewpoint'].flags['C_CONTIGUOUS'])
+
+    def test_parse_sounding_table_fill_value(self):
+        print('---> Test on parse_sounding_table with _FillValue')
+
+        data = parse_sounding_table(SOUNDING_TABLE, fill_value=9.96921e+36)
+
+        self.assertEqual(data['wind_speed'][0], 9.96921e+36)
+        self.assertEqual(data['wind_speed'][1], 9.0)
+
+    def test_parse_empty_table(self):
+        print('---> Test on parse_sounding_table with an empty table')
+
+        data = parse_sounding_table('')
+
+        self.assertEqual(data['pressure'].size, 0)
+
+    def test_extract_pre_blocks(self):
+        print('---> Test on extract_pre_blocks')
+
+        preBlocks = extract_pre_blocks(SOUNDING_HTML)
+        pairs = pair_sounding_blocks(preBlocks)
+
+        self.assertEqual(len(preBlocks), 2)
+        self.assertEqual(len(pairs), 1)
+        self.assertEqual(preBlocks[0], SOUNDING_TABLE)
+        self.assertIn('Station number: 57494', pairs[0][1])
+
+    def test_extract_pre_blocks_bs4(self):
+        print('---> Test on extract_pre_blocks with BeautifulSoup')
+
+        try:
+            import bs4   # noqa: F401
+        except ImportError:
+            self.skipTest('bs4 is not installed')
+
+        self.assertEqual(extract_pre_blocks(SOUNDING_HTML, parser='bs4'),
+                         extract_pre_blocks(SOUNDING_HTML, parser='regex'))
+
+    def test_parse_sounding_indices(self):
+        print('---> Test on parse_sounding_indices')
+
+        indices = parse_sounding_indices(SOUNDING_INDICES_BLOCK)
+
+        # every index reported by UWyo is parsed
+        for key, dtype in SOUNDING_INDICES.values():
+            self.assertIsInstance(indices[key], dtype)
+            if dtype is float:
+                self.assertFalse(np.isnan(indices[key]), key)
+
+        self.assertEqual(indices['station_identifier'], 'LLBG')
+        self.assertEqual(indices['station_number'], 40179)
+        self.assertEqual(indices['launch_time'], '190916/1200')
+        self.assertEqual(indices['station_longitude'], 34.81)
+        self.assertEqual(indices['CIN_virtual'], -18.91)
+        self.assertEqual(indices['EL'], 423.22)
+        self.assertEqual(indices['temperature_LCL'], 289.53)
+        self.assertEqual(indices['pressure_LCL'], 879.95)
+        self.assertEqual(indices['thickness_1000_500'], 5754.0)
+        self.assertEqual(indices['PWV'], 27.3)
+
+    def test_parse_missing_sounding_indices(self):
+        print('---> Test on parse_sounding_indices with missing indices')
+
+        indices = parse_sounding_indices(
+            '  Station number: 57494\n  Showalter index: ******\n')
+
+        self.assertEqual(indices['station_number'], 57494)
+        self.assertTrue(np.isnan(indices['showalter_index']))
+        self.assertTrue(np.isnan(indices['PWV']))
+        self.assertIsNone(indices['launch_time'])
+
+    def test_parse_sounding_indices_crlf(self):
+        print('---> Test on parse_sounding_indices with CRLF line endings')
+
+        indices = parse_sounding_indices(
+            SOUNDING_INDICES_BLOCK.replace('\n', '\r\n'))
+
+        self.assertEqual(indices, parse_sounding_indices(
+            SOUNDING_INDICES_BLOCK))
+        self.assertEqual(indices['station_number'], 40179)
+        self.assertEqual(indices['launch_time'], '190916/1200')
+        self.assertEqual(indices['PWV'], 27.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import sys
+import os
+import time
+import unittest
+from datetime import datetime
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from radiosonde_pipeline import RSPipeline
+from sounding_archive import SoundingManifest
+from sounding_helpers import OfflineRSDownloader
+
+
+class Test(unittest.TestCase):
+
+    def test_run(self):
+        print('---> Test on RSPipeline.run')
+
+        pipeline = RSPipeline(OfflineRSDownloader(), fetch_workers=3,
+                              parse_workers=2, queue_size=1)
+        written = []
+
+        def write(rsData, rsDims, rsGAttrs):
+            # slow writer to exercise the backpressure
+            time.sleep(0.001)
+            written.append((rsGAttrs['station_number'],
+                            rsData['launch_time']))
+
+        errors = pipeline.run([57494, 99999, 57461], datetime(2018, 12, 1),
+                              datetime(2019, 2, 1), write)
+
+        # 62 days with 2 launches a day for 2 stations
+        self.assertEqual(len(written), 2 * 62 * 2)
+        self.assertEqual(len(set(written)), len(written))
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(error.task.station == 99999 for error in errors))
+
+        self.assertEqual(pipeline.stats['fetch'].items, 4)
+        self.assertEqual(pipeline.stats['parse'].items, len(written))
+        self.assertEqual(pipeline.stats['write'].items, len(written))
+        self.assertEqual(len(pipeline.report()), 3)
+
+    def test_fetch_bytes(self):
+        print('---> Test on RSPipeline.run with non-ASCII responses')
+
+        class NamedRSDownloader(OfflineRSDownloader):
+            def fetch_html(self, *args, **kwargs):
+                html = super(NamedRSDownloader, self).fetch_html(
+                    *args, **kwargs)
+                return html.replace('<BODY>', '<BODY><H2>武汉</H2>')
+
+        rs = NamedRSDownloader()
+        pipeline = RSPipeline(rs, fetch_workers=1, parse_workers=1)
+        pipeline.run(57494, datetime(2019, 1, 1), datetime(2019, 1, 2),
+                     lambda rsData, rsDims, rsGAttrs: None)
+
+        # the fetch stage counts bytes, not characters
+        html = rs.fetch_html(datetime(2019, 1, 1), datetime(2019, 1, 2))
+        self.assertEqual(pipeline.stats['fetch'].bytes,
+                         len(html.encode('utf-8')))
+        self.assertGreater(pipeline.stats['fetch'].bytes, len(html))
+
+    def test_write_error(self):
+        print('---> Test on RSPipeline.run with failing writer')
+
+        pipeline = RSPipeline(OfflineRSDownloader(), fetch_workers=2,
+                              parse_workers=1, queue_size=2)
+
+        def write(rsData, rsDims, rsGAttrs):
+            if rsData['launch_time'].hour == 12:
+                raise OSError('disk is full')
+
+        errors = pipeline.run(57494, datetime(2019, 1, 1),
+                              datetime(2019, 1, 3), write)
+
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(pipeline.stats['write'].items, 2)
+
+    def test_record_windows(self):
+        print('---> Test on RSPipeline.run recording the windows')
+
+        manifest = SoundingManifest(os.path.join(projectDir, 'not_exist'),
+                                    settled_days=3)
+        pipeline = RSPipeline(OfflineRSDownloader(), fetch_workers=2,
+                              parse_workers=2, manifest=manifest)
+
+        def write(rsData, rsDims, rsGAttrs):
+            if rsData['launch_time'] == datetime(2019, 1, 15, 12):
+                raise OSError('disk is full')
+
+        pipeline.run(57494, datetime(2018, 12, 1), datetime(2019, 2, 1),
+                     write)
+
+        # only the window whose soundings were all written is recorded
+        self.assertTrue(manifest.is_fetched(
+            57494, datetime(2018, 12, 1), datetime(2019, 1, 1)))
+        self.assertFalse(manifest.is_fetched(
+            57494, datetime(2019, 1, 1), datetime(2019, 2, 1)))
+
+    def test_interrupted_writer(self):
+        print('---> Test on RSPipeline.run with interrupted writer')
+
+        pipeline = RSPipeline(OfflineRSDownloader(), fetch_workers=2,
+                              parse_workers=2, queue_size=1)
+
+        def write(rsData, rsDims, rsGAttrs):
+            raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            pipeline.run(57494, datetime(2018, 1, 1), datetime(2019, 1, 1),
+                         write)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,277 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from radiosonde_parser import is_busy_page
+from radiosonde_downloader import RSDownloader, monthrange
+from radiosonde_concurrent import ConcurrentRSDownloader
+from radiosonde_pipeline import RSPipeline
+from request_scheduler import TokenBucket, RequestScheduler, ServerBusyError
+from request_scheduler import DelayedTaskQueue
+from response_cache import ResponseCache
+from sounding_helpers import SOUNDING_BLOCK
+
+BUSY_PAGE = ('<HTML><TITLE>University of Wyoming - Radiosonde Data</TITLE>' +
+             '<BODY>Sorry, the server is too busy to process your request. ' +
+             'Please try again later.</BODY></HTML>')
+
+
+class Response(object):
+
+    def __init__(self, text, status_code=200):
+
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.status_code = status_code
+        self.ok = status_code < 400
+
+
+class BusyTransport(object):
+    """
+    transport which answers the first `nBusy` requests of every url with a
+    busy page.
+    """
+
+    def __init__(self, nBusy):
+
+        self.nBusy = nBusy
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+
+        with self._lock:
+            self.requests[url] = self.requests.get(url, 0) + 1
+            if self.requests[url] <= self.nBusy:
+                return Response(BUSY_PAGE)
+
+        # one sounding at the start of the requested window
+        query = parse_qs(urlparse(url).query)
+        launchTime = datetime(int(query['YEAR'][0]), int(query['MONTH'][0]),
+                              int(query['FROM'][0][:2]))
+
+        return Response('<HTML><BODY>' + SOUNDING_BLOCK.format(
+            station=int(query['STNM'][0]),
+            time=launchTime.strftime('%y%m%d/%H%M')) + '</BODY></HTML>')
+
+
+def fast_scheduler(**kwargs):
+
+    options = dict(rate=1000.0, burst=10, max_concurrency=4,
+                   requeue_delay=0.01, requeue_delay_max=0.05)
+    options.update(kwargs)
+
+    return RequestScheduler(**options)
+
+
+class Test(unittest.TestCase):
+
+    def test_is_busy_page(self):
+        print('---> Test on is_busy_page')
+
+        self.assertTrue(is_busy_page(BUSY_PAGE))
+        self.assertTrue(is_busy_page(
+            "<HTML><BODY>Can't get 57494 Wuhan Observations</BODY></HTML>"))
+        self.assertFalse(is_busy_page('<HTML><BODY></BODY></HTML>'))
+        self.assertFalse(is_busy_page(SOUNDING_BLOCK.format(
+            station=57494, time='190101/0000')))
+
+    def test_token_bucket(self):
+        print('---> Test on TokenBucket')
+
+        bucket = TokenBucket(rate=50.0, capacity=2)
+
+        tStart = time.perf_counter()
+        for _ in range(7):
+            bucket.acquire()
+        elapsed = time.perf_counter() - tStart
+
+        # 2 tokens of the burst and 5 refilled at 50 tokens/s
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertRaises(ValueError, TokenBucket, 0, 1)
+
+    def test_aimd(self):
+        print('---> Test on the AIMD concurrency limit')
+
+        scheduler = fast_scheduler(max_concurrency=8, decrease_factor=0.5)
+        url = 'http://weather.uwyo.edu/cgi-bin/sounding'
+
+        def busy_request():
+            with scheduler.request(url):
+                raise ServerBusyError(url)
+
+        self.assertRaises(ServerBusyError, busy_request)
+        self.assertRaises(ServerBusyError, busy_request)
+        self.assertEqual(scheduler.host(url).limit, 2.0)
+
+        for _ in range(3):
+            with scheduler.request(url):
+                pass
+        self.assertGreater(scheduler.host(url).limit, 3.0)
+        self.assertEqual(scheduler.host(url).in_flight, 0)
+
+        for _ in range(10):
+            self.assertRaises(ServerBusyError, busy_request)
+        self.assertEqual(scheduler.host(url).limit, 1)
+
+    def test_retry_delay(self):
+        print('---> Test on RequestScheduler.retry_delay')
+
+        scheduler = fast_scheduler(requeue_delay=1.0, requeue_delay_max=3.0,
+                                   max_requeues=3)
+
+        self.assertEqual([scheduler.retry_delay('task') for _ in range(4)],
+                         [1.0, 2.0, 3.0, None])
+        self.assertEqual(scheduler.retry_delay('other'), 1.0)
+
+    def test_delayed_task_queue(self):
+        print('---> Test on DelayedTaskQueue')
+
+        taskQueue = DelayedTaskQueue(['a', 'b'])
+
+        self.assertEqual(taskQueue.get(), 'a')
+        taskQueue.put('a', delay=0.05)
+        taskQueue.task_done()
+        self.assertEqual(taskQueue.get(), 'b')
+        taskQueue.task_done()
+
+        # the re-queued task is served after its delay
+        self.assertEqual(taskQueue.get(timeout=1.0), 'a')
+        taskQueue.task_done()
+        self.assertIsNone(taskQueue.get())
+
+    def test_busy_page_raises(self):
+        print('---> Test on RSDownloader.fetch_html with a busy page')
+
+        rs = RSDownloader(transport=BusyTransport(nBusy=1))
+
+        self.assertRaises(ServerBusyError, rs.get_daily_data,
+                          datetime(2019, 1, 1), datetime(2019, 1, 2))
+        rsData, _, _ = rs.get_daily_data(datetime(2019, 1, 1),
+                                         datetime(2019, 1, 2))
+        self.assertEqual(len(rsData), 1)
+
+    def test_concurrent_requeue(self):
+        print('---> Test on ConcurrentRSDownloader with busy pages')
+
+        engine = ConcurrentRSDownloader(
+            RSDownloader(transport=BusyTransport(nBusy=2)),
+            max_workers=2, scheduler=fast_scheduler())
+        results, errors = engine.download(
+            [57494], datetime(2019, 1, 1), datetime(2019, 3, 1))
+
+        # every busy task is retried instead of returning empty data
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results[57494][0]), 2)
+
+    def test_concurrent_requeue_exhausted(self):
+        print('---> Test on ConcurrentRSDownloader with a busy server')
+
+        engine = ConcurrentRSDownloader(
+            RSDownloader(transport=BusyTransport(nBusy=10)),
+            max_workers=2, scheduler=fast_scheduler(max_requeues=2))
+        results, errors = engine.download(
+            [57494], datetime(2019, 1, 1), datetime(2019, 2, 1))
+
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0].exception, ServerBusyError)
+
+    def test_pipeline_requeue(self):
+        print('---> Test on RSPipeline with busy pages')
+
+        pipeline = RSPipeline(
+            RSDownloader(transport=BusyTransport(nBusy=1)),
+            fetch_workers=2, parse_workers=1, scheduler=fast_scheduler())
+        soundings = []
+        errors = pipeline.run([57494], datetime(2019, 1, 1),
+                              datetime(2019, 3, 1),
+                              lambda *sounding: soundings.append(sounding))
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(soundings), 2)
+
+    def test_cache_hits_not_throttled(self):
+        print('---> Test on the scheduler with cached responses')
+
+        cacheDir = tempfile.mkdtemp()
+        try:
+            transport = BusyTransport(nBusy=0)
+            rs = RSDownloader(transport=transport,
+                              cache=ResponseCache(cacheDir))
+            for thisStart, thisEnd in monthrange(datetime(2019, 1, 1),
+                                                 datetime(2019, 7, 1)):
+                url = rs.build_request_url(thisStart, thisEnd, 57494)
+                rs.cache.put(rs.request_key(thisStart, thisEnd, 57494),
+                             transport.get(url).text)
+            transport.requests = {}
+
+            # one token every 100 s: only the network requests would wait
+            engine = ConcurrentRSDownloader(
+                rs, max_workers=2,
+                scheduler=fast_scheduler(rate=0.01, burst=1))
+            t0 = time.perf_counter()
+            results, errors = engine.download(
+                [57494], datetime(2019, 1, 1), datetime(2019, 7, 1))
+
+            self.assertLess(time.perf_counter() - t0, 5.0)
+            self.assertEqual(errors, [])
+            self.assertEqual(len(results[57494][0]), 6)
+            self.assertEqual(transport.requests, {})
+        finally:
+            shutil.rmtree(cacheDir, ignore_errors=True)
+
+    def test_cache_empty_responses(self):
+        print('---> Test on caching the responses without soundings')
+
+        class EmptyTransport(object):
+
+            def __init__(self, responses):
+
+                self.responses = responses
+                self.nRequests = 0
+
+            def get(self, url):
+
+                self.nRequests += 1
+                return self.responses[self.nRequests - 1]
+
+        cacheDir = tempfile.mkdtemp()
+        try:
+            emptyPage = '<HTML><BODY><H2>No soundings</H2></BODY></HTML>'
+            transport = EmptyTransport([
+                Response(BUSY_PAGE), Response('Not Found', status_code=404),
+                Response(emptyPage)])
+            rs = RSDownloader(transport=transport,
+                              cache=ResponseCache(cacheDir))
+
+            # neither the busy pages nor the errors are cached
+            self.assertRaises(ServerBusyError, rs.fetch_html,
+                              datetime(2019, 1, 1), datetime(2019, 2, 1))
+            rs.fetch_html(datetime(2019, 1, 1), datetime(2019, 2, 1))
+            self.assertEqual(
+                rs.fetch_html(datetime(2019, 1, 1), datetime(2019, 2, 1)),
+                emptyPage)
+
+            # a period without soundings is not requested again
+            self.assertEqual(
+                rs.fetch_html(datetime(2019, 1, 1), datetime(2019, 2, 1)),
+                emptyPage)
+            self.assertEqual(transport.nRequests, 3)
+        finally:
+            shutil.rmtree(cacheDir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
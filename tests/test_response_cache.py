@@ -0,0 +1,109 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import datetime
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+from response_cache import ResponseCache, RequestKey
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir, ignore_errors=True)
+
+    def test_get_put(self):
+        print('---> Test on ResponseCache.get and ResponseCache.put')
+
+        cache = ResponseCache(self.cacheDir)
+        key = RequestKey(57494, 2018, 12, '0100', '3123')
+
+        self.assertIsNone(cache.get(key))
+        cache.put(key, '<PRE>sounding</PRE>')
+        self.assertEqual(cache.get(key), '<PRE>sounding</PRE>')
+
+        # the cache persists across instances
+        self.assertEqual(ResponseCache(self.cacheDir).get(key),
+                         '<PRE>sounding</PRE>')
+
+    def test_recent_ttl(self):
+        print('---> Test on ResponseCache expiration')
+
+        cache = ResponseCache(self.cacheDir, recent_ttl=60, recent_days=3)
+        now = datetime.datetime.utcnow()
+        recentKey = RequestKey(57494, now.year, now.month, '0100',
+                               now.strftime('%d%H'))
+        oldKey = RequestKey(57494, 2018, 12, '0100', '3123')
+
+        for key in [recentKey, oldKey]:
+            cache.put(key, 'response')
+            # pretend that the response was stored two hours ago
+            path = cache.key_path(key)
+            os.utime(path, (time.time(), time.time() - 7200))
+
+        self.assertIsNone(cache.get(recentKey))
+        self.assertEqual(cache.get(oldKey), 'response')
+
+    def test_lru_eviction(self):
+        print('---> Test on ResponseCache LRU eviction')
+
+        cache = ResponseCache(self.cacheDir)
+        keys = [RequestKey(57494, 2018, month, '0100', '2823')
+                for month in [1, 2, 3]]
+        html = os.urandom(100).hex()
+
+        # room for two responses
+        cache.put(keys[0], html)
+        cache.max_size = int(2.5 * cache.size)
+        cache.put(keys[1], html)
+        os.utime(cache.key_path(keys[0]), (time.time() - 100, time.time()))
+        os.utime(cache.key_path(keys[1]), (time.time() - 200, time.time()))
+        cache.put(keys[2], html)
+
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[0]), html)
+        self.assertEqual(cache.get(keys[2]), html)
+        self.assertLessEqual(cache.size, cache.max_size)
+
+    def test_evict_ratio(self):
+        print('---> Test on ResponseCache eviction to the low-water mark')
+
+        cache = ResponseCache(self.cacheDir, evict_ratio=0.5)
+        keys = [RequestKey(57494, 2018, month, '0100', '2823')
+                for month in range(1, 7)]
+        html = os.urandom(100).hex()
+
+        # room for four responses, evicted down to two
+        cache.put(keys[0], html)
+        cache.max_size = int(4.5 * cache.size)
+        for iKey, key in enumerate(keys[:4]):
+            cache.put(key, html)
+            os.utime(cache.key_path(key), (time.time() - 100 + iKey,
+                                           time.time()))
+        cache.put(keys[4], html)
+
+        self.assertLessEqual(cache.size, 0.5 * cache.max_size)
+        self.assertEqual(sorted(os.listdir(self.cacheDir)),
+                         sorted(os.path.basename(cache.key_path(key))
+                                for key in keys[3:5]))
+
+        # the next put fits without scanning the cache again
+        cache.put(keys[5], html)
+        self.assertEqual(len(os.listdir(self.cacheDir)), 3)
+
+        with self.assertRaises(ValueError):
+            ResponseCache(self.cacheDir, evict_ratio=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+from sounding_archive import SoundingManifest, compile_file_pattern
+from sounding_archive import parse_sounding_filename, sounding_filename
+from sounding_archive import expected_launch_times, ArchiveIndex
+
+FILE_NAMING = 'radiosonde_{sitenum}_{date}.nc'
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.outputDir = tempfile.mkdtemp()
+        self.indexDir = tempfile.mkdtemp()
+        self.indexFile = os.path.join(self.indexDir, 'archive.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.outputDir, ignore_errors=True)
+        shutil.rmtree(self.indexDir, ignore_errors=True)
+
+    def touch(self, station, launch_time):
+        filename = sounding_filename(station, launch_time, FILE_NAMING)
+        open(os.path.join(self.outputDir, filename), 'w').close()
+
+    def test_parse_sounding_filename(self):
+        print('---> Test on parse_sounding_filename')
+
+        pattern = compile_file_pattern(FILE_NAMING)
+
+        self.assertEqual(
+            parse_sounding_filename('radiosonde_57494_20181201_1200.nc',
+                                    pattern),
+            (57494, datetime(2018, 12, 1, 12)))
+        self.assertIsNone(
+            parse_sounding_filename('radiosonde_57494_20181201.nc', pattern))
+        self.assertIsNone(
+            parse_sounding_filename('radiosonde_57494_20181201_1200.nc.tmp',
+                                    pattern))
+
+    def test_expected_launch_times(self):
+        print('---> Test on expected_launch_times')
+
+        launchTimes = list(expected_launch_times(
+            datetime(2018, 12, 1, 6), datetime(2018, 12, 2, 12), [0, 12]))
+
+        self.assertEqual(launchTimes, [datetime(2018, 12, 1, 12),
+                                       datetime(2018, 12, 2, 0)])
+
+    def test_manifest(self):
+        print('---> Test on SoundingManifest')
+
+        self.touch(57494, datetime(2018, 12, 1, 0))
+        self.touch(57494, datetime(2018, 12, 1, 12))
+        manifest = SoundingManifest(self.outputDir, file_naming=FILE_NAMING)
+
+        self.assertEqual(len(manifest), 2)
+        self.assertIn((57494, datetime(2018, 12, 1, 12)), manifest)
+        self.assertTrue(manifest.is_complete(
+            57494, datetime(2018, 12, 1), datetime(2018, 12, 2), [0, 12]))
+        self.assertFalse(manifest.is_complete(
+            57494, datetime(2018, 12, 1), datetime(2018, 12, 3), [0, 12]))
+
+        # updated after each write
+        manifest.add_file(os.path.join(
+            self.outputDir, 'radiosonde_57494_20181202_0000.nc'))
+        manifest.add(57494, datetime(2018, 12, 2, 12))
+        self.assertTrue(manifest.is_complete(
+            57494, datetime(2018, 12, 1), datetime(2018, 12, 3), [0, 12]))
+
+    def test_fetched_windows(self):
+        print('---> Test on SoundingManifest with the fetched windows')
+
+        self.touch(57494, datetime(2018, 12, 1, 0))
+        manifest = SoundingManifest(self.outputDir, file_naming=FILE_NAMING,
+                                    settled_days=3)
+
+        # a station without the 12Z launches
+        self.assertFalse(manifest.is_complete(
+            57494, datetime(2018, 12, 1), datetime(2019, 1, 1), [0, 12]))
+        self.assertTrue(manifest.add_window(
+            57494, datetime(2018, 12, 1), datetime(2019, 1, 1)))
+        self.assertTrue(manifest.is_complete(
+            57494, datetime(2018, 12, 1), datetime(2019, 1, 1), [0, 12]))
+        self.assertTrue(manifest.is_complete(
+            57494, datetime(2018, 12, 15), datetime(2019, 1, 1), [0, 12]))
+        self.assertFalse(manifest.is_complete(
+            57494, datetime(2018, 12, 15), datetime(2019, 1, 2), [0, 12]))
+        self.assertFalse(manifest.is_complete(
+            57461, datetime(2018, 12, 1), datetime(2019, 1, 1), [0, 12]))
+
+        # the recent windows may still get new soundings
+        self.assertFalse(manifest.add_window(
+            57494, datetime(2019, 1, 1), datetime(2019, 2, 1),
+            now=datetime(2019, 2, 2)))
+        self.assertFalse(manifest.is_complete(
+            57494, datetime(2019, 1, 1), datetime(2019, 2, 1), [0, 12]))
+
+    def test_archive_index(self):
+        print('---> Test on ArchiveIndex queries')
+
+        for day in range(1, 32):
+            for hour in [0, 12]:
+                if (day, hour) not in [(5, 12), (20, 0)]:
+                    self.touch(57494, datetime(2015, 1, day, hour))
+        self.touch(57461, datetime(2015, 1, 1))
+        open(os.path.join(self.outputDir, 'notes.txt'), 'w').close()
+
+        index = ArchiveIndex(self.outputDir, file_naming=FILE_NAMING,
+                             index_file=self.indexFile)
+
+        self.assertEqual(len(index), 61)
+        self.assertEqual(index.stations(), [57461, 57494])
+        self.assertEqual(index.count(57494), 60)
+        self.assertEqual(index.count(start_time=datetime(2015, 1, 1, 6)), 59)
+        self.assertEqual(
+            index.query(57494, datetime(2015, 1, 5), datetime(2015, 1, 6, 1)),
+            [datetime(2015, 1, 5), datetime(2015, 1, 6)])
+        self.assertEqual(index.query(57000), [])
+        self.assertEqual(
+            index.missing(57494, datetime(2015, 1, 1), datetime(2015, 2, 1)),
+            [datetime(2015, 1, 5, 12), datetime(2015, 1, 20)])
+        self.assertTrue(index.is_complete(57494, datetime(2015, 1, 6),
+                                          datetime(2015, 1, 20)))
+        self.assertFalse(index.is_complete(57494, datetime(2015, 1, 6),
+                                           datetime(2015, 1, 21)))
+        self.assertIn((57494, datetime(2015, 1, 31, 12)), index)
+        self.assertNotIn((57494, datetime(2015, 1, 20)), index)
+
+        # incremental update
+        index.add(57494, datetime(2015, 1, 20))
+        index.add(57494, datetime(2015, 1, 20))
+        self.assertEqual(index.count(57494), 61)
+        self.assertIn((57494, datetime(2015, 1, 20)), index)
+
+    def test_archive_index_persistence(self):
+        print('---> Test on ArchiveIndex persistence')
+
+        self.touch(57494, datetime(2015, 1, 1))
+        index = ArchiveIndex(self.outputDir, file_naming=FILE_NAMING,
+                             index_file=self.indexFile)
+        self.assertTrue(os.path.exists(self.indexFile))
+
+        # the saved index is loaded while the directory is unchanged, so a
+        # sounding only known to the index survives
+        index.add(57494, datetime(2015, 1, 2))
+        index.save()
+        index = ArchiveIndex(self.outputDir, file_naming=FILE_NAMING,
+                             index_file=self.indexFile)
+        self.assertEqual(index.count(57494), 2)
+
+        # files written by others invalidate the index
+        self.touch(57461, datetime(2015, 1, 1))
+        os.utime(self.outputDir, ns=(0, 0))
+        index = ArchiveIndex(self.outputDir, file_naming=FILE_NAMING,
+                             index_file=self.indexFile)
+        self.assertEqual(index.stations(), [57461, 57494])
+        self.assertEqual(index.count(57494), 1)
+
+    def test_archive_index_windows(self):
+        print('---> Test on ArchiveIndex with the fetched windows')
+
+        index = ArchiveIndex(self.outputDir, file_naming=FILE_NAMING,
+                             index_file=self.indexFile)
+        index.add_window(57494, datetime(2015, 1, 1), datetime(2015, 2, 1))
+        index.save()
+
+        # the windows survive the rescan of a changed directory
+        self.touch(57494, datetime(2015, 1, 1))
+        os.utime(self.outputDir, ns=(0, 0))
+        index = ArchiveIndex(self.outputDir, file_naming=FILE_NAMING,
+                             index_file=self.indexFile)
+        self.assertEqual(index.count(57494), 1)
+        self.assertEqual(
+            len(index.missing(57494, datetime(2015, 1, 1),
+                              datetime(2015, 2, 1), [0, 12])), 61)
+        self.assertTrue(index.is_complete(
+            57494, datetime(2015, 1, 1), datetime(2015, 2, 1), [0, 12]))
+
+
+if __name__ == '__main__':
+    unittest.main()
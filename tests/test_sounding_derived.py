@@ -0,0 +1,142 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+testPath = os.path.join(projectDir, 'tests')
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+sys.path.append(testPath)
+
+from sounding_derived import DERIVED_VARIABLES, STANDARD_NUMBER_DENSITY
+from sounding_derived import add_derived_variables, compute_derived
+from sounding_derived import number_density, rayleigh_cross_section
+from sounding_derived import stack_soundings, unstack_soundings
+from sounding_derived import virtual_temperature, wind_components
+from sounding_helpers import OfflineRSDownloader
+
+FILL_VALUE = 9.96921e+36
+
+
+def sounding(nLevels, fill_level=None):
+    """
+    radiosonde data of a sounding with `nLevels` levels.
+    """
+
+    rsData = {
+        'altitude': np.arange(nLevels) * 1000.0,
+        'pressure': np.linspace(1013.25, 500.0, nLevels),
+        'temperature': np.linspace(15.0, -20.0, nLevels),
+        'water_vapor_mixing_ratio': np.linspace(10.0, 0.5, nLevels),
+        'wind_speed': np.full(nLevels, 10.0),
+        'wind_direction': np.full(nLevels, 270.0),
+        'launch_time': datetime(2019, 1, 1),
+    }
+    if fill_level is not None:
+        rsData['temperature'][fill_level] = FILL_VALUE
+
+    return rsData
+
+
+class Test(unittest.TestCase):
+
+    def test_quantities(self):
+        print('---> Test on the derived quantities')
+
+        self.assertAlmostEqual(number_density(1013.25, 15.0) /
+                               STANDARD_NUMBER_DENSITY, 1.0)
+
+        # Bucholtz (1995): 5.167e-31 m2 at 532 nm
+        sigma, sigmaBack = rayleigh_cross_section(532)
+        self.assertAlmostEqual(sigma / 5.167e-31, 1.0, places=3)
+        self.assertTrue(8.3 < sigma / sigmaBack < 8.6)
+        self.assertGreater(rayleigh_cross_section(355)[0], sigma)
+
+        self.assertAlmostEqual(float(virtual_temperature(20.0, 0.0)), 293.15)
+        self.assertAlmostEqual(float(virtual_temperature(20.0, 10.0)),
+                               293.15 * (1 + 0.01 / 0.622) / 1.01)
+
+        u, v = wind_components([10.0, 10.0], [270.0, 180.0])
+        np.testing.assert_allclose(u, [5.14444, 0.0], atol=1e-10)
+        np.testing.assert_allclose(v, [0.0, 5.14444], atol=1e-10)
+
+    def test_stack_soundings(self):
+        print('---> Test on stack_soundings')
+
+        dataList = [sounding(3), sounding(5, fill_level=1), sounding(0)]
+        columns, nLevels = stack_soundings(dataList, ['temperature'])
+
+        self.assertEqual(nLevels.tolist(), [3, 5, 0])
+        self.assertEqual(columns['temperature'].shape, (3, 5))
+        self.assertTrue(np.isnan(columns['temperature'][0, 3:]).all())
+        self.assertTrue(np.isnan(columns['temperature'][1, 1]))
+        self.assertTrue(np.isnan(columns['temperature'][2]).all())
+
+        profiles = unstack_soundings(columns, nLevels)
+        self.assertEqual([len(profile['temperature'])
+                          for profile in profiles], [3, 5, 0])
+        np.testing.assert_array_equal(profiles[0]['temperature'],
+                                      dataList[0]['temperature'])
+
+    def test_add_derived_variables(self):
+        print('---> Test on add_derived_variables')
+
+        dataList = [sounding(4), sounding(6, fill_level=2)]
+        self.assertIs(add_derived_variables(dataList, wavelength=355),
+                      dataList)
+
+        for rsData in dataList:
+            self.assertEqual(rsData['rayleigh_wavelength'], 355)
+            for key in DERIVED_VARIABLES:
+                self.assertEqual(len(rsData[key]), len(rsData['altitude']))
+
+        # the batch gives the same results as the single profiles
+        single = compute_derived(sounding(6), wavelength=355)
+        np.testing.assert_allclose(dataList[1]['u_wind'], single['u_wind'])
+        np.testing.assert_allclose(
+            np.delete(dataList[1]['rayleigh_backscatter'], 2),
+            np.delete(single['rayleigh_backscatter'], 2))
+
+        # fill values are not taken as temperatures
+        self.assertTrue(np.isnan(dataList[1]['number_density'][2]))
+        self.assertTrue(np.isnan(dataList[1]['virtual_temperature'][2]))
+        self.assertFalse(np.isnan(dataList[1]['u_wind'][2]))
+
+        self.assertEqual(add_derived_variables([]), [])
+
+    def test_RSDownloader_derived(self):
+        print('---> Test on RSDownloader with derived variables')
+
+        from netCDF4 import Dataset
+
+        rs = OfflineRSDownloader(derived=True, wavelength=1064)
+        html = rs.fetch_html(datetime(2019, 1, 1), datetime(2019, 1, 2))
+        rsData, rsDims, rsGAttrs = rs.parse_html(
+            html, end_time=datetime(2019, 1, 2))
+
+        self.assertTrue(all(key in rsData[0] for key in DERIVED_VARIABLES))
+
+        tmpFolder = tempfile.mkdtemp()
+        try:
+            rsFiles = rs.save_many(rsData, rsDims, rsGAttrs, tmpFolder)
+            with Dataset(rsFiles[0]) as dataset:
+                self.assertEqual(
+                    dataset.variables['rayleigh_backscatter'].units,
+                    'm-1*sr-1')
+                self.assertEqual(dataset.variables['u_wind'].units, 'm*s-1')
+                self.assertEqual(
+                    dataset.variables['rayleigh_wavelength'][:], 1064)
+                np.testing.assert_allclose(
+                    dataset.variables['number_density'][:],
+                    rsData[0]['number_density'])
+        finally:
+            shutil.rmtree(tmpFolder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+from station_index import StationIndex, haversine, load_station_table
+
+STATION_FILE_LINES = [
+    'CHM00057494  30.6000  114.0500   23.0    WUHAN' +
+    '                          1956 2020  37474\n',
+    'CHM00057461  30.7000  111.3000  134.0    YICHANG' +
+    '                        1956 2020  30261\n',
+    'ZZXUAICE031 -75.1000  123.3500 3233.0    CONCORDIA' +
+    '                      2005 2006    101\n',
+]
+
+STATION_LIST = [
+    {'ID': 57494, 'lat': 30.6, 'lon': 114.05, 'elevation': 23.0,
+     'station_name': 'WUHAN'},
+    {'ID': 57461, 'lat': 30.7, 'lon': 111.3, 'elevation': 134.0,
+     'station_name': 'YICHANG'},
+    {'ID': 58457, 'lat': 30.23, 'lon': 120.17, 'elevation': 43.0,
+     'station_name': 'HANGZHOU'},
+    {'ID': 54511, 'lat': 39.93, 'lon': 116.28, 'elevation': 55.0,
+     'station_name': 'BEIJING'},
+    {'ID': 57494, 'lat': 0.0, 'lon': 0.0, 'elevation': 0.0,
+     'station_name': 'DUPLICATED'},
+]
+
+
+class Test(unittest.TestCase):
+
+    def test_haversine(self):
+        print('---> Test on haversine')
+
+        distance = haversine(0.0, 0.0, [0.0, 90.0], [1.0, 0.0])
+
+        self.assertAlmostEqual(distance[0], 111.19, places=1)
+        self.assertAlmostEqual(distance[1], 10007.5, places=0)
+
+    def test_lookup(self):
+        print('---> Test on StationIndex.lookup')
+
+        index = StationIndex(STATION_LIST)
+
+        self.assertEqual(index.lookup(57494)['station_name'], 'WUHAN')
+        self.assertIsNone(index.lookup(12345))
+        self.assertIn(54511, index)
+
+    def test_nearest(self):
+        print('---> Test on StationIndex.nearest')
+
+        index = StationIndex(STATION_LIST)
+        stations = index.nearest(30.5, 114.4, n=2)
+
+        self.assertEqual([item['station_name'] for item, _ in stations],
+                         ['WUHAN', 'YICHANG'])
+        self.assertLess(stations[0][1], stations[1][1])
+
+    def test_within_radius(self):
+        print('---> Test on StationIndex.within_radius')
+
+        index = StationIndex(STATION_LIST)
+        stations = index.within_radius(30.5, 114.4, 300)
+
+        self.assertEqual([item['station_name'] for item, _ in stations],
+                         ['WUHAN', 'YICHANG'])
+        self.assertEqual(index.within_radius(-60.0, 0.0, 300), [])
+
+    def test_load_station_table(self):
+        print('---> Test on load_station_table')
+
+        tmpDir = tempfile.mkdtemp()
+        stationFile = os.path.join(tmpDir, 'station_list.txt')
+        with open(stationFile, 'w', encoding='utf-8') as fh:
+            fh.writelines(STATION_FILE_LINES[:2])
+
+        try:
+            stations = load_station_table(stationFile)
+            self.assertEqual(stations['ID'].tolist(), [57494, 57461])
+            self.assertTrue(os.path.exists(
+                os.path.join(tmpDir, 'station_list.npy')))
+
+            # the second load is memory-mapped from the cache
+            stations = load_station_table(stationFile)
+            self.assertIsInstance(stations, np.memmap)
+            station = StationIndex(stations).lookup(57461)
+            self.assertEqual(station['station_name'], 'YICHANG')
+            self.assertIs(type(station['ID']), int)
+
+            # the cache is invalidated when the file changes
+            with open(stationFile, 'w', encoding='utf-8') as fh:
+                fh.writelines(STATION_FILE_LINES)
+            os.utime(stationFile, (time.time() + 10, time.time() + 10))
+            stations = load_station_table(stationFile)
+            self.assertEqual(len(stations), 2)
+            self.assertEqual(stations['ID'].tolist(), [57494, 57461])
+            self.assertNotIsInstance(stations, np.memmap)
+        finally:
+            shutil.rmtree(tmpDir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import sys
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+from storage_sinks import LocalSink, GenericSink, Uploader, get_sink
+from storage_sinks import file_digest, StorageSink
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.localDir = os.path.join(self.tmpDir, 'local')
+        self.remoteDir = os.path.join(self.tmpDir, 'remote')
+        os.makedirs(os.path.join(self.localDir, '2019'))
+
+        self.files = []
+        for iFile in range(4):
+            file = os.path.join(self.localDir, '2019',
+                                'file_{:d}.grib'.format(iFile))
+            with open(file, 'wb') as fh:
+                fh.write(os.urandom(1000 + iFile))
+            self.files.append(file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def test_local_sink(self):
+        print('---> Test on LocalSink.put')
+
+        sink = LocalSink(self.remoteDir, chunk_size=256)
+
+        self.assertTrue(sink.put(self.files[0], 'a/file_0.grib'))
+        remoteFile = os.path.join(self.remoteDir, 'a', 'file_0.grib')
+        self.assertEqual(file_digest(remoteFile),
+                         file_digest(self.files[0]))
+
+        # identical files are skipped, and changed files uploaded again
+        self.assertFalse(sink.put(self.files[0], 'a/file_0.grib'))
+        with open(self.files[0], 'r+b') as fh:
+            fh.write(b'GRIB')
+        self.assertTrue(sink.put(self.files[0], 'a/file_0.grib'))
+        self.assertEqual(file_digest(remoteFile),
+                         file_digest(self.files[0]))
+
+    def test_generic_sink(self):
+        print('---> Test on GenericSink with the ledger')
+
+        uploads = []
+        ledgerFile = os.path.join(self.tmpDir, 'ledger.json')
+
+        def upload(local, remote):
+            uploads.append(remote)
+
+        sink = GenericSink(upload, 'bucket', ledger_file=ledgerFile)
+        self.assertTrue(sink.put(self.files[1], 'file_1.grib'))
+        self.assertEqual(uploads, ['bucket/file_1.grib'])
+
+        # the ledger is persistent
+        sink = GenericSink(upload, 'bucket', ledger_file=ledgerFile)
+        self.assertFalse(sink.put(self.files[1], 'file_1.grib'))
+        self.assertTrue(sink.put(self.files[2], 'file_1.grib'))
+        self.assertEqual(len(uploads), 2)
+
+        # the remote digest can be provided by the storage itself
+        sink = GenericSink(upload, 'bucket', ledger_file=ledgerFile,
+                           digest_func=lambda remote: None)
+        self.assertTrue(sink.put(self.files[1], 'file_1.grib'))
+
+        self.assertRaises(ValueError, get_sink, 'ftp')
+
+        # sinks without upload fail when they are created
+        class IncompleteSink(StorageSink):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteSink(ledger_file=ledgerFile)
+
+    def test_uploader(self):
+        print('---> Test on Uploader')
+
+        active = [0, 0]
+        lock = threading.Lock()
+
+        def upload(local, remote):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            if remote.endswith('file_3.grib'):
+                raise IOError('connection reset')
+
+        sink = GenericSink(upload, ledger_file=os.path.join(
+            self.tmpDir, 'ledger.json'))
+        with Uploader(sink, max_workers=2) as uploader:
+            tStart = time.perf_counter()
+            futures = uploader.submit_tree(self.localDir, 'radiosonde')
+            # submitting doesn't wait for the uploads
+            self.assertLess(time.perf_counter() - tStart, 0.05)
+
+        self.assertEqual(len(futures), 4)
+        self.assertEqual(active[1], 2)
+        self.assertEqual([result.remote_path for result in uploader.results],
+                         ['radiosonde/2019/file_{:d}.grib'.format(iFile)
+                          for iFile in range(4)])
+        self.assertEqual(uploader.summary(),
+                         '3 uploaded, 0 skipped, 1 failed')
+
+        with Uploader(sink, max_workers=2) as uploader:
+            uploader.submit_tree(self.localDir, 'radiosonde')
+        self.assertEqual(uploader.summary(),
+                         '0 uploaded, 3 skipped, 1 failed')
+
+        # the failures go to the logger of the sink
+        sink = GenericSink(upload, ledger_file=os.path.join(
+            self.tmpDir, 'ledger.json'), logger=logging.getLogger('ECMWF'))
+        with self.assertLogs('ECMWF', level='ERROR') as logs:
+            with Uploader(sink, max_workers=2) as uploader:
+                uploader.submit(self.files[3], 'file_3.grib')
+        self.assertIn('connection reset', logs.output[0])
+
+    def test_bypy_sink(self):
+        print('---> Test on ByPySink with concurrent uploads')
+
+        clients = []
+        uploads = []
+
+        class FakeByPy(object):
+
+            def __init__(self, slice_size):
+                self.thread = threading.current_thread()
+                clients.append(self)
+
+            def upload(self, local, remote, ondup):
+                # the client is never shared by the upload threads
+                uploads.append(self.thread is threading.current_thread())
+                time.sleep(0.05)
+                return 0
+
+        with mock.patch.dict(sys.modules,
+                             {'bypy': mock.MagicMock(ByPy=FakeByPy)}):
+            sink = get_sink('bypy', 'apps/bypy', ledger_file=os.path.join(
+                self.tmpDir, 'ledger.json'))
+
+        with Uploader(sink, max_workers=2) as uploader:
+            uploader.submit_tree(self.localDir, 'radiosonde')
+
+        self.assertEqual(uploader.summary(),
+                         '4 uploaded, 0 skipped, 0 failed')
+        self.assertEqual(uploads, [True] * 4)
+        self.assertEqual(len(clients), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
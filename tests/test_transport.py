@@ -0,0 +1,99 @@
+import sys
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcPath = os.path.join(projectDir, 'src')
+
+sys.path.append(srcPath)
+
+import requests
+from transport import HTTPTransport
+from metrics import MetricsRegistry
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    answer the first `nFailures` requests with 503.
+    """
+
+    nFailures = 0
+    nRequests = 0
+
+    def do_GET(self):
+
+        FlakyHandler.nRequests += 1
+        if FlakyHandler.nRequests <= FlakyHandler.nFailures:
+            self.send_response(503)
+            self.end_headers()
+        else:
+            body = b'<PRE>ok</PRE>'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        self.server = HTTPServer(('127.0.0.1', 0), FlakyHandler)
+        self.url = 'http://127.0.0.1:{port:d}/'.format(
+            port=self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    @classmethod
+    def tearDownClass(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def setUp(self):
+        FlakyHandler.nRequests = 0
+
+    def test_retry_on_server_error(self):
+        print('---> Test on HTTPTransport.get with retries')
+
+        FlakyHandler.nFailures = 2
+        metrics = MetricsRegistry()
+        transport = HTTPTransport(max_retries=3, backoff_factor=0.01,
+                                  metrics=metrics)
+
+        res = transport.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.text, '<PRE>ok</PRE>')
+        self.assertEqual(FlakyHandler.nRequests, 3)
+        self.assertEqual(metrics.counter('radiosonde_http_retries_total'), 2)
+        transport.close()
+
+    def test_retries_exhausted(self):
+        print('---> Test on HTTPTransport.get without successful attempts')
+
+        FlakyHandler.nFailures = 10
+        transport = HTTPTransport(max_retries=1, backoff_factor=0.01)
+
+        self.assertRaises(requests.exceptions.HTTPError,
+                          transport.get, self.url)
+        self.assertEqual(FlakyHandler.nRequests, 2)
+        transport.close()
+
+    def test_backoff(self):
+        print('---> Test on HTTPTransport.backoff')
+
+        transport = HTTPTransport(backoff_factor=1.0, backoff_max=4.0)
+
+        for attempt in range(6):
+            delay = transport.backoff(attempt)
+            self.assertTrue(0 <= delay <= min(4.0, 2 ** attempt))
+
+
+if __name__ == '__main__':
+    unittest.main()